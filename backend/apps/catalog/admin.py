@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Category, Subcategory, Product, ProductImage, ProductReview, Banner
+from .models import (
+    Category, Subcategory, Product, ProductImage, ProductReview, ReviewHelpfulVote, Banner, ImageVariantJob,
+    RelatedProduct, RelatedProductsBuild,
+)
 
 
 @admin.register(Category)
@@ -31,6 +34,12 @@ class ProductReviewAdmin(admin.ModelAdmin):
     list_filter = ('rating', 'is_verified_purchase')
     search_fields = ('comment', 'user__email', 'product__name')
 
+@admin.register(ReviewHelpfulVote)
+class ReviewHelpfulVoteAdmin(admin.ModelAdmin):
+    list_display = ('review', 'user', 'counted', 'created_at')
+    list_filter = ('counted',)
+    raw_id_fields = ('review', 'user')
+
 @admin.register(ProductImage)
 class ProductImageAdmin(admin.ModelAdmin):
     list_display = ('product', 'image', 'display_order', 'is_primary')
@@ -43,3 +52,18 @@ class BannerAdmin(admin.ModelAdmin):
     list_filter = ('placement', 'is_active')
     search_fields = ('title', 'subtitle')
     ordering = ('placement', 'display_order', '-created_at')
+
+@admin.register(ImageVariantJob)
+class ImageVariantJobAdmin(admin.ModelAdmin):
+    list_display = ('model_label', 'object_id', 'field_name', 'status', 'attempts', 'updated_at')
+    list_filter = ('status', 'model_label')
+
+
+@admin.register(RelatedProduct)
+class RelatedProductAdmin(admin.ModelAdmin):
+    list_display = ('product', 'rank', 'related', 'co_orders', 'score')
+    raw_id_fields = ('product', 'related')
+
+@admin.register(RelatedProductsBuild)
+class RelatedProductsBuildAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'mode', 'last_order_id', 'order_items', 'products', 'seconds')
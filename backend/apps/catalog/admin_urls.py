@@ -6,6 +6,7 @@ from .admin_views import (
     AdminProductViewSet,
     AdminProductImageViewSet,
     AdminProductReviewViewSet,
+    AdminDashboardStatsViewSet,
 )
 
 router = DefaultRouter()
@@ -14,6 +15,7 @@ router.register('subcategories', AdminSubcategoryViewSet, basename='admin-subcat
 router.register('products', AdminProductViewSet, basename='admin-products')
 router.register('product-images', AdminProductImageViewSet, basename='admin-product-images')
 router.register('product-reviews', AdminProductReviewViewSet, basename='admin-product-reviews')
+router.register('dashboard-stats', AdminDashboardStatsViewSet, basename='admin-dashboard-stats')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,12 +1,19 @@
+from django.db.models import F
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from . import inventory
+from .filters import ProductSearchFilter
+from .helpful_votes import helpful_count
 from .models import Category, Subcategory, Product, ProductImage, ProductReview
+from .stats import category_stats, product_stats
 from .serializers import (
-    CategorySerializer, SubcategorySerializer, ProductSerializer,
+    CategorySerializer, SubcategorySerializer, ProductSerializer, AdminProductListSerializer,
     ProductImageSerializer, ProductReviewSerializer
 )
+from shop_project.exports import ExportMixin
 from apps.users.permissions import IsAdminOrStaff
+from apps.users.stats import user_stats
 
 class AdminCategoryViewSet(viewsets.ModelViewSet):
     """
@@ -21,13 +28,7 @@ class AdminCategoryViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Get category statistics"""
-        total = Category.objects.count()
-        active = Category.objects.filter(is_active=True).count()
-        return Response({
-            'total': total,
-            'active': active,
-            'inactive': total - active,
-        })
+        return Response(category_stats())
 
 class AdminSubcategoryViewSet(viewsets.ModelViewSet):
     """
@@ -39,42 +40,67 @@ class AdminSubcategoryViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'slug', 'category__name']
 
-class AdminProductViewSet(viewsets.ModelViewSet):
+class AdminProductViewSet(ExportMixin, viewsets.ModelViewSet):
     """
     Admin-only ViewSet for managing products.
     """
-    queryset = Product.objects.all().select_related('subcategory__category')
+    queryset = Product.objects.all().select_related('subcategory__category', 'zakeke_mapping')
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrStaff]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['name', 'sku', 'description', 'subcategory__name']
-    ordering_fields = ['created_at', 'base_price', 'stock_quantity']
+    filter_backends = [filters.OrderingFilter, ProductSearchFilter]
+    ordering_fields = ['created_at', 'base_price', 'stock_quantity', 'rating_average', 'rating_count']
     ordering = ['-created_at']
+    export_filename = 'products'
+    export_related = ['subcategory__category', 'zakeke_mapping']
+    export_fields = [
+        ('ID', 'id'), ('SKU', 'sku'), ('Name', 'name'), ('Slug', 'slug'),
+        ('Category', 'subcategory.category.name'), ('Subcategory', 'subcategory.name'),
+        ('Base price', 'base_price'), ('Current price', 'current_price'), ('On sale', 'is_on_sale'),
+        ('Stock', 'stock_quantity'), ('Infinite stock', 'is_infinite_stock'),
+        ('Active', 'is_active'), ('Featured', 'is_featured'),
+        ('Average rating', 'rating_average'), ('Reviews', 'rating_count'),
+        ('Zakeke product ID', 'zakeke_mapping.zakeke_product_id'), ('Created', 'created_at'),
+    ]
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return AdminProductListSerializer
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            queryset = queryset.prefetch_related('images')
+        return queryset
 
     @action(detail=False, methods=['post'])
     def bulk_update_stock(self, request):
-        """Bulk update stock quantities"""
-        updates = request.data.get('updates', [])
-        for update in updates:
-            product_id = update.get('id')
-            stock = update.get('stock_quantity')
-            if product_id and stock is not None:
-                Product.objects.filter(id=product_id).update(stock_quantity=stock)
-        return Response({'status': 'Stock updated'})
+        """
+        Bulk update stock quantities.
+
+        Body: ``{"updates": [{"id"|"sku": ..., "stock_quantity"|"delta": ...}], "atomic": true}``.
+        With ``atomic`` (the default) a single bad row rejects the whole batch.
+        """
+        updates = request.data.get('updates')
+        if not isinstance(updates, list):
+            return Response({'error': '"updates" must be a list.'}, status=status.HTTP_400_BAD_REQUEST)
+        atomic = str(request.data.get('atomic', True)).lower() not in ('false', '0')
+        applied, results = inventory.bulk_update_stock(updates, atomic=atomic)
+        failed = sum(1 for r in results if r['status'] == 'error')
+        return Response(
+            {
+                'status': 'Stock updated' if applied or not failed else 'Stock update rejected',
+                'updated': applied,
+                'failed': failed,
+                'results': results,
+            },
+            status=status.HTTP_400_BAD_REQUEST if atomic and failed else status.HTTP_200_OK,
+        )
 
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Get product statistics"""
-        total = Product.objects.count()
-        active = Product.objects.filter(is_active=True).count()
-        low_stock = Product.objects.filter(stock_quantity__lt=10, is_infinite_stock=False).count()
-        
-        return Response({
-            'total': total,
-            'active': active,
-            'inactive': total - active,
-            'low_stock': low_stock,
-        })
+        return Response(product_stats())
 
 
 
@@ -93,7 +119,7 @@ class AdminProductImageViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(product_id=product_id)
         return queryset
 
-class AdminProductReviewViewSet(viewsets.ModelViewSet):
+class AdminProductReviewViewSet(ExportMixin, viewsets.ModelViewSet):
     """
     Admin-only ViewSet for managing product reviews.
     """
@@ -104,6 +130,13 @@ class AdminProductReviewViewSet(viewsets.ModelViewSet):
     search_fields = ['title', 'comment', 'user__email', 'product__name']
     ordering_fields = ['rating', 'created_at', 'helpful_count']
     ordering = ['-created_at']
+    export_filename = 'reviews'
+    export_related = ['product', 'user']
+    export_fields = [
+        ('ID', 'id'), ('Product SKU', 'product.sku'), ('Product', 'product.name'),
+        ('User email', 'user.email'), ('Rating', 'rating'), ('Title', 'title'), ('Comment', 'comment'),
+        ('Verified purchase', 'is_verified_purchase'), ('Helpful', 'helpful_count'), ('Created', 'created_at'),
+    ]
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -114,9 +147,22 @@ class AdminProductReviewViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['post'])
     def mark_helpful(self, request, pk=None):
-        """Increment helpful count"""
+        """Increment helpful count (a manual adjustment; customers vote via the product reviews endpoint)"""
         review = self.get_object()
-        review.helpful_count += 1
-        review.save()
-        return Response({'helpful_count': review.helpful_count})
+        # Atomic increment without save(), which would recompute the product's rating aggregates.
+        ProductReview.objects.filter(pk=review.pk).update(helpful_count=F('helpful_count') + 1)
+        return Response({'helpful_count': helpful_count(review)})
+
 
+class AdminDashboardStatsViewSet(viewsets.ViewSet):
+    """
+    All admin dashboard counters in one round trip.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrStaff]
+
+    def list(self, request):
+        return Response({
+            'categories': category_stats(),
+            'products': product_stats(),
+            'users': user_stats(),
+        })
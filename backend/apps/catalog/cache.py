@@ -0,0 +1,168 @@
+"""
+Versioned caching for read-heavy catalog endpoints.
+
+Every write to a Category, Subcategory or Product bumps a single version
+counter (banners have their own). Cached payloads are stored under keys that
+embed the version, so a bump makes all of them unreachable at once and nothing
+ever has to be deleted. Payloads are rebuilt from the primary database, since
+a replica may not have the write behind the bump yet.
+"""
+import hashlib
+import json
+import math
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from shop_project.routers import force_primary
+
+CATALOG_VERSION_KEY = 'catalog:version'
+BANNER_VERSION_KEY = 'banners:version'
+
+
+def get_version(key):
+    """
+    Return the current value of a version counter, initialising it on first use.
+
+    The initial value is time based so that a version key lost to eviction or
+    a cache restart never resurrects payloads cached under an older version.
+    """
+    version = cache.get(key)
+    if version is None:
+        initial = int(time.time() * 1000)
+        cache.add(key, initial, timeout=None)
+        version = cache.get(key, initial)
+    return version
+
+
+def bump_version(key):
+    """Advance a version counter once the current transaction commits."""
+    transaction.on_commit(lambda: _incr_version(key))
+
+
+def _incr_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Key was evicted; re-initialising picks a fresh time-based version.
+        get_version(key)
+    cache.set(f'{key}:changed_at', time.time(), timeout=None)
+
+
+def get_version_changed_at(key):
+    """When the counter was last bumped, or None if that is not known."""
+    changed_at = cache.get(f'{key}:changed_at')
+    if changed_at is None:
+        return None
+    return datetime.fromtimestamp(changed_at, tz=dt_timezone.utc)
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog payload once the current transaction commits."""
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def build_catalog_tree(request=None):
+    """
+    Serialize all active categories with their subcategories and products.
+
+    Runs exactly three queries (categories, subcategories, products) regardless
+    of catalog size.
+    """
+    from .models import Category, Subcategory, Product
+    from .serializers import CategorySerializer
+
+    categories = Category.objects.filter(is_active=True).order_by('display_order').prefetch_related(
+        Prefetch('subcategories', queryset=Subcategory.objects.order_by('pk')),
+        Prefetch('subcategories__products', queryset=Product.objects.order_by('pk')),
+    )
+    return CategorySerializer(categories, many=True, context={'request': request}).data
+
+
+def get_catalog_tree(request=None):
+    """
+    Return ``(version, data)`` for the catalog tree, building it on a cache miss.
+
+    Image URLs are absolutised against the request host, so the host is part of
+    the key.
+    """
+    version = get_catalog_version()
+    host = request.build_absolute_uri('/') if request is not None else ''
+    key = f'catalog:tree:v{version}:{host}'
+    latest_key = f'catalog:tree:latest:{host}'
+    data = cache.get(key)
+    if data is not None:
+        return version, data
+
+    # After a bump (e.g. thousands of discounts flipping at once) only one
+    # worker rebuilds; the others keep serving the previous snapshot meanwhile.
+    lock_key = f'{key}:lock'
+    locked = cache.add(lock_key, 1, timeout=30)
+    if not locked:
+        stale = cache.get(latest_key)
+        if stale is not None:
+            return stale
+    try:
+        with force_primary():
+            data = build_catalog_tree(request)
+        cache.set(key, data, timeout=settings.CATALOG_TREE_CACHE_TIMEOUT)
+        cache.set(latest_key, (version, data), timeout=settings.CATALOG_TREE_CACHE_TIMEOUT)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return version, data
+
+
+def get_active_banners(placement=None, request=None):
+    """
+    Return the cached active banner set for a placement as a dict with
+    ``data``, ``etag`` and ``expires_at``.
+
+    The entry lives until the nearest start_date/end_date boundary among the
+    placement's banners, so the next request after a banner goes live or
+    expires rebuilds it; Banner writes bump the banner version.
+    """
+    from .models import Banner
+    from .serializers import BannerSerializer
+
+    version = get_version(BANNER_VERSION_KEY)
+    key = f'banners:active:v{version}:{placement or "all"}'
+    entry = cache.get(key)
+    if entry is not None:
+        return entry
+
+    now = timezone.now()
+    banners = Banner.objects.filter(is_active=True).order_by('display_order', '-created_at')
+    if placement:
+        banners = banners.filter(placement=placement)
+    active, boundaries = [], []
+    with force_primary():
+        banners = list(banners)
+    for banner in banners:
+        if banner.start_date and banner.start_date > now:
+            boundaries.append(banner.start_date)
+            continue
+        if banner.end_date and banner.end_date < now:
+            continue
+        if banner.end_date:
+            boundaries.append(banner.end_date)
+        active.append(banner)
+
+    data = BannerSerializer(active, many=True, context={'request': request}).data
+    digest = hashlib.md5(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+    expires_at = min(boundaries) if boundaries else None
+    timeout = settings.BANNER_CACHE_TIMEOUT
+    if expires_at is not None:
+        timeout = max(1, min(timeout, math.ceil((expires_at - now).total_seconds())))
+    entry = {'data': data, 'etag': f'"banners-{digest}"', 'expires_at': expires_at}
+    cache.set(key, entry, timeout=timeout)
+    return entry
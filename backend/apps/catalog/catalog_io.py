@@ -0,0 +1,304 @@
+"""
+Bulk catalog import/export in CSV or JSON Lines.
+
+Both directions stream: rows are read and written one at a time and handled
+in fixed-size batches, so memory use doesn't grow with the feed. Imports
+upsert products by SKU with ``bulk_create(update_conflicts=True)``, replace
+the gallery images of rows that carry an ``images`` column, and upsert or
+remove Zakeke mappings. Columns absent from a feed are left untouched on
+existing products; if a feed lacks some of the discount columns, the price
+state is recomputed in SQL from what is stored.
+
+CSV cells hold plain strings; ``images`` is a ``|``-separated URL list. In
+JSONL, ``images`` may be a list of URLs or of ``{"image", "alt_text"}`` objects.
+"""
+import csv
+import json
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+
+from apps.zakeke.models import ZakekeProduct
+from .cache import bump_catalog_version
+from .models import Category, Subcategory, Product, ProductImage
+from .price_scheduler import price_state_updates
+from .search import index_products
+
+REQUIRED_COLUMNS = ['sku', 'name', 'subcategory', 'base_price']
+OPTIONAL_COLUMNS = [
+    'slug', 'description', 'stock_quantity', 'is_infinite_stock', 'weight_kg',
+    'discount_type', 'discount_value', 'discount_start_date', 'discount_end_date', 'is_on_sale',
+    'primary_image', 'meta_title', 'meta_description', 'is_active', 'is_featured',
+]
+RELATED_COLUMNS = ['images', 'zakeke_product_id']
+EXPORT_COLUMNS = ['sku', 'name', 'subcategory', 'category', 'base_price'] + OPTIONAL_COLUMNS + RELATED_COLUMNS
+
+BOOLEAN_COLUMNS = {'is_infinite_stock', 'is_on_sale', 'is_active', 'is_featured'}
+INTEGER_COLUMNS = {'stock_quantity'}
+DECIMAL_COLUMNS = {'base_price', 'discount_value', 'weight_kg'}
+DATETIME_COLUMNS = {'discount_start_date', 'discount_end_date'}
+NULLABLE_COLUMNS = {'discount_type', 'discount_start_date', 'discount_end_date', 'primary_image'}
+# Product.PRICE_STATE_FIELDS are derived from these
+PRICE_COLUMNS = {'base_price', 'discount_type', 'discount_value', 'discount_start_date', 'discount_end_date', 'is_on_sale'}
+IMAGE_SEPARATOR = '|'
+
+
+class RowError(ValueError):
+    pass
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    errors: list = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def read_rows(stream, file_format):
+    """Yield ``(line_number, dict)`` from a CSV or JSONL text stream."""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield line_number, RowError(f'Invalid JSON: {exc}')
+
+
+def import_catalog(rows, batch_size=2000, create_categories=False, progress=None):
+    """
+    Upsert ``(line_number, row)`` pairs in batches and return an ImportReport.
+
+    With ``create_categories`` unknown subcategory slugs are created under the
+    row's ``category`` slug (itself created if missing); otherwise such rows
+    are reported as errors.
+    """
+    importer = _Importer(create_categories)
+    report = ImportReport()
+    started = time.perf_counter()
+    batch = []
+    for line_number, row in rows:
+        batch.append((line_number, row))
+        if len(batch) >= batch_size:
+            importer.flush(batch, report)
+            batch = []
+            if progress:
+                progress(report, time.perf_counter() - started)
+    if batch:
+        importer.flush(batch, report)
+    report.seconds = time.perf_counter() - started
+    if report.created or report.updated:
+        bump_catalog_version()
+    return report
+
+
+class _Importer:
+    def __init__(self, create_categories):
+        self.create_categories = create_categories
+        self.subcategories = dict(Subcategory.objects.values_list('slug', 'pk'))
+
+    def flush(self, batch, report):
+        report.rows += len(batch)
+        now = timezone.now()
+        parsed = {}
+        for line_number, row in batch:
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                product, related, columns = self.parse(row, now)
+            except RowError as exc:
+                report.errors.append((line_number, str(exc)))
+                continue
+            # Last occurrence of a SKU within the batch wins.
+            parsed[product.sku] = (line_number, product, related, columns)
+
+        # Rows providing different column sets must not overwrite each other's gaps.
+        groups = {}
+        for entry in parsed.values():
+            groups.setdefault(entry[3], []).append(entry)
+        for columns, entries in groups.items():
+            try:
+                with transaction.atomic():
+                    self.write(entries, columns, report)
+            except IntegrityError:
+                # Isolate the offending rows (e.g. a slug already used by another SKU).
+                for entry in entries:
+                    try:
+                        with transaction.atomic():
+                            self.write([entry], columns, report)
+                    except IntegrityError as exc:
+                        report.errors.append((entry[0], f'Database rejected row: {exc}'))
+
+    def parse(self, row, now):
+        missing = [name for name in REQUIRED_COLUMNS if _blank(row.get(name))]
+        if missing:
+            raise RowError(f'Missing required column(s): {", ".join(missing)}')
+        values = {}
+        for name in ['sku', 'name', 'base_price'] + OPTIONAL_COLUMNS:
+            if name in row:
+                values[name] = _coerce(name, row[name])
+        values['subcategory_id'] = self.resolve_subcategory(row)
+        if not values.get('slug'):
+            values['slug'] = slugify(f"{values['name']}-{values['sku']}")[:50]
+        product = Product(**values)
+        product.refresh_price_state(now)
+
+        related = {}
+        if 'images' in row:
+            related['images'] = _parse_images(row['images'])
+        if 'zakeke_product_id' in row:
+            related['zakeke_product_id'] = str(row['zakeke_product_id'] or '').strip()
+        update_fields = ['name', 'base_price', 'subcategory'] + [
+            name for name in OPTIONAL_COLUMNS if name in row and not (name == 'slug' and _blank(row[name]))
+        ]
+        return product, related, tuple(update_fields)
+
+    def resolve_subcategory(self, row):
+        slug = str(row['subcategory']).strip()
+        if slug in self.subcategories:
+            return self.subcategories[slug]
+        category_slug = str(row.get('category') or '').strip()
+        if not (self.create_categories and category_slug):
+            raise RowError(f'Unknown subcategory "{slug}"')
+        category, _ = Category.objects.get_or_create(
+            slug=category_slug, defaults={'name': category_slug.replace('-', ' ').title()},
+        )
+        subcategory, _ = Subcategory.objects.get_or_create(
+            slug=slug, defaults={'category': category, 'name': slug.replace('-', ' ').title()},
+        )
+        self.subcategories[slug] = subcategory.pk
+        return subcategory.pk
+
+    def write(self, entries, columns, report):
+        products = [product for _, product, _, _ in entries]
+        skus = [product.sku for product in products]
+        existing = set(Product.objects.filter(sku__in=skus).values_list('sku', flat=True))
+        # The price state parse() computed only holds if the row had every price column;
+        # otherwise it would be computed from defaults instead of the stored discount.
+        complete = PRICE_COLUMNS.issubset(columns)
+        Product.objects.bulk_create(
+            products,
+            update_conflicts=True,
+            unique_fields=['sku'],
+            update_fields=list(columns) + (Product.PRICE_STATE_FIELDS if complete else []) + ['updated_at'],
+        )
+        if not complete and existing:
+            Product.objects.filter(sku__in=existing).update(**price_state_updates())
+        ids = dict(Product.objects.filter(sku__in=skus).values_list('sku', 'pk'))
+
+        with_images = {ids[p.sku]: related['images'] for _, p, related, _ in entries if 'images' in related}
+        if with_images:
+            ProductImage.objects.filter(product_id__in=with_images).delete()
+            ProductImage.objects.bulk_create([
+                ProductImage(product_id=product_id, display_order=order, **image)
+                for product_id, images in with_images.items()
+                for order, image in enumerate(images)
+            ])
+
+        zakeke = {ids[p.sku]: related['zakeke_product_id'] for _, p, related, _ in entries if 'zakeke_product_id' in related}
+        if zakeke:
+            ZakekeProduct.objects.filter(product_id__in=[pk for pk, value in zakeke.items() if not value]).delete()
+            ZakekeProduct.objects.bulk_create(
+                [ZakekeProduct(product_id=pk, zakeke_product_id=value) for pk, value in zakeke.items() if value],
+                update_conflicts=True,
+                unique_fields=['product'],
+                update_fields=['zakeke_product_id', 'is_active', 'updated_at'],
+            )
+
+        index_products(ids.values())
+        report.created += len(skus) - len(existing)
+        report.updated += len(existing)
+
+
+def export_catalog(stream, file_format, queryset=None, chunk_size=2000):
+    """Write products to ``stream`` in import format; returns the row count."""
+    queryset = (queryset if queryset is not None else Product.objects.all()).order_by('pk')
+    queryset = queryset.select_related('subcategory__category', 'zakeke_mapping').prefetch_related('images')
+    writer = None
+    if file_format == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+    count = 0
+    for product in queryset.iterator(chunk_size=chunk_size):
+        row = _export_row(product)
+        if writer:
+            row['images'] = IMAGE_SEPARATOR.join(image['image'] for image in row['images'])
+            writer.writerow({key: '' if value is None else value for key, value in row.items()})
+        else:
+            stream.write(json.dumps(row, default=str) + '\n')
+        count += 1
+    return count
+
+
+def _export_row(product):
+    row = {name: getattr(product, name) for name in ['sku', 'name', 'base_price'] + OPTIONAL_COLUMNS}
+    row['subcategory'] = product.subcategory.slug
+    row['category'] = product.subcategory.category.slug
+    for name in DATETIME_COLUMNS:
+        row[name] = row[name].isoformat() if row[name] else None
+    row['images'] = [
+        {'image': image.image, 'alt_text': image.alt_text}
+        for image in sorted(product.images.all(), key=lambda image: image.display_order)
+    ]
+    mapping = product.zakeke_mapping if hasattr(product, 'zakeke_mapping') else None
+    row['zakeke_product_id'] = mapping.zakeke_product_id if mapping else ''
+    return {name: row[name] for name in EXPORT_COLUMNS}
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _coerce(name, value):
+    if _blank(value):
+        if name in NULLABLE_COLUMNS:
+            return None
+        if name in BOOLEAN_COLUMNS | INTEGER_COLUMNS | DECIMAL_COLUMNS:
+            return Product._meta.get_field(name).get_default()
+        return ''
+    try:
+        if name in BOOLEAN_COLUMNS:
+            if isinstance(value, bool):
+                return value
+            return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+        if name in INTEGER_COLUMNS:
+            return int(value)
+        if name in DECIMAL_COLUMNS:
+            return Decimal(str(value))
+    except (ValueError, InvalidOperation):
+        raise RowError(f'Invalid value for {name}: {value!r}')
+    if name in DATETIME_COLUMNS:
+        parsed = parse_datetime(str(value))
+        if parsed is None:
+            raise RowError(f'Invalid datetime for {name}: {value!r}')
+        return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+    return str(value).strip()
+
+
+def _parse_images(value):
+    if _blank(value):
+        return []
+    if isinstance(value, str):
+        value = value.split(IMAGE_SEPARATOR)
+    images = []
+    for item in value:
+        if isinstance(item, dict):
+            images.append({'image': str(item.get('image', '')).strip(), 'alt_text': str(item.get('alt_text') or '')})
+        else:
+            images.append({'image': str(item).strip(), 'alt_text': ''})
+    return [image for image in images if image['image']]
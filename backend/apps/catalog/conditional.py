@@ -0,0 +1,119 @@
+"""
+Conditional GET support for read endpoints.
+
+Validators are computed before any serialization: by default one aggregate
+probe (``MAX(updated_at)``, ``COUNT(*)``) over the filtered queryset, combined
+with a cache version counter so that writes that don't touch the probed rows
+(a subcategory rename, a deleted product) still change the ETag. Matching
+``If-None-Match`` / ``If-Modified-Since`` requests get a bodyless 304.
+
+List requests with a full-text ``?search=`` load the rows during the probe
+instead, and the response is serialized from them, so the search runs once.
+
+The probe reads from wherever the page itself is read, usually a replica.
+For ``REPLICA_PIN_SECONDS`` after a version bump a replica may not have the
+write yet, and its rows paired with the new version would let a stale page
+revalidate as current; replica reads get no validators in that window.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, F, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .cache import get_version, get_version_changed_at
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag/Last-Modified validation to ``list`` and ``retrieve``.
+
+    Set ``conditional_version_key`` to the cache version counter bumped by
+    the model's signals, or override ``get_conditional_validators`` when a
+    cheaper validator is already at hand.
+    """
+    conditional_version_key = None
+    conditional_timestamp_field = 'updated_at'
+    # List requests with any of these params are probed on the loaded rows
+    conditional_load_params = ('search',)
+    _probed_queryset = None
+
+    def list(self, request, *args, **kwargs):
+        handler = super().list
+        return self.conditional_response(request, lambda: handler(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        handler = super().retrieve
+        return self.conditional_response(request, lambda: handler(request, *args, **kwargs))
+
+    def conditional_response(self, request, respond, validators=None):
+        """
+        Return 304 if the client's copy is current, otherwise ``respond()``.
+
+        ``validators`` is an ``(etag, last_modified)`` pair; it defaults to
+        ``get_conditional_validators()``.
+        """
+        etag, last_modified = validators or self.get_conditional_validators()
+        last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+        if response is None:
+            response = respond()
+        if response.status_code in (200, 304):
+            if etag and not response.has_header('ETag'):
+                response['ETag'] = etag
+            if last_modified_ts and not response.has_header('Last-Modified'):
+                response['Last-Modified'] = http_date(last_modified_ts)
+        return response
+
+    def filter_queryset(self, queryset):
+        # Reuse the queryset the probe already filtered and loaded.
+        probed, self._probed_queryset = self._probed_queryset, None
+        return probed if probed is not None else super().filter_queryset(queryset)
+
+    def get_conditional_validators(self):
+        """Return ``(etag, last_modified)``; either may be None."""
+        queryset = self.get_queryset()
+        if self._replica_may_lag(queryset.db):
+            return None, None
+        queryset = self.filter_queryset(queryset)
+        if self.detail:
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        if not self.detail and any(self.request.query_params.get(name) for name in self.conditional_load_params):
+            probe = self._probe_rows(queryset)
+        else:
+            probe = queryset.order_by().aggregate(
+                last_modified=Max(self.conditional_timestamp_field), count=Count('pk'),
+            )
+        if self.detail and not probe['count']:
+            return None, None  # let the handler raise its 404
+
+        last_modified = probe['last_modified']
+        parts = [
+            self.request.build_absolute_uri(), probe['count'], last_modified.timestamp() if last_modified else '',
+        ]
+        if self.conditional_version_key:
+            parts.append(get_version(self.conditional_version_key))
+            changed_at = get_version_changed_at(self.conditional_version_key)
+            if changed_at and (last_modified is None or changed_at > last_modified):
+                last_modified = changed_at
+        digest = hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+        return f'"{digest}"', last_modified
+
+    def _replica_may_lag(self, alias):
+        if alias == DEFAULT_DB_ALIAS or not self.conditional_version_key:
+            return False
+        changed_at = get_version_changed_at(self.conditional_version_key)
+        return changed_at is not None and timezone.now() - changed_at < timedelta(seconds=settings.REPLICA_PIN_SECONDS)
+
+    def _probe_rows(self, queryset):
+        # The timestamp is annotated since the queryset may defer the field.
+        queryset = queryset.annotate(conditional_timestamp=F(self.conditional_timestamp_field))
+        rows = list(queryset)
+        self._probed_queryset = queryset
+        timestamps = [row.conditional_timestamp for row in rows if row.conditional_timestamp is not None]
+        return {'last_modified': max(timestamps, default=None), 'count': len(rows)}
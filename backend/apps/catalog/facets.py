@@ -0,0 +1,130 @@
+"""
+Facet counts for product listings.
+
+Every facet value is a conditional ``Count(filter=...)`` in one aggregate over
+the filtered listing queryset, so a category page costs one query for all of
+its counts (plus one for the subcategory names), however many values there
+are. Counts reflect the filters already applied, and each value carries the
+query parameter that narrows the listing to it. Results are cached per filter
+combination under the catalog version, so any catalog write or price
+transition invalidates them.
+"""
+import hashlib
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from shop_project.routers import force_primary
+from .cache import get_catalog_version
+from .models import Subcategory, discount_active_q
+
+# (min, max) on the effective price; max is exclusive, None is open-ended.
+PRICE_BUCKETS = [
+    (Decimal('0'), Decimal('10')),
+    (Decimal('10'), Decimal('25')),
+    (Decimal('25'), Decimal('50')),
+    (Decimal('50'), Decimal('100')),
+    (Decimal('100'), Decimal('250')),
+    (Decimal('250'), None),
+]
+RATING_BANDS = [4, 3, 2, 1]
+# Query parameters that change the counts; anything else shares a cache entry.
+FACET_PARAMS = [
+    'category', 'subcategory', 'subcategory_pk', 'search', 'min_price', 'max_price', 'price',
+    'on_sale', 'featured', 'in_stock', 'min_rating',
+]
+
+
+def in_stock_q():
+    return Q(is_infinite_stock=True) | Q(stock_quantity__gt=0)
+
+
+def price_range_value(low, high):
+    return f'{low}-{high if high is not None else ""}'
+
+
+def parse_price_range(value):
+    """``'10-25'`` -> ``(Decimal('10'), Decimal('25'))``; ``'250-'`` leaves the top open."""
+    low, sep, high = value.partition('-')
+    if not sep:
+        raise ValueError(value)
+    return Decimal(low or 0), (Decimal(high) if high else None)
+
+
+def price_range_q(low, high):
+    q = Q(effective_price__gte=low)
+    if high is not None:
+        q &= Q(effective_price__lt=high)
+    return q
+
+
+def get_facet_counts(queryset, params, subcategories, now=None):
+    """
+    Cached facet counts for ``queryset`` (annotated with ``effective_price``).
+
+    ``params`` holds the request's filter parameters, which key the cache.
+    ``subcategories`` is the Subcategory queryset offered as values.
+    """
+    selection = {name: params[name] for name in sorted(params) if name in FACET_PARAMS and params[name] != ''}
+    digest = hashlib.sha1(json.dumps(selection, sort_keys=True, default=str).encode()).hexdigest()
+    key = f'catalog:facets:v{get_catalog_version()}:{digest}'
+    counts = cache.get(key)
+    if counts is None:
+        # Counts are cached under the current version, so read them from the primary.
+        with force_primary():
+            counts = facet_counts(queryset, subcategories, now)
+        cache.set(key, counts, timeout=settings.CATALOG_FACET_CACHE_TIMEOUT)
+    return counts
+
+
+def facet_counts(queryset, subcategories, now=None):
+    """Compute every facet in one aggregate query."""
+    subcategories = list(subcategories.order_by('display_order', 'name').values_list('pk', 'slug', 'name'))
+    aggregates = {'total': Count('pk')}
+    for pk, _, _ in subcategories:
+        aggregates[f'subcategory_{pk}'] = Count('pk', filter=Q(subcategory_id=pk))
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        aggregates[f'price_{index}'] = Count('pk', filter=price_range_q(low, high))
+    for stars in RATING_BANDS:
+        aggregates[f'rating_{stars}'] = Count('pk', filter=Q(rating_average__gte=stars))
+    aggregates['on_sale'] = Count('pk', filter=discount_active_q(now))
+    aggregates['featured'] = Count('pk', filter=Q(is_featured=True))
+    aggregates['in_stock'] = Count('pk', filter=in_stock_q())
+
+    row = queryset.order_by().aggregate(**aggregates)
+    return {
+        'count': row['total'],
+        'facets': {
+            'subcategory': [
+                {'value': slug, 'label': name, 'count': row[f'subcategory_{pk}']}
+                for pk, slug, name in subcategories
+            ],
+            'price': [
+                {
+                    'value': price_range_value(low, high),
+                    'min': str(low), 'max': str(high) if high is not None else None,
+                    'count': row[f'price_{index}'],
+                }
+                for index, (low, high) in enumerate(PRICE_BUCKETS)
+            ],
+            'rating': [{'value': stars, 'count': row[f'rating_{stars}']} for stars in RATING_BANDS],
+            'on_sale': row['on_sale'],
+            'featured': row['featured'],
+            'in_stock': row['in_stock'],
+        },
+    }
+
+
+def facet_subcategories(category_slug=None, subcategory_slug=None, subcategory_pk=None):
+    """The subcategories a listing's subcategory facet offers."""
+    subcategories = Subcategory.objects.filter(is_active=True)
+    if subcategory_pk:
+        return subcategories.filter(pk=subcategory_pk)
+    if subcategory_slug:
+        return subcategories.filter(slug=subcategory_slug)
+    if category_slug:
+        return subcategories.filter(category__slug=category_slug)
+    return subcategories
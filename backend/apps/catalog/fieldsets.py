@@ -0,0 +1,154 @@
+"""
+Sparse fieldsets and expansion for read endpoints.
+
+``?fields=id,name,subcategories.name`` limits a response to the listed fields
+(dotted names reach into nested serializers) and ``?expand=images`` adds
+fields a serializer leaves out by default (``Meta.expandable_fields``). The
+same selection drives the queryset: only the columns the remaining fields
+read are loaded, and only the relations they render are joined or
+prefetched.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def parse_field_list(value):
+    """``'a, b.c'`` -> ``['a', 'b.c']``; None for a missing/empty parameter."""
+    if not value:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def _split(paths):
+    """Group dotted paths by their first segment: ``['a', 'b.c']`` -> ``{'a': [], 'b': ['c']}``."""
+    if paths is None:
+        return None
+    grouped = {}
+    for path in paths:
+        head, _, rest = path.partition('.')
+        grouped.setdefault(head, [])
+        if rest:
+            grouped[head].append(rest)
+    return grouped
+
+
+class DynamicFieldsMixin:
+    """
+    ModelSerializer mixin accepting ``fields`` and ``expand`` keyword arguments.
+
+    ``Meta.expandable_fields`` lists fields only rendered when expanded (or
+    named in ``fields``). ``Meta.field_dependencies`` (or a field's own
+    ``model_paths``) maps method/property fields to the model paths they
+    read, for ``optimize_queryset``.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.select(fields, expand)
+
+    def select(self, fields=None, expand=None):
+        self._field_selection = _split(fields)
+        self._expand_selection = _split(expand) or {}
+        self.__dict__.pop('fields', None)  # rebuild on next access
+
+    def get_field_names(self, declared_fields, info):
+        names = list(super().get_field_names(declared_fields, info))
+        requested = set(self._expand_selection) | set(self._field_selection or ())
+        names += [
+            name for name in getattr(self.Meta, 'expandable_fields', ())
+            if name in requested and name not in names
+        ]
+        if self._field_selection is not None:
+            names = [name for name in names if name in requested]
+        return names
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for name, field in fields.items():
+            child = getattr(field, 'child', field)
+            if isinstance(child, DynamicFieldsMixin):
+                nested = (self._field_selection or {}).get(name) or None
+                child.select(nested, self._expand_selection.get(name))
+        return fields
+
+    def optimize_queryset(self, queryset, keep=()):
+        """
+        Restrict ``queryset`` to what this serializer renders.
+
+        Returns the queryset unchanged if a field's data needs can't be
+        worked out, so an unknown field never costs a query per row.
+        """
+        opts = queryset.model._meta
+        dependencies = getattr(self.Meta, 'field_dependencies', {})
+        columns, joins, prefetches = {opts.pk.name, *keep}, set(), []
+
+        for name, field in self.fields.items():
+            if field.write_only and name not in dependencies:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                prefetches.append(self._prefetch_for(opts, field))
+                continue
+            paths = dependencies.get(name) or getattr(field, 'model_paths', None) or [field.source]
+            for path in paths:
+                if not self._add_path(opts, path, columns, joins):
+                    return queryset
+
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if joins:
+            queryset = queryset.select_related(*joins)
+        return queryset.prefetch_related(*prefetches).only(*columns)
+
+    def _prefetch_for(self, opts, field):
+        child = field.child
+        if not isinstance(child, DynamicFieldsMixin):
+            return field.source
+        relation = opts.get_field(field.source)
+        child_queryset = relation.related_model._default_manager.order_by('pk')
+        # The reverse foreign key is needed to attach children to parents.
+        return Prefetch(field.source, queryset=child.optimize_queryset(child_queryset, keep=[relation.field.name]))
+
+    @staticmethod
+    def _add_path(opts, path, columns, joins):
+        head, _, rest = path.partition('.')
+        try:
+            model_field = opts.get_field(head)
+        except FieldDoesNotExist:
+            return False
+        if not rest:
+            if model_field.many_to_many or model_field.one_to_many:
+                return False
+            columns.add(head)
+            return True
+        if not (model_field.many_to_one or model_field.one_to_one) or '.' in rest:
+            return False
+        joins.add(head)
+        columns.add(f'{head}__{rest}')
+        return True
+
+
+class SparseFieldsetMixin:
+    """
+    ViewSet mixin passing ``?fields=`` / ``?expand=`` to the serializer and
+    trimming the queryset to match on read requests.
+    """
+
+    def get_field_selection(self):
+        params = self.request.query_params
+        return parse_field_list(params.get('fields')), parse_field_list(params.get('expand'))
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method in SAFE_METHODS and issubclass(self.get_serializer_class(), DynamicFieldsMixin):
+            fields, expand = self.get_field_selection()
+            kwargs.setdefault('fields', fields)
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method in SAFE_METHODS and self.action in ('list', 'retrieve'):
+            serializer = self.get_serializer()
+            if isinstance(serializer, DynamicFieldsMixin):
+                queryset = serializer.optimize_queryset(queryset)
+        return queryset
@@ -0,0 +1,43 @@
+from rest_framework import filters
+
+from .search import SearchRank, matching_product_ids
+
+
+class ProductSearchFilter(filters.BaseFilterBackend):
+    """
+    ``?search=`` backed by the product full-text index instead of ``icontains``.
+
+    Matching and ranking happen in SQL alongside the view's other filters, so
+    every match is returned. Results are ordered by relevance unless the client
+    asks for an explicit ``?ordering=``, so list it after OrderingFilter in
+    ``filter_backends``.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+        if not term:
+            return queryset
+        queryset = queryset.filter(pk__in=matching_product_ids(term))
+        if request.query_params.get(filters.OrderingFilter.ordering_param):
+            return queryset
+        return queryset.annotate(search_rank=SearchRank(term)).order_by('-search_rank', 'pk')
+
+
+class ProductOrderingFilter(filters.OrderingFilter):
+    """
+    OrderingFilter that accepts public field names for annotations, e.g.
+    ``?ordering=final_price`` sorts on the SQL-computed ``effective_price``.
+    Views declare the mapping in ``ordering_aliases``.
+    """
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        aliases = getattr(view, 'ordering_aliases', {})
+        if not ordering or not aliases:
+            return ordering
+        resolved = []
+        for term in ordering:
+            descending = term.startswith('-')
+            field = aliases.get(term.lstrip('-'), term.lstrip('-'))
+            resolved.append(f'-{field}' if descending else field)
+        return resolved
@@ -0,0 +1,68 @@
+"""
+"Was this review helpful?" votes.
+
+A vote is a row in ReviewHelpfulVote, unique per (review, user), so a customer
+can vote once and concurrent double-clicks collapse into one vote. Casting a
+vote doesn't touch the review: the flush_helpful_votes worker adds uncounted
+votes to ProductReview.helpful_count in batches, one UPDATE per batch, which
+keeps a popular review's row from becoming a write hotspot. Until then,
+``helpful_count()`` adds the pending votes to the stored counter.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import ProductReview, ReviewHelpfulVote
+
+
+def cast_vote(review, user):
+    """Record ``user``'s vote. Returns False if they had already voted."""
+    _, created = ReviewHelpfulVote.objects.get_or_create(review=review, user=user)
+    return created
+
+
+def retract_vote(review, user):
+    """Remove ``user``'s vote. Returns False if there was none."""
+    with transaction.atomic():
+        vote = ReviewHelpfulVote.objects.select_for_update().filter(review=review, user=user).first()
+        if vote is None:
+            return False
+        if vote.counted:
+            ProductReview.objects.filter(pk=review.pk, helpful_count__gt=0).update(
+                helpful_count=F('helpful_count') - 1
+            )
+        vote.delete()
+    return True
+
+
+def helpful_count(review):
+    """The stored counter plus votes the worker hasn't folded in yet."""
+    stored = ProductReview.objects.filter(pk=review.pk).values_list('helpful_count', flat=True).first() or 0
+    return stored + ReviewHelpfulVote.objects.filter(review=review, counted=False).count()
+
+
+def flush_helpful_votes(batch_size=5000):
+    """Fold uncounted votes into review counters. Returns ``(votes, reviews)`` processed."""
+    with transaction.atomic():
+        pending = list(
+            ReviewHelpfulVote.objects.select_for_update(skip_locked=True)
+            .filter(counted=False)
+            .order_by('pk')
+            .values_list('pk', 'review_id')[:batch_size]
+        )
+        if not pending:
+            return 0, 0
+        per_review = Counter(review_id for _, review_id in pending)
+        # Lock reviews in pk order so concurrent flushes can't deadlock.
+        list(ProductReview.objects.select_for_update().filter(pk__in=per_review).order_by('pk').values_list('pk', flat=True))
+        # Plain UPDATEs: no save() signals, so counters don't invalidate catalog caches.
+        ProductReview.objects.filter(pk__in=per_review).update(
+            helpful_count=F('helpful_count') + Case(
+                *[When(pk=pk, then=Value(count)) for pk, count in per_review.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
+        ReviewHelpfulVote.objects.filter(pk__in=[pk for pk, _ in pending]).update(counted=True)
+    return len(pending), len(per_review)
@@ -0,0 +1,185 @@
+"""
+Responsive image variants.
+
+Saving a row whose image changed queues an ImageVariantJob. The
+process_image_variants worker downloads the source, writes one resized copy
+per configured width and format to the ``image_variants`` storage, and
+stores the result in the row's ``<field>_variants`` JSON column:
+
+    {"source": "<image url/name>", "width": 2400, "height": 1600,
+     "formats": {"webp": {"320": "<url>", ...}, "avif": {...}},
+     "srcset": {"webp": "<url> 320w, <url> 640w, ...", "avif": "..."}}
+
+Variant files are named after a hash of the source, so re-processing the
+same image reuses them. URL sources are only downloaded from
+``MEDIA_DOWNLOAD_HOSTS``, and sources over ``MEDIA_SOURCE_MAX_BYTES`` or
+``MEDIA_SOURCE_MAX_PIXELS`` fail.
+"""
+import hashlib
+import io
+import logging
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage, storages
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from shop_project.downloads import download
+from .cache import BANNER_VERSION_KEY, bump_catalog_version, bump_version
+from .models import ImageVariantJob
+
+logger = logging.getLogger(__name__)
+
+# Image fields that get variants, per model.
+VARIANT_FIELDS = {
+    'catalog.Category': ['image'],
+    'catalog.Subcategory': ['image'],
+    'catalog.Product': ['primary_image'],
+    'catalog.ProductImage': ['image'],
+    'catalog.Banner': ['image'],
+}
+
+SAVE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'avif': {'format': 'AVIF', 'quality': 55},
+}
+MAX_ATTEMPTS = 3
+STALE_AFTER = timedelta(minutes=15)
+DOWNLOAD_TIMEOUT = 20
+
+
+def source_of(instance, field_name):
+    """The image a field currently points at, as a URL or storage name ('' if unset)."""
+    value = getattr(instance, field_name)
+    return (getattr(value, 'name', value) or '')[:500]
+
+
+def variant_map(instance, field_name):
+    """The stored variants for a field, or None if missing or stale."""
+    variants = getattr(instance, f'{field_name}_variants', None) or {}
+    source = source_of(instance, field_name)
+    if not source or variants.get('source') != source:
+        return None
+    return {key: value for key, value in variants.items() if key != 'source'}
+
+
+def enqueue_variants(instance):
+    """Queue a job for every image field whose variants don't match its image. Returns the count queued."""
+    label = instance._meta.label
+    queued = 0
+    for field_name in VARIANT_FIELDS.get(label, []):
+        source = source_of(instance, field_name)
+        if not source or variant_map(instance, field_name) is not None:
+            continue
+        ImageVariantJob.objects.update_or_create(
+            model_label=label, object_id=instance.pk, field_name=field_name,
+            defaults={'source': source, 'status': 'pending', 'attempts': 0, 'error': ''},
+        )
+        queued += 1
+    return queued
+
+
+def enqueue_missing(batch_size=1000):
+    """Queue jobs for rows written without signals (bulk loads). Returns the count queued."""
+    queued = 0
+    for label, field_names in VARIANT_FIELDS.items():
+        columns = ['pk'] + field_names + [f'{name}_variants' for name in field_names]
+        for instance in apps.get_model(label).objects.only(*columns).iterator(chunk_size=batch_size):
+            queued += enqueue_variants(instance)
+    return queued
+
+
+def claim_jobs(batch_size):
+    """Mark up to ``batch_size`` jobs as processing, reclaiming ones a dead worker abandoned."""
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            ImageVariantJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='pending') | Q(status='processing', updated_at__lt=now - STALE_AFTER))
+            .order_by('pk')[:batch_size]
+        )
+        ImageVariantJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status='processing', attempts=F('attempts') + 1, updated_at=now,
+        )
+    for job in jobs:
+        job.attempts += 1
+    return jobs
+
+
+def process_pending_jobs(batch_size=20):
+    """Process one batch of queued jobs. Returns ``(done, failed)``."""
+    done = failed = 0
+    touched = set()
+    for job in claim_jobs(batch_size):
+        try:
+            variants = build_variants(job.source)
+        except Exception as exc:
+            logger.warning("Image variants failed for %s: %s", job, exc)
+            job.status = 'failed' if job.attempts >= MAX_ATTEMPTS else 'pending'
+            job.error = str(exc)[:2000]
+            job.save(update_fields=['status', 'error', 'updated_at'])
+            failed += 1
+            continue
+        model = apps.get_model(job.model_label)
+        # Only store the result if the image hasn't been replaced meanwhile.
+        model.objects.filter(pk=job.object_id, **{job.field_name: job.source}).update(
+            **{f'{job.field_name}_variants': variants}
+        )
+        job.status, job.error = 'done', ''
+        job.save(update_fields=['status', 'error', 'updated_at'])
+        touched.add(job.model_label)
+        done += 1
+    # Variant writes bypass signals; invalidate cached payloads once per batch.
+    if touched - {'catalog.Banner'}:
+        bump_catalog_version()
+    if 'catalog.Banner' in touched:
+        bump_version(BANNER_VERSION_KEY)
+    return done, failed
+
+
+def build_variants(source):
+    """Resize ``source`` into every configured width/format and return the variants dict."""
+    storage = storages['image_variants']
+    with Image.open(io.BytesIO(read_source(source))) as original:
+        # The header gives the size; check it before decoding the pixels.
+        if original.width * original.height > settings.MEDIA_SOURCE_MAX_PIXELS:
+            raise ValueError(f"{original.width}x{original.height}px image is too large")
+        image = ImageOps.exif_transpose(original)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    width, height = image.size
+    widths = sorted({min(target, width) for target in settings.IMAGE_VARIANT_WIDTHS})
+    formats = [fmt for fmt in settings.IMAGE_VARIANT_FORMATS if features.check(fmt)]
+    digest = hashlib.sha1(source.encode()).hexdigest()
+
+    variants = {'source': source, 'width': width, 'height': height, 'formats': {}, 'srcset': {}}
+    for fmt in formats:
+        urls = {}
+        for target in widths:
+            name = f'{digest[:2]}/{digest}/{target}.{fmt}'
+            if not storage.exists(name):
+                resized = image if target == width else image.resize(
+                    (target, max(1, round(height * target / width))), Image.LANCZOS,
+                )
+                buffer = io.BytesIO()
+                resized.save(buffer, **SAVE_OPTIONS[fmt])
+                name = storage.save(name, ContentFile(buffer.getvalue()))
+            urls[str(target)] = storage.url(name)
+        variants['formats'][fmt] = urls
+        variants['srcset'][fmt] = ', '.join(f'{url} {target}w' for target, url in urls.items())
+    return variants
+
+
+def read_source(source):
+    max_bytes = settings.MEDIA_SOURCE_MAX_BYTES
+    if source.startswith(('http://', 'https://')):
+        return download(source, settings.MEDIA_DOWNLOAD_HOSTS, max_bytes, timeout=DOWNLOAD_TIMEOUT)
+    with default_storage.open(source, 'rb') as stored:
+        data = stored.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ValueError(f"{source[:100]!r} is larger than {max_bytes} bytes")
+    return data
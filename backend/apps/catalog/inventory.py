@@ -0,0 +1,131 @@
+"""
+Bulk inventory updates for ERP/warehouse syncs.
+
+Rows may address a product by ``id`` or ``sku`` and either set an absolute
+``stock_quantity`` or apply a relative ``delta``. Rows are resolved and
+validated up front, target products are locked in primary-key order, and
+the new values are written with chunked ``bulk_update`` (one
+``UPDATE ... CASE`` statement per chunk) inside a single transaction.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .models import Product
+
+
+class StockUpdateError(Exception):
+    """Raised inside the transaction to roll back an all-or-nothing batch."""
+
+    def __init__(self, results):
+        super().__init__('Stock update rejected')
+        self.results = results
+
+
+def _row_error(index, row, message):
+    return {'index': index, 'id': row.get('id'), 'sku': row.get('sku'), 'status': 'error', 'error': message}
+
+
+def _parse_row(index, row):
+    """Validate one payload row; returns (row, error_result)."""
+    if not isinstance(row, dict):
+        return None, {'index': index, 'status': 'error', 'error': 'Each update must be an object.'}
+    has_id, has_sku = row.get('id') is not None, bool(row.get('sku'))
+    if has_id == has_sku:
+        return None, _row_error(index, row, 'Provide exactly one of "id" or "sku".')
+    has_absolute, has_delta = row.get('stock_quantity') is not None, row.get('delta') is not None
+    if has_absolute == has_delta:
+        return None, _row_error(index, row, 'Provide exactly one of "stock_quantity" or "delta".')
+    try:
+        parsed = {
+            'id': int(row['id']) if has_id else None,
+            'sku': str(row['sku']) if has_sku else None,
+            'stock_quantity': int(row['stock_quantity']) if has_absolute else None,
+            'delta': int(row['delta']) if has_delta else None,
+        }
+    except (TypeError, ValueError):
+        return None, _row_error(index, row, 'id, stock_quantity and delta must be integers.')
+    if has_absolute and parsed['stock_quantity'] < 0:
+        return None, _row_error(index, row, 'stock_quantity cannot be negative.')
+    return parsed, None
+
+
+def bulk_update_stock(updates, atomic=True, chunk_size=1000):
+    """
+    Apply a list of stock updates and return ``(applied, results)``.
+
+    With ``atomic=True`` any invalid row rejects the whole batch and nothing
+    is written; otherwise valid rows are applied and invalid rows reported.
+    Rows touching the same product are applied in payload order.
+    """
+    results = [None] * len(updates)
+    parsed = []
+    for index, row in enumerate(updates):
+        row, error = _parse_row(index, row)
+        if error:
+            results[index] = error
+        else:
+            parsed.append((index, row))
+
+    try:
+        with transaction.atomic():
+            applied = _apply(parsed, results, atomic, chunk_size)
+            if atomic and any(r['status'] == 'error' for r in results):
+                raise StockUpdateError(results)
+    except StockUpdateError as exc:
+        for result in exc.results:
+            if result['status'] == 'updated':
+                result['status'] = 'rolled_back'
+        return 0, exc.results
+
+    if applied:
+        bump_catalog_version()
+    return applied, results
+
+
+def _apply(parsed, results, atomic, chunk_size):
+    ids = {row['id'] for _, row in parsed if row['id'] is not None}
+    skus = {row['sku'] for _, row in parsed if row['sku'] is not None}
+
+    # Resolve SKUs to ids, then lock all target rows in primary-key order so
+    # concurrent syncs and checkouts cannot deadlock against each other.
+    sku_to_id = {}
+    for chunk in _chunks(sorted(skus), chunk_size):
+        sku_to_id.update(Product.objects.filter(sku__in=chunk).values_list('sku', 'id'))
+    target_ids = sorted(ids | set(sku_to_id.values()))
+    products = {}
+    for chunk in _chunks(target_ids, chunk_size):
+        locked = Product.objects.select_for_update().filter(pk__in=chunk).order_by('pk').only('id', 'sku', 'stock_quantity')
+        products.update((p.pk, p) for p in locked)
+
+    now = timezone.now()
+    changed = {}
+    for index, row in parsed:
+        product_id = row['id'] if row['id'] is not None else sku_to_id.get(row['sku'])
+        product = products.get(product_id)
+        if product is None:
+            results[index] = _row_error(index, row, 'Product not found.')
+            continue
+        previous = product.stock_quantity
+        new_quantity = row['stock_quantity'] if row['delta'] is None else previous + row['delta']
+        if new_quantity < 0:
+            results[index] = _row_error(index, row, f'Resulting stock {new_quantity} would be negative.')
+            continue
+        product.stock_quantity = new_quantity
+        product.updated_at = now
+        changed[product.pk] = product
+        results[index] = {
+            'index': index, 'id': product.pk, 'sku': product.sku, 'status': 'updated',
+            'previous_stock_quantity': previous, 'stock_quantity': new_quantity,
+        }
+
+    if atomic and any(r['status'] == 'error' for r in results):
+        return 0
+    Product.objects.bulk_update(list(changed.values()), ['stock_quantity', 'updated_at'], batch_size=chunk_size)
+    return len(changed)
+
+
+def _chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
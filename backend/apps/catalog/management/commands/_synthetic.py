@@ -0,0 +1,85 @@
+"""
+Synthetic catalog seeding shared by the benchmark commands.
+
+Rows are written with bulk_create, so no signals fire; callers normally run
+inside a transaction they roll back.
+"""
+import random
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from apps.catalog.models import Banner, Category, Subcategory, Product
+
+
+def seed_catalog(products=1000, categories=5, subcategories_per_category=4, seed=0):
+    """Create a random but reproducible catalog and return the product queryset."""
+    rng = random.Random(seed)
+    run = uuid.uuid4().hex[:8]
+    now = timezone.now()
+
+    category_objs = Category.objects.bulk_create([
+        Category(name=f'Bench Category {i}', slug=f'bench-{run}-c{i}', display_order=i)
+        for i in range(categories)
+    ])
+    subcategory_objs = Subcategory.objects.bulk_create([
+        Subcategory(category=category, name=f'{category.name} / {j}', slug=f'{category.slug}-s{j}', display_order=j)
+        for category in category_objs
+        for j in range(subcategories_per_category)
+    ])
+
+    batch = []
+    for i in range(products):
+        on_sale = rng.random() < 0.3
+        window = rng.choice(['open', 'future', 'expired', 'unbounded'])
+        start = end = None
+        if on_sale and window == 'open':
+            start, end = now - timedelta(days=1), now + timedelta(days=1)
+        elif on_sale and window == 'future':
+            start = now + timedelta(days=2)
+        elif on_sale and window == 'expired':
+            end = now - timedelta(days=1)
+        batch.append(Product(
+            subcategory=rng.choice(subcategory_objs),
+            name=f'Bench Product {i}',
+            slug=f'bench-{run}-p{i}',
+            sku=f'B{run}-{i}',
+            description='Synthetic benchmark product',
+            base_price=Decimal(rng.randint(100, 50000)) / 100,
+            discount_type=rng.choice(['percentage', 'fixed']) if on_sale else None,
+            discount_value=Decimal(rng.randint(1, 60)) if on_sale else 0,
+            discount_start_date=start,
+            discount_end_date=end,
+            is_on_sale=on_sale,
+            stock_quantity=rng.randint(0, 500),
+            is_infinite_stock=rng.random() < 0.5,
+            is_active=rng.random() < 0.9,
+            is_featured=rng.random() < 0.05,
+        ))
+        if len(batch) >= 1000:
+            Product.objects.bulk_create(batch)
+            batch = []
+    Product.objects.bulk_create(batch)
+    return Product.objects.filter(slug__startswith=f'bench-{run}-')
+
+
+def seed_banners(banners=500, seed=0):
+    """Create banners spread over placements and date windows; returns their queryset."""
+    rng = random.Random(seed)
+    run = uuid.uuid4().hex[:8]
+    now = timezone.now()
+    Banner.objects.bulk_create([
+        Banner(
+            title=f'Bench Banner {run} {i}',
+            image=f'https://example.com/bench/{run}/{i}.jpg',
+            placement=rng.choice(Banner.PLACEMENT_CHOICES)[0],
+            is_active=rng.random() < 0.2,
+            display_order=rng.randint(0, 20),
+            start_date=now - timedelta(days=rng.randint(0, 30)) if rng.random() < 0.5 else None,
+            end_date=now + timedelta(days=rng.randint(-10, 30)) if rng.random() < 0.5 else None,
+        )
+        for i in range(banners)
+    ])
+    return Banner.objects.filter(title__startswith=f'Bench Banner {run} ')
@@ -0,0 +1,74 @@
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ._synthetic import seed_catalog
+
+CENT = Decimal('0.01')
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare filtering/sorting by final price in Python (Product.final_price) "
+        "against the SQL annotation (Product.objects.with_effective_price). "
+        "Seeds a synthetic catalog inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=20000)
+        parser.add_argument('--min-price', type=Decimal, default=Decimal('20'))
+        parser.add_argument('--max-price', type=Decimal, default=Decimal('200'))
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            products = seed_catalog(products=options['products']).filter(is_active=True)
+            low, high = options['min_price'], options['max_price']
+
+            def python_path():
+                rows = [p for p in products.all() if low <= p.final_price <= high]
+                rows.sort(key=lambda p: (p.final_price, p.pk))
+                return [p.pk for p in rows]
+
+            def sql_path():
+                return list(
+                    products.with_effective_price()
+                    .filter(effective_price__gte=low, effective_price__lte=high)
+                    .order_by('effective_price', 'pk')
+                    .values_list('pk', flat=True)
+                )
+
+            python_ids, python_time = self._time(python_path, options['repeat'])
+            sql_ids, sql_time = self._time(sql_path, options['repeat'])
+            self._check_prices(products)
+            transaction.set_rollback(True)
+
+        if set(python_ids) != set(sql_ids):
+            raise CommandError("Python and SQL paths selected different products")
+
+        self.stdout.write(f"products seeded:   {options['products']}")
+        self.stdout.write(f"matching products: {len(sql_ids)} (python: {len(python_ids)})")
+        self.stdout.write(f"python path:       {python_time * 1000:.1f} ms")
+        self.stdout.write(f"sql path:          {sql_time * 1000:.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"speedup:           {python_time / sql_time:.1f}x"))
+
+    def _time(self, fn, repeat):
+        best, result = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return result, best
+
+    def _check_prices(self, products):
+        """Fail loudly if the SQL expression disagrees with the Python property."""
+        for product in products.with_effective_price().iterator(chunk_size=2000):
+            expected = Decimal(product.final_price).quantize(CENT, ROUND_HALF_UP)
+            actual = Decimal(product.effective_price).quantize(CENT, ROUND_HALF_UP)
+            if abs(expected - actual) > CENT:
+                raise CommandError(
+                    f"Price mismatch for product {product.pk}: python={expected} sql={actual}"
+                )
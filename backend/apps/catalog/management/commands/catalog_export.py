@@ -0,0 +1,36 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.catalog.catalog_io import export_catalog
+from apps.catalog.models import Product
+
+
+class Command(BaseCommand):
+    help = "Stream products to CSV or JSONL in the format catalog_import reads (default: stdout)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension, else csv")
+        parser.add_argument('--category', help="Only export products in this category slug")
+        parser.add_argument('--active-only', action='store_true')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        queryset = Product.objects.all()
+        if options['category']:
+            queryset = queryset.filter(subcategory__category__slug=options['category'])
+        if options['active_only']:
+            queryset = queryset.filter(is_active=True)
+
+        started = time.perf_counter()
+        if path == '-':
+            count = export_catalog(sys.stdout, file_format, queryset, options['chunk_size'])
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as stream:
+                count = export_catalog(stream, file_format, queryset, options['chunk_size'])
+        elapsed = time.perf_counter() - started
+        self.stderr.write(f"exported {count} products in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.0f} rows/s)")
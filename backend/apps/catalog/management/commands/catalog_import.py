@@ -0,0 +1,55 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.catalog.catalog_io import import_catalog, read_rows
+
+MAX_REPORTED_ERRORS = 50
+
+
+class Command(BaseCommand):
+    help = (
+        "Upsert products by SKU from a CSV or JSONL feed (use '-' for stdin). "
+        "Required columns: sku, name, subcategory (slug), base_price."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--create-categories', action='store_true',
+                            help="Create unknown subcategories (and their 'category' slug) instead of rejecting rows")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        if path == '-':
+            return self._import(sys.stdin, file_format, options)
+        try:
+            stream = open(path, newline='', encoding='utf-8-sig')
+        except OSError as exc:
+            raise CommandError(exc)
+        with stream:
+            self._import(stream, file_format, options)
+
+    def _import(self, stream, file_format, options):
+        def progress(report, elapsed):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{report.rows} rows in {elapsed:.1f}s")
+
+        report = import_catalog(
+            read_rows(stream, file_format),
+            batch_size=options['batch_size'],
+            create_categories=options['create_categories'],
+            progress=progress,
+        )
+        for line_number, message in report.errors[:MAX_REPORTED_ERRORS]:
+            self.stderr.write(f"line {line_number}: {message}")
+        if len(report.errors) > MAX_REPORTED_ERRORS:
+            self.stderr.write(f"... and {len(report.errors) - MAX_REPORTED_ERRORS} more errors")
+        self.stdout.write(
+            f"{report.rows} rows: {report.created} created, {report.updated} updated, "
+            f"{len(report.errors)} rejected in {report.seconds:.2f}s ({report.rows_per_second:.0f} rows/s)"
+        )
+        if report.created or report.updated:
+            self.stdout.write("Run process_image_variants --enqueue-missing to build image variants for new images.")
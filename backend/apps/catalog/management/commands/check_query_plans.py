@@ -0,0 +1,89 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from apps.catalog.admin_views import AdminProductViewSet
+from apps.catalog.views import BannerViewSet, ProductViewSet
+
+from ._synthetic import seed_banners, seed_catalog
+
+# Ordering checks read a bounded page, where an index can replace the sort.
+PAGE = 50
+
+FULL_SCAN = {
+    'postgresql': r'Seq Scan on "?{table}"?\b',
+    'sqlite': r'\bSCAN "?{table}"?\b(?! USING)',
+}
+SORT = {
+    'postgresql': r'Sort Key:',
+    'sqlite': r'USE TEMP B-TREE FOR ORDER BY',
+}
+
+
+def endpoint_queryset(viewset_class, params=None, **kwargs):
+    """The queryset a viewset's list action runs for the given query parameters."""
+    request = Request(APIRequestFactory().get('/', params or {}))
+    view = viewset_class(request=request, args=(), kwargs=kwargs, action='list', format_kwarg=None)
+    return view.filter_queryset(view.get_queryset())
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the hot catalog list queries against a seeded synthetic catalog "
+        "and fail if any of them scans a whole table or sorts instead of using an "
+        "index. The seed runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=50000)
+        parser.add_argument('--banners', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if connection.vendor not in FULL_SCAN:
+            raise CommandError(f"Plan checks are not implemented for {connection.vendor}")
+
+        with transaction.atomic():
+            products = seed_catalog(products=options['products'])
+            seed_banners(banners=options['banners'])
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            subcategory = products.filter(is_active=True).select_related('subcategory__category').first().subcategory
+
+            checks = [
+                ('products ?subcategory=', endpoint_queryset(ProductViewSet, {'subcategory': subcategory.slug}), False),
+                ('products ?category=', endpoint_queryset(ProductViewSet, {'category': subcategory.category.slug}), False),
+                ('subcategories/{id}/products/', endpoint_queryset(ProductViewSet, subcategory_pk=subcategory.pk), False),
+                ('products ?ordering=-created_at', endpoint_queryset(ProductViewSet, {'ordering': '-created_at'})[:PAGE], True),
+            ]
+            checks += [
+                (f'admin products ?ordering={field}', endpoint_queryset(AdminProductViewSet, {'ordering': field})[:PAGE], True)
+                for field in ['-created_at', 'base_price', '-base_price', 'stock_quantity']
+            ]
+            checks.append(('banners ?placement=', endpoint_queryset(BannerViewSet, {'placement': 'homepage'}), False))
+
+            failures = []
+            for name, queryset, ordered in checks:
+                plan = queryset.explain()
+                problems = self._problems(plan, queryset.model._meta.db_table, ordered)
+                if problems or options['verbosity'] > 1:
+                    self.stdout.write(f"\n{name}\n{plan}")
+                if problems:
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(f"{name}: {', '.join(problems)}"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"{name}: ok"))
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot queries lost their index: {', '.join(failures)}")
+
+    def _problems(self, plan, table, ordered):
+        problems = []
+        if re.search(FULL_SCAN[connection.vendor].format(table=table), plan):
+            problems.append(f'full scan of {table}')
+        if ordered and re.search(SORT[connection.vendor], plan):
+            problems.append('sorts instead of reading an index in order')
+        return problems
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.catalog.helpful_votes import flush_helpful_votes
+
+
+class Command(BaseCommand):
+    help = (
+        "Add new review helpful votes to ProductReview.helpful_count in batches. "
+        "Runs once by default; --loop keeps flushing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Run as a long-lived worker")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between flushes with --loop")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        while True:
+            votes, reviews = flush_helpful_votes(batch_size=options['batch_size'])
+            if votes:
+                self.stdout.write(f"{timezone.now().isoformat()} counted {votes} votes on {reviews} reviews")
+            # A full batch means more are waiting; go again without sleeping.
+            if votes == options['batch_size']:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
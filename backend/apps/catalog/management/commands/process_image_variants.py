@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.catalog.images import enqueue_missing, process_pending_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate resized WebP/AVIF variants for queued catalog images. Runs until "
+        "the queue is empty by default; --loop keeps polling for new work."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Run as a long-lived worker")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep when the queue is empty")
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--enqueue-missing', action='store_true',
+                            help="First queue every image without current variants (e.g. after a bulk import)")
+
+    def handle(self, *args, **options):
+        if options['enqueue_missing']:
+            self.stdout.write(f"queued {enqueue_missing()} images")
+        while True:
+            done, failed = process_pending_jobs(batch_size=options['batch_size'])
+            if done or failed:
+                self.stdout.write(f"{timezone.now().isoformat()} processed {done} images, {failed} failed")
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
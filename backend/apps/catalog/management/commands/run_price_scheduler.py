@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.catalog.price_scheduler import apply_due_price_transitions, next_transition_time
+
+
+class Command(BaseCommand):
+    help = (
+        "Flip materialized product prices when discount windows open or close. "
+        "Runs once by default; --loop keeps sleeping until the next scheduled transition."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Run as a long-lived worker")
+        parser.add_argument('--max-sleep', type=float, default=60.0,
+                            help="Upper bound in seconds between checks, so newly scheduled sales are seen")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        while True:
+            updated = apply_due_price_transitions(batch_size=options['batch_size'])
+            if updated:
+                self.stdout.write(f"{timezone.now().isoformat()} repriced {updated} products")
+            if not options['loop']:
+                break
+            time.sleep(self._seconds_until_next(options['max_sleep']))
+
+    def _seconds_until_next(self, max_sleep):
+        upcoming = next_transition_time()
+        if upcoming is None:
+            return max_sleep
+        return min(max(0.0, (upcoming - timezone.now()).total_seconds()), max_sleep)
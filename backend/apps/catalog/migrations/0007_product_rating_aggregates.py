@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:05
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('catalog', 'Product')
+    ProductReview = apps.get_model('catalog', 'ProductReview')
+    rows = (
+        ProductReview.objects.order_by()
+        .values('product_id')
+        .annotate(
+            total=Sum('rating'),
+            count=Count('id'),
+            **{f's{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)},
+        )
+    )
+    fields = ['rating_sum', 'rating_count', 'rating_average'] + [f'rating_{star}_count' for star in range(1, 6)]
+    batch = []
+    for row in rows.iterator(chunk_size=1000):
+        product = Product(pk=row['product_id'], rating_sum=row['total'], rating_count=row['count'],
+                          rating_average=row['total'] / row['count'])
+        for star in range(1, 6):
+            setattr(product, f'rating_{star}_count', row[f's{star}'])
+        batch.append(product)
+        if len(batch) >= 1000:
+            Product.objects.bulk_update(batch, fields)
+            batch = []
+    Product.objects.bulk_update(batch, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_remove_printspecs_product_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_average',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
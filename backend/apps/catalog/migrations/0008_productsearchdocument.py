@@ -0,0 +1,114 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The search index structures as of this migration (see apps.catalog.search),
+# frozen so later changes there can't change what this migration does.
+POSTGRES_SCHEMA = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE catalog_productsearchdocument ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple'::regconfig, coalesce(sku, '')), 'A') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(category_path, '')), 'B') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(body, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS catalog_psd_vector_gin ON catalog_productsearchdocument USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS catalog_psd_name_trgm ON catalog_productsearchdocument USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS catalog_psd_sku_trgm ON catalog_productsearchdocument USING gin (sku gin_trgm_ops)",
+]
+
+SQLITE_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS catalog_productsearch_fts USING fts5(
+        name, sku, category_path, body,
+        content='catalog_productsearchdocument', content_rowid='product_id',
+        tokenize='porter unicode61', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS catalog_productsearch_fts_ai AFTER INSERT ON catalog_productsearchdocument BEGIN
+        INSERT INTO catalog_productsearch_fts(rowid, name, sku, category_path, body)
+        VALUES (new.product_id, new.name, new.sku, new.category_path, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS catalog_productsearch_fts_ad AFTER DELETE ON catalog_productsearchdocument BEGIN
+        INSERT INTO catalog_productsearch_fts(catalog_productsearch_fts, rowid, name, sku, category_path, body)
+        VALUES ('delete', old.product_id, old.name, old.sku, old.category_path, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS catalog_productsearch_fts_au AFTER UPDATE ON catalog_productsearchdocument BEGIN
+        INSERT INTO catalog_productsearch_fts(catalog_productsearch_fts, rowid, name, sku, category_path, body)
+        VALUES ('delete', old.product_id, old.name, old.sku, old.category_path, old.body);
+        INSERT INTO catalog_productsearch_fts(rowid, name, sku, category_path, body)
+        VALUES (new.product_id, new.name, new.sku, new.category_path, new.body);
+    END
+    """,
+]
+
+SQLITE_TEARDOWN = [
+    "DROP TRIGGER IF EXISTS catalog_productsearch_fts_ai",
+    "DROP TRIGGER IF EXISTS catalog_productsearch_fts_ad",
+    "DROP TRIGGER IF EXISTS catalog_productsearch_fts_au",
+    "DROP TABLE IF EXISTS catalog_productsearch_fts",
+]
+
+
+def run_statements(schema_editor, statements):
+    with schema_editor.connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    run_statements(schema_editor, {'postgresql': POSTGRES_SCHEMA, 'sqlite': SQLITE_SCHEMA}.get(vendor, []))
+
+    Product = apps.get_model('catalog', 'Product')
+    ProductSearchDocument = apps.get_model('catalog', 'ProductSearchDocument')
+    products = Product.objects.select_related('subcategory__category').order_by('pk')
+    batch = []
+    for product in products.iterator(chunk_size=500):
+        batch.append(ProductSearchDocument(
+            product_id=product.pk,
+            name=product.name,
+            sku=product.sku,
+            category_path=f"{product.subcategory.category.name} {product.subcategory.name}"[:255],
+            body=' '.join(filter(None, [product.description, product.meta_title, product.meta_description])),
+        ))
+        if len(batch) >= 500:
+            ProductSearchDocument.objects.bulk_create(batch)
+            batch = []
+    ProductSearchDocument.objects.bulk_create(batch)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        run_statements(schema_editor, SQLITE_TEARDOWN)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='catalog.product')),
+                ('name', models.CharField(max_length=200)),
+                ('sku', models.CharField(max_length=50)),
+                ('category_path', models.CharField(blank=True, help_text='Category and subcategory names', max_length=255)),
+                ('body', models.TextField(blank=True, help_text='Description and SEO text')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:11
+
+from django.db import migrations, models
+from django.db.models import F
+from django.utils import timezone
+
+
+def seed_price_state(apps, schema_editor):
+    # Plain prices are final immediately; products with a discount are marked
+    # due now so the first run_price_scheduler pass materializes them.
+    Product = apps.get_model('catalog', 'Product')
+    Product.objects.update(current_price=F('base_price'))
+    Product.objects.filter(is_on_sale=True).update(next_price_transition_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_productsearchdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='current_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='discount_active',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='next_price_transition_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('next_price_transition_at__isnull', False)), fields=['next_price_transition_at'], name='product_price_transition_idx'),
+        ),
+        migrations.RunPython(seed_price_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_review_helpful_vote'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProductsBuild',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(choices=[('full', 'Full rebuild'), ('incremental', 'Incremental')], max_length=20)),
+                ('last_order_id', models.BigIntegerField(help_text='Highest order id included')),
+                ('order_items', models.PositiveIntegerField(default=0)),
+                ('products', models.PositiveIntegerField(default=0, help_text='Products whose related list was rewritten')),
+                ('seconds', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'get_latest_by': 'pk',
+            },
+        ),
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('co_orders', models.PositiveIntegerField(help_text='Orders containing both products')),
+                ('score', models.FloatField(help_text="co_orders normalised by both products' order counts (cosine)")),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='catalog.product')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'rank'], name='related_product_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'related'), name='related_product_unique')],
+            },
+        ),
+    ]
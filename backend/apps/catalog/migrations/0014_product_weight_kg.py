@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0013_related_products'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='weight_kg',
+            field=models.DecimalField(decimal_places=3, default=0, help_text='Shipping weight per unit', max_digits=8),
+        ),
+    ]
@@ -1,10 +1,17 @@
-﻿from django.db import models
+﻿from datetime import timedelta
+from decimal import Decimal
+
+from django.db import models
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True, help_text="URL-friendly version of the name")
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to='categories/', null=True, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, help_text="Resized WebP/AVIF copies (see apps.catalog.images)")
     is_active = models.BooleanField(default=True)
     display_order = models.IntegerField(default=0)
     
@@ -25,6 +32,7 @@ class Subcategory(models.Model):
     slug = models.SlugField(unique=True, help_text="URL-friendly version of the name")
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to='subcategories/', null=True, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, help_text="Resized WebP/AVIF copies (see apps.catalog.images)")
     is_active = models.BooleanField(default=True)
     display_order = models.IntegerField(default=0)
     
@@ -32,6 +40,54 @@ class Subcategory(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+def discount_active_q(now=None):
+    """SQL condition matching Product.final_price's "discount applies now" rules"""
+    now = now or timezone.now()
+    return (
+        Q(is_on_sale=True) & ~Q(discount_value=0)
+        & (Q(discount_start_date__isnull=True) | Q(discount_start_date__lte=now))
+        & (Q(discount_end_date__isnull=True) | Q(discount_end_date__gte=now))
+    )
+
+def effective_price_expression(now=None):
+    """SQL equivalent of Product.final_price evaluated at ``now``"""
+    price_field = models.DecimalField(max_digits=10, decimal_places=2)
+    discounted = Case(
+        # Multiply by 0.01 rather than dividing by 100: SQLite would otherwise
+        # truncate whole-number prices with integer division.
+        When(discount_type='percentage',
+             then=F('base_price') - F('base_price') * F('discount_value') * Value(Decimal('0.01'))),
+        default=F('base_price') - F('discount_value'),
+        output_field=price_field,
+    )
+    return Case(
+        When(discount_active_q(now), then=Greatest(discounted, Value(Decimal('0')), output_field=price_field)),
+        default=F('base_price'),
+        output_field=price_field,
+    )
+
+# A discount is still active at exactly discount_end_date, so it flips off just after.
+DISCOUNT_END_GRACE = timedelta(microseconds=1)
+
+def next_price_transition_expression(now=None):
+    """SQL for the next instant after ``now`` at which the effective price changes"""
+    now = now or timezone.now()
+    return Case(
+        When(Q(is_on_sale=False) | Q(discount_value=0), then=Value(None)),
+        When(discount_start_date__gt=now, then=F('discount_start_date')),
+        When(discount_end_date__gte=now, then=F('discount_end_date') + Value(DISCOUNT_END_GRACE)),
+        default=Value(None),
+        output_field=models.DateTimeField(),
+    )
+
+class ProductQuerySet(models.QuerySet):
+    def with_effective_price(self, now=None):
+        """Annotate ``effective_price`` so price filters/sorts run in the database"""
+        return self.annotate(effective_price=effective_price_expression(now))
+
+    def on_sale_now(self, now=None):
+        return self.filter(discount_active_q(now))
+
 class Product(models.Model):
     subcategory = models.ForeignKey(Subcategory, on_delete=models.CASCADE, related_name='products')
     name = models.CharField(max_length=200)
@@ -55,34 +111,103 @@ class Product(models.Model):
     
     # Media (S3 URLs)
     primary_image = models.URLField(max_length=500, blank=True, null=True, help_text="S3 URL for primary image")
+    primary_image_variants = models.JSONField(default=dict, blank=True, editable=False, help_text="Resized WebP/AVIF copies (see apps.catalog.images)")
     
     # Inventory & Logistics
     stock_quantity = models.IntegerField(default=0, help_text="Available stock")
     is_infinite_stock = models.BooleanField(default=True, help_text="For POD items")
+    weight_kg = models.DecimalField(max_digits=8, decimal_places=3, default=0, help_text="Shipping weight per unit")
     
     # SEO
     meta_title = models.CharField(max_length=255, blank=True)
     meta_description = models.TextField(blank=True)
     
+    # Review aggregates (maintained incrementally by apps.catalog.ratings)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_average = models.FloatField(default=0, db_index=True)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+
     # Status
     is_active = models.BooleanField(default=True)
     is_featured = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Materialized pricing state, refreshed on save and by run_price_scheduler
+    # when a discount window opens or closes.
+    current_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    discount_active = models.BooleanField(default=False)
+    next_price_transition_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['next_price_transition_at'],
+                condition=Q(next_price_transition_at__isnull=False),
+                name='product_price_transition_idx',
+            ),
+            # Storefront listings by ?subcategory= / ?category= / nested route, newest first.
+            # Checked by check_query_plans, as are the ones below.
+            models.Index(
+                fields=['subcategory', '-created_at'],
+                condition=Q(is_active=True),
+                name='product_active_subcat_idx',
+            ),
+            # Admin table sort columns
+            models.Index(fields=['-created_at'], name='product_created_idx'),
+            models.Index(fields=['base_price'], name='product_base_price_idx'),
+            models.Index(fields=['stock_quantity'], name='product_stock_idx'),
+        ]
+
+    PRICE_STATE_FIELDS = ['current_price', 'discount_active', 'next_price_transition_at']
+
+    def save(self, *args, **kwargs):
+        self.refresh_price_state()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | set(self.PRICE_STATE_FIELDS)
+        super().save(*args, **kwargs)
+
+    def refresh_price_state(self, now=None):
+        """Recompute the materialized price columns in Python (mirrors the SQL expressions)"""
+        now = now or timezone.now()
+        self.current_price = self.final_price_at(now)
+        self.discount_active = self._discount_applies(now)
+        self.next_price_transition_at = None
+        if self.is_on_sale and self.discount_value:
+            if self.discount_start_date and self.discount_start_date > now:
+                self.next_price_transition_at = self.discount_start_date
+            elif self.discount_end_date and self.discount_end_date >= now:
+                self.next_price_transition_at = self.discount_end_date + DISCOUNT_END_GRACE
+
+    @property
+    def rating_histogram(self):
+        """Review count per star, keyed '1' to '5'"""
+        return {str(star): getattr(self, f'rating_{star}_count') for star in range(1, 6)}
+
     @property
     def final_price(self):
-        """Calculate final price after discount"""
+        """Calculate final price after discount (see effective_price_expression for the SQL form)"""
+        return self.final_price_at(timezone.now())
+
+    def _discount_applies(self, now):
         if not self.is_on_sale or not self.discount_value:
-            return self.base_price
-        
-        from django.utils import timezone
-        now = timezone.now()
-        
-        # Check if discount is active
+            return False
         if self.discount_start_date and now < self.discount_start_date:
-            return self.base_price
+            return False
         if self.discount_end_date and now > self.discount_end_date:
+            return False
+        return True
+
+    def final_price_at(self, now):
+        if not self._discount_applies(now):
             return self.base_price
         
         # Apply discount
@@ -97,12 +222,29 @@ class Product(models.Model):
 
 
 
+class ProductSearchDocument(models.Model):
+    """
+    Denormalized search text for a product. The database's full-text engine
+    indexes these columns (see apps.catalog.search); kept in sync on save.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    name = models.CharField(max_length=200)
+    sku = models.CharField(max_length=50)
+    category_path = models.CharField(max_length=255, blank=True, help_text="Category and subcategory names")
+    body = models.TextField(blank=True, help_text="Description and SEO text")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Search document for {self.name}"
+
+
 class ProductImage(models.Model):
     """
     Multiple images for a product (gallery) - S3 URLs
     """
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.URLField(max_length=500, help_text="S3 URL for product image")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, help_text="Resized WebP/AVIF copies (see apps.catalog.images)")
     alt_text = models.CharField(max_length=200, blank=True)
     display_order = models.IntegerField(default=0)
     is_primary = models.BooleanField(default=False)
@@ -135,6 +277,69 @@ class ProductReview(models.Model):
     def __str__(self):
         return f"{self.user.email} - {self.product.name} ({self.rating}★)"
 
+class RelatedProduct(models.Model):
+    """
+    Top-K "frequently bought together" products, precomputed from order
+    co-occurrence by the build_related_products job (apps.orders.recommendations).
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_links')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    co_orders = models.PositiveIntegerField(help_text="Orders containing both products")
+    score = models.FloatField(help_text="co_orders normalised by both products' order counts (cosine)")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related'], name='related_product_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'rank'], name='related_product_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} (#{self.rank})"
+
+class RelatedProductsBuild(models.Model):
+    """One run of build_related_products; the latest marks where --incremental resumes."""
+    MODE_CHOICES = (
+        ('full', 'Full rebuild'),
+        ('incremental', 'Incremental'),
+    )
+    mode = models.CharField(max_length=20, choices=MODE_CHOICES)
+    last_order_id = models.BigIntegerField(help_text="Highest order id included")
+    order_items = models.PositiveIntegerField(default=0)
+    products = models.PositiveIntegerField(default=0, help_text="Products whose related list was rewritten")
+    seconds = models.FloatField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        get_latest_by = 'pk'
+
+    def __str__(self):
+        return f"{self.get_mode_display()} up to order {self.last_order_id}"
+
+class ReviewHelpfulVote(models.Model):
+    """
+    One customer's "helpful" vote on a review. Votes are folded into
+    ProductReview.helpful_count in batches (see apps.catalog.helpful_votes)
+    rather than rewriting the review row on every vote.
+    """
+    review = models.ForeignKey(ProductReview, on_delete=models.CASCADE, related_name='helpful_votes')
+    user = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='review_helpful_votes')
+    counted = models.BooleanField(default=False, help_text="Already included in the review's helpful_count")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['review', 'user'], name='review_helpful_vote_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['review'], condition=Q(counted=False), name='review_helpful_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} found review {self.review_id} helpful"
+
 class Banner(models.Model):
     """
     Hero banners and promotional sections for homepage
@@ -149,6 +354,7 @@ class Banner(models.Model):
     title = models.CharField(max_length=200)
     subtitle = models.CharField(max_length=200, blank=True)
     image = models.URLField(max_length=500, help_text="S3 URL for banner image")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, help_text="Resized WebP/AVIF copies (see apps.catalog.images)")
     placement = models.CharField(max_length=20, choices=PLACEMENT_CHOICES, default='homepage')
     
     # Buttons stored as JSON: [{"label": "Shop Now", "link": "/products", "primary": true}]
@@ -167,7 +373,47 @@ class Banner(models.Model):
     
     class Meta:
         ordering = ['placement', 'display_order', '-created_at']
+        indexes = [
+            models.Index(
+                fields=['placement', 'display_order'],
+                condition=Q(is_active=True),
+                name='banner_active_placement_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.get_placement_display()} - {self.title}"
 
+
+class ImageVariantJob(models.Model):
+    """
+    Pending resize work for one image field of one row, processed by the
+    process_image_variants worker. One row per (model, object, field).
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    model_label = models.CharField(max_length=100, help_text="e.g. catalog.ProductImage")
+    object_id = models.PositiveBigIntegerField()
+    field_name = models.CharField(max_length=50)
+    source = models.CharField(max_length=500, help_text="Image URL or storage name being processed")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model_label', 'object_id', 'field_name'], name='unique_image_variant_job'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'id'], name='image_variant_job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model_label}#{self.object_id}.{self.field_name} ({self.status})"
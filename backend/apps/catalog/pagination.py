@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ReviewCursorPagination(CursorPagination):
+    """
+    Newest-first cursor pagination for product reviews.
+
+    Cursor pages stay O(page_size) however deep a client scrolls, unlike
+    OFFSET-based pages on products with thousands of reviews.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    ordering = ('-created_at', '-id')
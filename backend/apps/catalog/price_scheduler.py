@@ -0,0 +1,52 @@
+"""
+Discount window scheduler.
+
+Product.save() keeps current_price/discount_active correct at write time; this
+module flips them when time alone changes the answer, i.e. when a discount
+window opens or closes. Due products are found through the partial index on
+next_price_transition_at and updated with set-based statements, followed by a
+single catalog cache invalidation per run.
+"""
+from django.db import models, transaction
+from django.db.models import Case, Min, Value, When
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .models import (
+    Product, discount_active_q, effective_price_expression, next_price_transition_expression
+)
+
+
+def apply_due_price_transitions(now=None, batch_size=1000):
+    """Materialize the price state of every product whose transition time has passed."""
+    now = now or timezone.now()
+    due = Product.objects.filter(next_price_transition_at__lte=now).order_by('next_price_transition_at')
+    updated = 0
+    while True:
+        ids = list(due.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            updated += Product.objects.filter(pk__in=ids).update(**price_state_updates(now), updated_at=now)
+    if updated:
+        bump_catalog_version()
+    return updated
+
+
+def price_state_updates(now=None):
+    """``update()`` kwargs recomputing Product.PRICE_STATE_FIELDS in SQL from the stored discount columns."""
+    now = now or timezone.now()
+    return {
+        'current_price': effective_price_expression(now),
+        'discount_active': Case(
+            When(discount_active_q(now), then=Value(True)),
+            default=Value(False),
+            output_field=models.BooleanField(),
+        ),
+        'next_price_transition_at': next_price_transition_expression(now),
+    }
+
+
+def next_transition_time():
+    """Earliest pending transition, or None if no discount window is scheduled."""
+    return Product.objects.aggregate(next=Min('next_price_transition_at'))['next']
@@ -0,0 +1,90 @@
+"""
+Denormalized review aggregates on Product.
+
+Each review write is turned into a single UPDATE that adjusts the stored sum,
+count, average and per-star histogram relative to their current values, so
+concurrent reviews never overwrite each other's contribution.
+"""
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
+
+from .models import Product, ProductReview
+
+STARS = range(1, 6)
+HISTOGRAM_FIELDS = [f'rating_{star}_count' for star in STARS]
+AGGREGATE_FIELDS = ['rating_sum', 'rating_count', 'rating_average'] + HISTOGRAM_FIELDS
+
+
+def apply_rating_change(product_id, old_rating=None, new_rating=None):
+    """
+    Move one review's contribution on a product from ``old_rating`` to ``new_rating``.
+
+    ``old_rating`` is None for a new review, ``new_rating`` is None for a deleted one.
+    """
+    if old_rating == new_rating:
+        return
+    sum_delta = (new_rating or 0) - (old_rating or 0)
+    count_delta = (new_rating is not None) - (old_rating is not None)
+
+    updates = {
+        'rating_sum': F('rating_sum') + sum_delta,
+        'rating_count': F('rating_count') + count_delta,
+        # Column references in SET see the pre-update row, so the new average
+        # is computed from the same deltas.
+        'rating_average': Coalesce(
+            Cast(F('rating_sum') + sum_delta, FloatField())
+            / NullIf(F('rating_count') + count_delta, 0),
+            Value(0.0),
+            output_field=FloatField(),
+        ),
+        'updated_at': timezone.now(),
+    }
+    if old_rating is not None:
+        updates[f'rating_{old_rating}_count'] = F(f'rating_{old_rating}_count') - 1
+    if new_rating is not None:
+        updates[f'rating_{new_rating}_count'] = F(f'rating_{new_rating}_count') + 1
+    Product.objects.filter(pk=product_id).update(**updates)
+
+
+def rebuild_rating_aggregates(batch_size=1000):
+    """
+    Recompute aggregates for every product from ProductReview in bulk.
+
+    Returns the number of products that have at least one review.
+    """
+    rows = (
+        ProductReview.objects.order_by()
+        .values('product_id')
+        .annotate(
+            total=Sum('rating'),
+            count=Count('id'),
+            **{f's{star}': Count('id', filter=Q(rating=star)) for star in STARS},
+        )
+    )
+    reviewed = 0
+    with transaction.atomic():
+        Product.objects.filter(rating_count__gt=0).update(
+            rating_sum=0, rating_count=0, rating_average=0,
+            **{field: 0 for field in HISTOGRAM_FIELDS},
+        )
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            product = Product(
+                pk=row['product_id'],
+                rating_sum=row['total'],
+                rating_count=row['count'],
+                rating_average=row['total'] / row['count'],
+            )
+            for star in STARS:
+                setattr(product, f'rating_{star}_count', row[f's{star}'])
+            batch.append(product)
+            if len(batch) >= batch_size:
+                Product.objects.bulk_update(batch, AGGREGATE_FIELDS)
+                reviewed += len(batch)
+                batch = []
+        if batch:
+            Product.objects.bulk_update(batch, AGGREGATE_FIELDS)
+            reviewed += len(batch)
+    return reviewed
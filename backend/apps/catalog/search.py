@@ -0,0 +1,270 @@
+"""
+Full-text product search.
+
+Each product has a ProductSearchDocument row holding its searchable text.
+The database indexes that table natively:
+
+* PostgreSQL: a generated, weighted ``tsvector`` column with a GIN index for
+  ranked full-text matches, plus ``pg_trgm`` GIN indexes on name and SKU for
+  typo-tolerant and partial-SKU matches.
+* SQLite (local/dev): an external-content FTS5 table kept in sync by triggers,
+  ranked with bm25 and prefix matching.
+
+Other backends fall back to ``icontains`` over the document table.
+"""
+import re
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.db.models import FloatField, Func, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Product, ProductSearchDocument
+
+SearchHit = namedtuple('SearchHit', ['product_id', 'rank', 'highlight'])
+
+DOCUMENT_TABLE = ProductSearchDocument._meta.db_table
+FTS_TABLE = 'catalog_productsearch_fts'
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_STOP = '</mark>'
+
+POSTGRES_SCHEMA = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"""
+    ALTER TABLE {DOCUMENT_TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple'::regconfig, coalesce(sku, '')), 'A') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(category_path, '')), 'B') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(body, '')), 'C')
+    ) STORED
+    """,
+    f"CREATE INDEX IF NOT EXISTS catalog_psd_vector_gin ON {DOCUMENT_TABLE} USING gin (search_vector)",
+    f"CREATE INDEX IF NOT EXISTS catalog_psd_name_trgm ON {DOCUMENT_TABLE} USING gin (name gin_trgm_ops)",
+    f"CREATE INDEX IF NOT EXISTS catalog_psd_sku_trgm ON {DOCUMENT_TABLE} USING gin (sku gin_trgm_ops)",
+]
+
+SQLITE_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, sku, category_path, body,
+        content='{DOCUMENT_TABLE}', content_rowid='product_id',
+        tokenize='porter unicode61', prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, sku, category_path, body)
+        VALUES (new.product_id, new.name, new.sku, new.category_path, new.body);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, sku, category_path, body)
+        VALUES ('delete', old.product_id, old.name, old.sku, old.category_path, old.body);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, sku, category_path, body)
+        VALUES ('delete', old.product_id, old.name, old.sku, old.category_path, old.body);
+        INSERT INTO {FTS_TABLE}(rowid, name, sku, category_path, body)
+        VALUES (new.product_id, new.name, new.sku, new.category_path, new.body);
+    END
+    """,
+]
+
+SQLITE_TEARDOWN = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def install_search_schema(conn=connection):
+    """Create the vendor-specific index structures. Safe to run repeatedly."""
+    statements = {'postgresql': POSTGRES_SCHEMA, 'sqlite': SQLITE_SCHEMA}.get(conn.vendor, [])
+    with conn.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def uninstall_search_schema(conn=connection):
+    if conn.vendor == 'sqlite':
+        with conn.cursor() as cursor:
+            for sql in SQLITE_TEARDOWN:
+                cursor.execute(sql)
+
+
+def build_document(product):
+    """Searchable text for a product with ``subcategory__category`` loaded."""
+    subcategory = product.subcategory
+    return ProductSearchDocument(
+        product_id=product.pk,
+        name=product.name,
+        sku=product.sku,
+        category_path=f"{subcategory.category.name} {subcategory.name}"[:255],
+        body=' '.join(filter(None, [product.description, product.meta_title, product.meta_description])),
+    )
+
+
+def index_products(product_ids, batch_size=500):
+    """Upsert search documents for the given products in batches."""
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), batch_size):
+        chunk = product_ids[start:start + batch_size]
+        products = Product.objects.filter(pk__in=chunk).select_related('subcategory__category').only(
+            'id', 'name', 'sku', 'description', 'meta_title', 'meta_description',
+            'subcategory__name', 'subcategory__category__name',
+        )
+        ProductSearchDocument.objects.bulk_create(
+            [build_document(p) for p in products],
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['name', 'sku', 'category_path', 'body', 'updated_at'],
+        )
+
+
+def rebuild_search_index(batch_size=500):
+    """Ensure the schema exists and re-index every product. Returns the product count."""
+    install_search_schema()
+    ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    with transaction.atomic():
+        if connection.vendor == 'sqlite':
+            # Resync FTS5 with the content table first; its triggers assume the
+            # two already agree when rows are updated below.
+            with connection.cursor() as cursor:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        ProductSearchDocument.objects.exclude(product_id__in=Product.objects.values('pk')).delete()
+        index_products(ids, batch_size=batch_size)
+    return len(ids)
+
+
+def search_products(term, limit=100):
+    """Return up to ``limit`` SearchHits for ``term``, best match first."""
+    term = (term or '').strip()
+    if not term:
+        return []
+    if connection.vendor == 'postgresql':
+        return _search_postgres(term, limit)
+    if connection.vendor == 'sqlite':
+        return _search_sqlite(term, limit)
+    return _search_fallback(term, limit)
+
+
+def matching_product_ids(term):
+    """
+    A subquery of the ids of products matching ``term``, for ``pk__in``. Unlike
+    search_products it has no limit, so it can be combined with other filters.
+    """
+    term = (term or '').strip()
+    if connection.vendor == 'postgresql':
+        return RawSQL(
+            f"SELECT d.product_id FROM {DOCUMENT_TABLE} d, websearch_to_tsquery('english', %s) AS q(query) "
+            f"WHERE d.search_vector @@ q.query OR d.name %% %s OR d.sku ILIKE %s",
+            [term, term, _like_prefix(term)],
+        )
+    if connection.vendor == 'sqlite':
+        match = _sqlite_match(term)
+        if not match:
+            return ProductSearchDocument.objects.none().values('product_id')
+        return RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+    return ProductSearchDocument.objects.filter(_fallback_q(term)).values('product_id')
+
+
+class SearchRank(Func):
+    """
+    Relevance of each product for ``term``, higher is better, computed per row
+    against the search index. Filter with matching_product_ids first.
+    """
+    output_field = FloatField()
+
+    def __init__(self, term, expression='pk'):
+        self.term = (term or '').strip()
+        super().__init__(expression)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return compiler.compile(Value(0.0))
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        pk_sql, pk_params = compiler.compile(self.source_expressions[0])
+        sql = (
+            f"(SELECT ts_rank_cd(d.search_vector, q.query) + similarity(d.name, %s) "
+            f"FROM {DOCUMENT_TABLE} d, websearch_to_tsquery('english', %s) AS q(query) "
+            f"WHERE d.product_id = {pk_sql})"
+        )
+        return sql, [self.term, self.term, *pk_params]
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        pk_sql, pk_params = compiler.compile(self.source_expressions[0])
+        sql = (
+            f"(SELECT -bm25({FTS_TABLE}, 10.0, 10.0, 4.0, 1.0) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid = {pk_sql})"
+        )
+        return sql, [_sqlite_match(self.term), *pk_params]
+
+
+def _search_postgres(term, limit):
+    sql = f"""
+        SELECT hits.product_id, hits.rank,
+               ts_headline('english', d.name, hits.query,
+                           'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, HighlightAll=true'),
+               ts_headline('english', d.body, hits.query,
+                           'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxFragments=2, MaxWords=20, MinWords=5')
+        FROM (
+            SELECT d.product_id, q.query,
+                   ts_rank_cd(d.search_vector, q.query) + similarity(d.name, %s) AS rank
+            FROM {DOCUMENT_TABLE} d, websearch_to_tsquery('english', %s) AS q(query)
+            WHERE d.search_vector @@ q.query OR d.name %% %s OR d.sku ILIKE %s
+            ORDER BY rank DESC
+            LIMIT %s
+        ) hits
+        JOIN {DOCUMENT_TABLE} d ON d.product_id = hits.product_id
+        ORDER BY hits.rank DESC
+    """
+    params = [term, term, term, _like_prefix(term), limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return [SearchHit(pk, rank, {'name': name, 'body': body}) for pk, rank, name, body in rows]
+
+
+def _search_sqlite(term, limit):
+    match = _sqlite_match(term)
+    if not match:
+        return []
+    sql = f"""
+        SELECT rowid, -bm25({FTS_TABLE}, 10.0, 10.0, 4.0, 1.0) AS rank,
+               highlight({FTS_TABLE}, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_STOP}'),
+               snippet({FTS_TABLE}, 3, '{HIGHLIGHT_START}', '{HIGHLIGHT_STOP}', '...', 20)
+        FROM {FTS_TABLE}
+        WHERE {FTS_TABLE} MATCH %s
+        ORDER BY rank DESC
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, limit])
+        rows = cursor.fetchall()
+    return [SearchHit(pk, rank, {'name': name, 'body': body}) for pk, rank, name, body in rows]
+
+
+def _search_fallback(term, limit):
+    docs = ProductSearchDocument.objects.filter(_fallback_q(term)).values_list('product_id', 'name')[:limit]
+    return [SearchHit(pk, 0, {'name': name, 'body': ''}) for pk, name in docs]
+
+
+def _sqlite_match(term):
+    """An FTS5 MATCH expression for ``term``, or '' if it has no words."""
+    # Quote every token so FTS5 operators in user input are treated as text,
+    # and prefix-match so partial words still hit.
+    return ' '.join(f'"{token}"*' for token in re.findall(r'\w+', term))
+
+
+def _fallback_q(term):
+    return Q(name__icontains=term) | Q(sku__icontains=term) | Q(body__icontains=term)
+
+
+def _like_prefix(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'{escaped}%'
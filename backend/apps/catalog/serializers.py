@@ -1,34 +1,60 @@
+from decimal import Decimal
+
 from rest_framework import serializers
+from .fieldsets import DynamicFieldsMixin
+from .images import variant_map
 from .models import Category, Subcategory, Product, ProductImage, ProductReview, Banner
 from apps.zakeke.models import ZakekeProduct
 
+CENT = Decimal('0.01')
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Resized copies of an image field with ready-made srcset strings
+    (see apps.catalog.images); null until the variant worker has run.
+    """
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        self.model_paths = [image_field, f'{image_field}_variants']
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        return variant_map(instance, self.image_field)
+
 
+class ProductMinimalSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    primary_image_variants = ImageVariantsField('primary_image')
 
-class ProductMinimalSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = ['id', 'name', 'slug', 'primary_image', 'is_featured']
+        fields = ['id', 'name', 'slug', 'primary_image', 'primary_image_variants', 'is_featured']
 
-class SubcategorySerializer(serializers.ModelSerializer):
+class SubcategorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     products = ProductMinimalSerializer(many=True, read_only=True)
+    image_variants = ImageVariantsField('image')
     
     class Meta:
         model = Subcategory
-        fields = ['id', 'name', 'slug', 'description', 'image', 'category', 'products']
+        fields = ['id', 'name', 'slug', 'description', 'image', 'image_variants', 'category', 'products']
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     subcategories = SubcategorySerializer(many=True, read_only=True)
+    image_variants = ImageVariantsField('image')
 
     class Meta:
         model = Category
-        fields = ['id', 'name', 'slug', 'description', 'image', 'subcategories']
+        fields = ['id', 'name', 'slug', 'description', 'image', 'image_variants', 'subcategories']
 
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField('image')
+
     class Meta:
         model = ProductImage
-        fields = ['id', 'product', 'image', 'alt_text', 'display_order', 'is_primary', 'created_at']
+        fields = ['id', 'product', 'image', 'image_variants', 'alt_text', 'display_order', 'is_primary', 'created_at']
         read_only_fields = ['created_at']
 
 class ProductReviewSerializer(serializers.ModelSerializer):
@@ -45,35 +71,43 @@ class ProductReviewSerializer(serializers.ModelSerializer):
         return obj.user.get_full_name() if hasattr(obj.user, 'get_full_name') else obj.user.email
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     subcategory_name = serializers.ReadOnlyField(source='subcategory.name')
     images = ProductImageSerializer(many=True, read_only=True)
-    reviews = ProductReviewSerializer(many=True, read_only=True)
-    final_price = serializers.ReadOnlyField()
-    average_rating = serializers.SerializerMethodField()
-    review_count = serializers.SerializerMethodField()
+    final_price = serializers.SerializerMethodField()
+    average_rating = serializers.ReadOnlyField(source='rating_average')
+    review_count = serializers.ReadOnlyField(source='rating_count')
+    rating_histogram = serializers.ReadOnlyField()
+    primary_image_variants = ImageVariantsField('primary_image')
     zakeke_product_id = serializers.CharField(required=False, allow_blank=True, allow_null=True, write_only=True)
 
     class Meta:
         model = Product
         fields = [
             'id', 'subcategory', 'subcategory_name', 'name', 'slug', 'sku',
-            'description', 'base_price', 'stock_quantity', 
+            'description', 'base_price', 'stock_quantity', 'weight_kg',
             'discount_type', 'discount_value', 'discount_start_date', 'discount_end_date', 'is_on_sale',
-            'final_price', 'primary_image', 'images',
-            'reviews', 'average_rating', 'review_count',
+            'final_price', 'primary_image', 'primary_image_variants', 'images',
+            'average_rating', 'review_count', 'rating_histogram',
             'zakeke_product_id',
             'meta_title', 'meta_description', 'is_active', 'is_featured'
         ]
-    
-    def get_average_rating(self, obj):
-        reviews = obj.reviews.all()
-        if reviews:
-            return sum(r.rating for r in reviews) / len(reviews)
-        return 0
-    
-    def get_review_count(self, obj):
-        return obj.reviews.count()
+        field_dependencies = {
+            'final_price': [
+                'current_price', 'base_price', 'is_on_sale', 'discount_type', 'discount_value',
+                'discount_start_date', 'discount_end_date',
+            ],
+            'rating_histogram': [f'rating_{star}_count' for star in range(1, 6)],
+            'zakeke_product_id': ['zakeke_mapping.zakeke_product_id'],
+        }
+
+    def get_final_price(self, obj):
+        # The price the view filtered and sorted on, when it annotated one, so
+        # the two always agree; otherwise the column run_price_scheduler keeps current.
+        effective_price = getattr(obj, 'effective_price', None)
+        if effective_price is not None:
+            return effective_price.quantize(CENT)
+        return obj.current_price if obj.current_price is not None else obj.final_price
 
     def create(self, validated_data):
         zakeke_id = validated_data.pop('zakeke_product_id', None)
@@ -113,19 +147,50 @@ class ProductSerializer(serializers.ModelSerializer):
         
     def to_representation(self, instance):
         ret = super().to_representation(instance)
+        if 'zakeke_product_id' not in self.fields:
+            return ret
         if hasattr(instance, 'zakeke_mapping'):
             ret['zakeke_product_id'] = instance.zakeke_mapping.zakeke_product_id
         else:
             ret['zakeke_product_id'] = None
         return ret
 
+class ProductListSerializer(ProductSerializer):
+    """
+    Lightweight product representation for list/grid responses.
+    Reviews are served separately by /products/{id}/reviews/.
+    """
+    class Meta(ProductSerializer.Meta):
+        fields = [
+            'id', 'subcategory', 'subcategory_name', 'name', 'slug', 'sku',
+            'base_price', 'final_price', 'is_on_sale', 'primary_image', 'primary_image_variants',
+            'stock_quantity', 'average_rating', 'review_count',
+            'zakeke_product_id', 'is_active', 'is_featured'
+        ]
+        expandable_fields = [
+            'description', 'images', 'rating_histogram', 'discount_type', 'discount_value',
+            'discount_start_date', 'discount_end_date', 'meta_title', 'meta_description',
+        ]
+
+class AdminProductListSerializer(ProductListSerializer):
+    """
+    List representation for the admin products table, which pre-fills its
+    edit form from the row.
+    """
+    class Meta(ProductListSerializer.Meta):
+        fields = ProductListSerializer.Meta.fields + [
+            'description', 'discount_type', 'discount_value',
+            'discount_start_date', 'discount_end_date'
+        ]
+
 class BannerSerializer(serializers.ModelSerializer):
     buttons = serializers.SerializerMethodField()
     footer = serializers.CharField(source='footer_text', read_only=True)
+    image_variants = ImageVariantsField('image')
     
     class Meta:
         model = Banner
-        fields = ['id', 'title', 'subtitle', 'image', 'placement', 'buttons', 'footer', 
+        fields = ['id', 'title', 'subtitle', 'image', 'image_variants', 'placement', 'buttons', 'footer', 
                   'is_active', 'display_order', 'start_date', 'end_date']
     
     def get_buttons(self, obj):
@@ -0,0 +1,86 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from apps.zakeke.models import ZakekeProduct
+from .cache import BANNER_VERSION_KEY, bump_catalog_version, bump_version
+from .images import enqueue_variants
+from .models import Category, Subcategory, Product, ProductImage, ProductReview, Banner
+from .ratings import apply_rating_change
+from .search import index_products
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Subcategory)
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=ZakekeProduct)
+def invalidate_catalog_cache(sender, **kwargs):
+    """Any change to the catalog hierarchy invalidates cached catalog payloads."""
+    bump_catalog_version()
+
+
+@receiver([post_save, post_delete], sender=Banner)
+def invalidate_banner_cache(sender, **kwargs):
+    bump_version(BANNER_VERSION_KEY)
+
+
+@receiver(pre_save, sender=ProductReview)
+def remember_previous_rating(sender, instance, raw=False, **kwargs):
+    """Stash the stored rating/product so post_save can apply a delta."""
+    instance._previous_rating = None
+    if instance.pk and not raw:
+        instance._previous_rating = (
+            ProductReview.objects.filter(pk=instance.pk)
+            .values_list('product_id', 'rating')
+            .first()
+        )
+
+
+@receiver(post_save, sender=ProductReview)
+def update_rating_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_rating', None)
+    if previous is None:
+        apply_rating_change(instance.product_id, new_rating=instance.rating)
+        return
+    old_product_id, old_rating = previous
+    if old_product_id != instance.product_id:
+        apply_rating_change(old_product_id, old_rating=old_rating)
+        apply_rating_change(instance.product_id, new_rating=instance.rating)
+    else:
+        apply_rating_change(instance.product_id, old_rating, instance.rating)
+
+
+@receiver(post_delete, sender=ProductReview)
+def update_rating_on_delete(sender, instance, **kwargs):
+    apply_rating_change(instance.product_id, old_rating=instance.rating)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_products([instance.pk])
+
+
+@receiver(post_save, sender=Subcategory)
+def reindex_subcategory_products(sender, instance, created=False, raw=False, **kwargs):
+    """Category path text is part of each product's search document."""
+    if not raw and not created:
+        index_products(instance.products.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created=False, raw=False, **kwargs):
+    if not raw and not created:
+        index_products(Product.objects.filter(subcategory__category=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Subcategory)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Banner)
+def queue_image_variants(sender, instance, raw=False, **kwargs):
+    if not raw:
+        enqueue_variants(instance)
@@ -0,0 +1,34 @@
+"""Admin dashboard counters for the catalog; see shop_project.stats."""
+from django.db.models import Count, Q
+
+from shop_project.stats import cached_stats
+from .models import Category, Product
+
+LOW_STOCK_THRESHOLD = 10
+
+
+def compute_category_stats():
+    stats = Category.objects.aggregate(
+        total=Count('pk'),
+        active=Count('pk', filter=Q(is_active=True)),
+    )
+    stats['inactive'] = stats['total'] - stats['active']
+    return stats
+
+
+def compute_product_stats():
+    stats = Product.objects.aggregate(
+        total=Count('pk'),
+        active=Count('pk', filter=Q(is_active=True)),
+        low_stock=Count('pk', filter=Q(stock_quantity__lt=LOW_STOCK_THRESHOLD, is_infinite_stock=False)),
+    )
+    stats['inactive'] = stats['total'] - stats['active']
+    return stats
+
+
+def category_stats():
+    return cached_stats('categories', compute_category_stats)
+
+
+def product_stats():
+    return cached_stats('products', compute_product_stats)
@@ -1,3 +1,692 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework import status
+from apps.users.models import User
+from apps.zakeke.models import ZakekeProduct
+from shop_project.downloads import DownloadError, is_allowed
+from .cache import get_active_banners
+from .catalog_io import export_catalog, import_catalog, read_rows
+from .images import build_variants, read_source
+from .models import (
+    DISCOUNT_END_GRACE, Category, Subcategory, Product, ProductReview, Banner, ImageVariantJob,
+)
+from .price_scheduler import apply_due_price_transitions
+
+
+class CatalogTreeCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Business Cards', slug='business-cards')
+        self.subcategory = Subcategory.objects.create(
+            category=self.category, name='Standard', slug='standard'
+        )
+        Product.objects.create(
+            subcategory=self.subcategory, name='Matte Card', slug='matte-card',
+            sku='BC-001', base_price=10
+        )
+
+    def test_tree_is_served_from_cache(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/v1/categories/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['subcategories'][0]['products'][0]['name'], 'Matte Card')
+
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/v1/categories/')
+        self.assertEqual(cached.data, response.data)
+
+    def test_etag_revalidation_and_invalidation(self):
+        response = self.client.get('/api/v1/categories/')
+        etag = response['ETag']
+
+        not_modified = self.client.get('/api/v1/categories/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(
+                subcategory=self.subcategory, name='Glossy Card', slug='glossy-card',
+                sku='BC-002', base_price=12
+            )
+        response = self.client.get('/api/v1/categories/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data[0]['subcategories'][0]['products']), 2)
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Signs', slug='signs')
+        subcategory = Subcategory.objects.create(category=category, name='Banners', slug='banners')
+        self.product = Product.objects.create(
+            subcategory=subcategory, name='Vinyl Banner', slug='vinyl-banner',
+            sku='SG-001', base_price=40
+        )
+        self.alice = User.objects.create_user(username='alice', password='password')
+        self.bob = User.objects.create_user(username='bob', password='password')
+
+    def test_aggregates_follow_review_writes(self):
+        review = ProductReview.objects.create(product=self.product, user=self.alice, rating=5, comment='Great')
+        ProductReview.objects.create(product=self.product, user=self.bob, rating=2, comment='Faded')
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_sum, self.product.rating_count), (7, 2))
+        self.assertEqual(self.product.rating_average, 3.5)
+
+        review.rating = 3
+        review.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_histogram, {'1': 0, '2': 1, '3': 1, '4': 0, '5': 0})
+
+        review.delete()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_sum, self.product.rating_count), (2, 1))
+        self.assertEqual(self.product.rating_average, 2.0)
+
+    def test_rebuild_command_repairs_drift(self):
+        ProductReview.objects.create(product=self.product, user=self.alice, rating=4, comment='Good')
+        Product.objects.filter(pk=self.product.pk).update(rating_sum=99, rating_count=9, rating_4_count=0)
+
+        call_command('rebuild_rating_aggregates', stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_sum, self.product.rating_count), (4, 1))
+        self.assertEqual(self.product.rating_4_count, 1)
+
+
+class ProductReviewEndpointTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        category = Category.objects.create(name='Stickers', slug='stickers')
+        subcategory = Subcategory.objects.create(category=category, name='Die Cut', slug='die-cut')
+        self.product = Product.objects.create(
+            subcategory=subcategory, name='Die Cut Sticker', slug='die-cut-sticker',
+            sku='ST-001', base_price=3
+        )
+        for i in range(5):
+            user = User.objects.create(username=f'reviewer{i}')
+            ProductReview.objects.create(product=self.product, user=user, rating=4, comment=f'Review {i}')
+
+    def test_product_list_omits_reviews(self):
+        response = self.client.get('/api/v1/products/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('reviews', response.data[0])
+        self.assertNotIn('images', response.data[0])
+        self.assertEqual(response.data[0]['review_count'], 5)
+
+    def test_reviews_are_cursor_paginated(self):
+        url = f'/api/v1/products/{self.product.id}/reviews/'
+        response = self.client.get(url, {'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['comment'] for r in response.data['results']], ['Review 4', 'Review 3', 'Review 2'])
+        self.assertIsNotNone(response.data['next'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([r['comment'] for r in response.data['results']], ['Review 1', 'Review 0'])
+        self.assertIsNone(response.data['next'])
+
+
+class ReviewHelpfulVoteTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        category = Category.objects.create(name='Stickers', slug='stickers')
+        subcategory = Subcategory.objects.create(category=category, name='Die Cut', slug='die-cut')
+        product = Product.objects.create(
+            subcategory=subcategory, name='Die Cut Sticker', slug='die-cut-sticker', sku='ST-001', base_price=3
+        )
+        self.author = User.objects.create(username='author')
+        self.review = ProductReview.objects.create(product=product, user=self.author, rating=5, comment='Great')
+        self.url = f'/api/v1/products/{product.id}/reviews/{self.review.id}/helpful/'
+
+    def vote(self, user, method='post'):
+        self.client.force_authenticate(user)
+        return getattr(self.client, method)(self.url)
+
+    def test_one_vote_per_customer_counted_in_batches(self):
+        voter = User.objects.create(username='voter')
+        self.assertEqual(self.vote(voter).status_code, status.HTTP_201_CREATED)
+        response = self.vote(voter)
+        self.assertEqual((response.status_code, response.data['helpful_count']), (status.HTTP_200_OK, 1))
+        self.vote(User.objects.create(username='other'))
+        self.assertEqual(self.vote(self.author).status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Votes don't rewrite the review until the worker folds them in
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.helpful_count, 0)
+        call_command('flush_helpful_votes', stdout=StringIO())
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.helpful_count, 2)
+
+        response = self.vote(voter, 'delete')
+        self.assertEqual(response.data['helpful_count'], 1)
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.helpful_count, 1)
+
+    def test_voting_requires_login(self):
+        self.assertIn(self.client.post(self.url).status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+
+class ProductFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = Category.objects.create(name='Print', slug='print')
+        cards = Subcategory.objects.create(category=category, name='Cards', slug='cards', display_order=1)
+        flyers = Subcategory.objects.create(category=category, name='Flyers', slug='flyers', display_order=2)
+        Subcategory.objects.create(
+            category=Category.objects.create(name='Wall', slug='wall'), name='Posters', slug='posters',
+        )
+        for i, (subcategory, price, featured, stock) in enumerate([
+            (cards, 5, True, 0), (cards, 12, False, 3), (flyers, 30, False, 0), (flyers, 300, True, 8),
+        ]):
+            Product.objects.create(
+                subcategory=subcategory, name=f'P{i}', slug=f'p{i}', sku=f'P{i}', base_price=price,
+                is_featured=featured, stock_quantity=stock, is_infinite_stock=False,
+                rating_average=4.5 if featured else 2,
+            )
+        Product.objects.filter(sku='P2').update(discount_type='fixed', discount_value=25, is_on_sale=True)
+
+    def test_counts_come_from_one_cached_aggregate(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/products/facets/', {'category': 'print', 'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Subcategory names, the aggregate, then the result page
+        self.assertEqual(len(queries), 3)
+        facets = response.data['facets']
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual([(f['value'], f['count']) for f in facets['subcategory']], [('cards', 2), ('flyers', 2)])
+        self.assertEqual([f['count'] for f in facets['price']], [2, 1, 0, 0, 0, 1])
+        self.assertEqual([f['count'] for f in facets['rating']], [2, 2, 4, 4])
+        self.assertEqual((facets['on_sale'], facets['featured'], facets['in_stock']), (1, 2, 2))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/v1/products/facets/', {'category': 'print', 'limit': 2})
+        self.assertEqual(len(queries), 1)
+
+        response = self.client.get('/api/v1/products/facets/', {'category': 'print', 'limit': -5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_facet_values_filter_the_listing(self):
+        response = self.client.get('/api/v1/products/facets/', {'price': '0-10', 'in_stock': 'true'})
+        self.assertEqual(response.data['count'], 0)
+        response = self.client.get('/api/v1/products/', {'price': '250-', 'featured': 'true', 'min_rating': 4})
+        self.assertEqual([p['sku'] for p in response.data], ['P3'])
+        self.assertEqual(self.client.get('/api/v1/products/', {'price': 'cheap'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        category = Category.objects.create(name='Business Cards', slug='business-cards')
+        subcategory = Subcategory.objects.create(category=category, name='Premium', slug='premium')
+        self.glossy = Product.objects.create(
+            subcategory=subcategory, name='Glossy Business Card', slug='glossy-card', sku='BC-100',
+            base_price=5, description='Thick glossy stock with rounded corners'
+        )
+        self.matte = Product.objects.create(
+            subcategory=subcategory, name='Matte Business Card', slug='matte-card', sku='BC-200',
+            base_price=5, description='Uncoated matte stock'
+        )
+        call_command('rebuild_search_index', stdout=StringIO())
+
+    def test_list_search_uses_index(self):
+        response = self.client.get('/api/v1/products/', {'search': 'gloss'})
+        self.assertEqual([p['id'] for p in response.data], [self.glossy.id])
+
+        response = self.client.get('/api/v1/products/', {'search': 'premium card'})
+        self.assertEqual({p['id'] for p in response.data}, {self.glossy.id, self.matte.id})
+
+    def test_conditional_list_search_runs_the_search_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/products/', {'search': 'gloss'})
+        self.assertEqual([p['id'] for p in response.data], [self.glossy.id])
+        self.assertEqual(sum('catalog_productsearch_fts' in q['sql'] for q in queries.captured_queries), 1)
+
+        not_modified = self.client.get('/api/v1/products/', {'search': 'gloss'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.glossy.name = 'Glossy Business Card XL'
+        self.glossy.save()
+        changed = self.client.get('/api/v1/products/', {'search': 'gloss'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+
+    def test_list_search_ranks_in_sql_with_other_filters(self):
+        self.matte.description = 'Pairs well with glossy envelopes'
+        self.matte.save()
+        call_command('rebuild_search_index', stdout=StringIO())
+
+        response = self.client.get('/api/v1/products/', {'search': 'glossy'})
+        self.assertEqual([p['id'] for p in response.data], [self.glossy.id, self.matte.id])
+        response = self.client.get('/api/v1/products/', {'search': 'glossy', 'ordering': '-created_at'})
+        self.assertEqual([p['id'] for p in response.data], [self.matte.id, self.glossy.id])
+
+        self.glossy.is_active = False
+        self.glossy.save()
+        response = self.client.get('/api/v1/products/facets/', {'search': 'glossy', 'subcategory': 'premium'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['id'] for p in response.data['results']], [self.matte.id])
+
+    def test_search_endpoint_ranks_and_highlights(self):
+        self.matte.name = 'Matte Card'
+        self.matte.save()
+
+        response = self.client.get('/api/v1/products/search/', {'q': 'matte'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = response.data['results'][0]
+        self.assertEqual(result['product']['id'], self.matte.id)
+        self.assertEqual(result['highlight']['name'], '<mark>Matte</mark> Card')
+
+        response = self.client.get('/api/v1/products/search/', {'q': 'card', 'limit': -2})
+        self.assertEqual(len(response.data['results']), 1)
+
+
+class EffectivePriceTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        category = Category.objects.create(name='Apparel', slug='apparel')
+        subcategory = Subcategory.objects.create(category=category, name='T-Shirts', slug='t-shirts')
+        now = timezone.now()
+
+        def product(sku, base_price, **discount):
+            return Product.objects.create(
+                subcategory=subcategory, name=sku, slug=sku.lower(), sku=sku, base_price=base_price, **discount
+            )
+
+        self.plain = product('TS-1', 30)
+        self.percent = product('TS-2', 40, is_on_sale=True, discount_type='percentage', discount_value=50)
+        self.fixed = product('TS-3', 25, is_on_sale=True, discount_type='fixed', discount_value=30)
+        self.expired = product('TS-4', 22, is_on_sale=True, discount_type='fixed', discount_value=5,
+                               discount_end_date=now - timedelta(days=1))
+
+    def test_annotation_matches_final_price(self):
+        for product in Product.objects.with_effective_price():
+            self.assertEqual(round(product.effective_price, 2), round(product.final_price, 2))
+
+    def test_filter_and_order_by_final_price(self):
+        response = self.client.get('/api/v1/products/', {'ordering': 'final_price'})
+        self.assertEqual([p['sku'] for p in response.data], ['TS-3', 'TS-2', 'TS-4', 'TS-1'])
+
+        response = self.client.get('/api/v1/products/', {'min_price': 15, 'max_price': 25, 'ordering': '-final_price'})
+        self.assertEqual([p['sku'] for p in response.data], ['TS-4', 'TS-2'])
+
+        response = self.client.get('/api/v1/products/', {'on_sale': 'true'})
+        self.assertEqual({p['sku'] for p in response.data}, {'TS-2', 'TS-3'})
+
+        for value in ['cheap', 'NaN', 'sNaN', 'Infinity', '-inf']:
+            response = self.client.get('/api/v1/products/', {'min_price': value})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, value)
+
+    def test_final_price_matches_the_filtered_price(self):
+        # An expiry the scheduler hasn't applied yet
+        Product.objects.filter(pk=self.expired.pk).update(current_price=17)
+        response = self.client.get('/api/v1/products/', {'min_price': 21, 'max_price': 25})
+        self.assertEqual([(p['sku'], p['final_price']) for p in response.data], [('TS-4', Decimal('22.00'))])
+        response = self.client.get(f'/api/v1/products/{self.expired.pk}/')
+        self.assertEqual(response.data['final_price'], Decimal('22.00'))
+
+
+class PriceSchedulerTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Promo', slug='promo')
+        subcategory = Subcategory.objects.create(category=category, name='Flash Sale', slug='flash-sale')
+        now = timezone.now()
+        self.product = Product.objects.create(
+            subcategory=subcategory, name='Poster', slug='poster', sku='PO-1', base_price=100,
+            is_on_sale=True, discount_type='percentage', discount_value=25,
+            discount_start_date=now + timedelta(hours=1), discount_end_date=now + timedelta(hours=2),
+        )
+
+    def test_save_materializes_price_state(self):
+        self.assertEqual(self.product.current_price, 100)
+        self.assertFalse(self.product.discount_active)
+        self.assertEqual(self.product.next_price_transition_at, self.product.discount_start_date)
+
+    def test_scheduler_flips_window_open_and_closed(self):
+        start, end = self.product.discount_start_date, self.product.discount_end_date
+        self.assertEqual(apply_due_price_transitions(now=start - timedelta(seconds=1)), 0)
+
+        self.assertEqual(apply_due_price_transitions(now=start), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.current_price, 75)
+        self.assertTrue(self.product.discount_active)
+        self.assertGreater(self.product.next_price_transition_at, end)
+
+        self.assertEqual(apply_due_price_transitions(now=end + timedelta(seconds=1)), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.current_price, 100)
+        self.assertFalse(self.product.discount_active)
+        self.assertIsNone(self.product.next_price_transition_at)
+
+
+class BannerCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        now = timezone.now()
+        self.live = Banner.objects.create(
+            title='Spring Sale', image='https://cdn.example.com/spring.jpg', placement='hero_primary',
+            end_date=now + timedelta(hours=3),
+        )
+        Banner.objects.create(
+            title='Summer Sale', image='https://cdn.example.com/summer.jpg', placement='hero_primary',
+            start_date=now + timedelta(minutes=10),
+        )
+
+    def test_steady_state_skips_database(self):
+        response = self.client.get('/api/v1/banners/', {'placement': 'hero_primary'})
+        self.assertEqual([b['title'] for b in response.data], ['Spring Sale'])
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/v1/banners/', {'placement': 'hero_primary'})
+        self.assertEqual(len(response.data), 1)
+
+        not_modified = self.client.get(
+            '/api/v1/banners/', {'placement': 'hero_primary'}, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_cache_expires_at_next_boundary_and_on_write(self):
+        entry = get_active_banners('hero_primary')
+        self.assertEqual(entry['expires_at'], Banner.objects.get(title='Summer Sale').start_date)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.live.title = 'Spring Clearance'
+            self.live.save()
+        response = self.client.get('/api/v1/banners/', {'placement': 'hero_primary'})
+        self.assertEqual(response.data[0]['title'], 'Spring Clearance')
+
+
+class BulkStockUpdateTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='warehouse', is_staff=True))
+        category = Category.objects.create(name='Labels', slug='labels')
+        subcategory = Subcategory.objects.create(category=category, name='Roll', slug='roll')
+        self.first = Product.objects.create(
+            subcategory=subcategory, name='Roll Label', slug='roll-label', sku='LB-1', base_price=2, stock_quantity=10
+        )
+        self.second = Product.objects.create(
+            subcategory=subcategory, name='Sheet Label', slug='sheet-label', sku='LB-2', base_price=2, stock_quantity=5
+        )
+        self.url = '/api/v1/admin/products/bulk_update_stock/'
+
+    def test_updates_by_id_and_sku_with_deltas(self):
+        payload = {'updates': [
+            {'id': self.first.id, 'stock_quantity': 50},
+            {'sku': 'LB-2', 'delta': -3},
+            {'sku': 'LB-2', 'delta': 10},
+        ]}
+        with self.assertNumQueries(5):
+            response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual([r['stock_quantity'] for r in response.data['results']], [50, 2, 12])
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.stock_quantity, self.second.stock_quantity), (50, 12))
+
+    def test_invalid_row_rejects_whole_batch(self):
+        payload = {'updates': [
+            {'id': self.first.id, 'stock_quantity': 0},
+            {'sku': 'LB-2', 'delta': -6},
+            {'sku': 'MISSING', 'stock_quantity': 1},
+        ]}
+        response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            [r['status'] for r in response.data['results']], ['rolled_back', 'error', 'error']
+        )
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.stock_quantity, 10)
+
+        payload['atomic'] = False
+        response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['updated'], response.data['failed']), (1, 2))
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.stock_quantity, 0)
+
+
+class AdminDashboardStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+        category = Category.objects.create(name='Flyers', slug='flyers')
+        Category.objects.create(name='Archive', slug='archive', is_active=False)
+        subcategory = Subcategory.objects.create(category=category, name='A5', slug='a5')
+        Product.objects.create(subcategory=subcategory, name='Flyer', slug='flyer', sku='FL-1',
+                               base_price=1, stock_quantity=3, is_infinite_stock=False)
+
+    def test_dashboard_stats_single_round_trip(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/v1/admin/dashboard-stats/')
+        self.assertEqual(response.data['categories'], {'total': 2, 'active': 1, 'inactive': 1})
+        self.assertEqual(response.data['products']['low_stock'], 1)
+        self.assertEqual(response.data['users'], {'total': 1, 'active': 1, 'today': 1, 'this_week': 1})
+
+        with self.assertNumQueries(0):
+            self.client.get('/api/v1/admin/dashboard-stats/')
+            self.client.get('/api/v1/admin/products/stats/')
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = Category.objects.create(name='Canvas', slug='canvas')
+        self.subcategory = Subcategory.objects.create(category=category, name='Framed', slug='framed')
+        self.product = Product.objects.create(
+            subcategory=self.subcategory, name='Framed Canvas', slug='framed-canvas', sku='CV-1', base_price=60
+        )
+
+    def test_product_revalidation_costs_one_probe(self):
+        url = f'/api/v1/products/{self.product.id}/'
+        response = self.client.get(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get('/api/v1/products/')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/v1/products/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subcategory.name = 'Gallery Framed'
+            self.subcategory.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['subcategory_name'], 'Gallery Framed')
+
+    def test_zakeke_mapping_changes_invalidate(self):
+        url = f'/api/v1/products/{self.product.id}/'
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            mapping = ZakekeProduct.objects.create(product=self.product, zakeke_product_id='zk-9')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            mapping.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_missing_product_still_404s(self):
+        response = self.client.get('/api/v1/products/999999/', HTTP_IF_NONE_MATCH='"anything"')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = Category.objects.create(name='Calendars', slug='calendars')
+        subcategory = Subcategory.objects.create(category=category, name='Wall', slug='wall')
+        for i in range(3):
+            Product.objects.create(
+                subcategory=subcategory, name=f'Calendar {i}', slug=f'calendar-{i}', sku=f'CA-{i}',
+                base_price=12, description='Twelve months of photos', meta_description='Wall calendar'
+            )
+
+    def test_fields_limit_payload_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/products/', {'fields': 'id,name,final_price'})
+        self.assertEqual(set(response.data[0]), {'id', 'name', 'final_price'})
+        self.assertEqual(response.data[0]['final_price'], 12)
+        select = [q['sql'] for q in queries if 'catalog_product' in q['sql'] and 'COUNT' not in q['sql']][-1]
+        self.assertNotIn('"description"', select)
+        self.assertNotIn('catalog_subcategory', select)
+
+    def test_expand_and_nested_fields(self):
+        response = self.client.get('/api/v1/products/', {'expand': 'images,description'})
+        self.assertEqual(response.data[0]['images'], [])
+        self.assertEqual(response.data[0]['description'], 'Twelve months of photos')
+        self.assertIn('zakeke_product_id', response.data[0])
+
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/v1/categories/', {'fields': 'name,subcategories.name,subcategories.products.name'})
+        self.assertEqual(response.data, [{
+            'name': 'Calendars',
+            'subcategories': [{'name': 'Wall', 'products': [{'name': 'Calendar 0'}, {'name': 'Calendar 1'}, {'name': 'Calendar 2'}]}],
+        }])
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        storage = 'django.core.files.storage.FileSystemStorage'
+        overrides = override_settings(
+            MEDIA_ROOT=media,
+            STORAGES={
+                'default': {'BACKEND': storage},
+                'image_variants': {'BACKEND': storage, 'OPTIONS': {'location': f'{media}/variants', 'base_url': '/media/variants/'}},
+            },
+            IMAGE_VARIANT_WIDTHS=[100, 400],
+            IMAGE_VARIANT_FORMATS=['webp'],
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def upload(self, category, color):
+        buffer = BytesIO()
+        Image.new('RGB', (300, 150), color).save(buffer, 'PNG')
+        category.image.save(f'{color}.png', ContentFile(buffer.getvalue()))
+
+    def test_worker_builds_variants_for_changed_images(self):
+        category = Category.objects.create(name='Posters', slug='posters')
+        self.upload(category, 'red')
+        self.assertEqual(ImageVariantJob.objects.get().status, 'pending')
+
+        call_command('process_image_variants', stdout=StringIO())
+        response = APIClient().get(f'/api/v1/categories/{category.id}/')
+        variants = response.data['image_variants']
+        self.assertEqual((variants['width'], variants['height']), (300, 150))
+        self.assertEqual(list(variants['formats']['webp']), ['100', '300'])
+        self.assertTrue(variants['srcset']['webp'].endswith('.webp 300w'))
+        self.assertEqual(ImageVariantJob.objects.get().status, 'done')
+
+        self.upload(category, 'blue')
+        response = APIClient().get(f'/api/v1/categories/{category.id}/')
+        self.assertIsNone(response.data['image_variants'])
+        self.assertEqual(ImageVariantJob.objects.get().status, 'pending')
+
+    def test_sources_are_restricted(self):
+        with self.assertRaises(DownloadError):
+            read_source('http://169.254.169.254/latest/meta-data/')
+        self.assertTrue(is_allowed('https://CDN.example.com/a.png', ['cdn.example.com']))
+        self.assertFalse(is_allowed('https://cdn.example.com.evil.test/a.png', ['cdn.example.com']))
+        category = Category.objects.create(name='Murals', slug='murals')
+        self.upload(category, 'green')
+        with override_settings(MEDIA_SOURCE_MAX_PIXELS=300 * 150 - 1):
+            with self.assertRaisesMessage(ValueError, 'too large'):
+                build_variants(category.image.name)
+        with override_settings(MEDIA_SOURCE_MAX_BYTES=10):
+            with self.assertRaisesMessage(ValueError, 'larger than 10 bytes'):
+                read_source(category.image.name)
+
+
+class CatalogImportExportTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Print', slug='print')
+        Subcategory.objects.create(category=category, name='Cards', slug='cards')
+
+    def run_import(self, text, **kwargs):
+        return import_catalog(read_rows(StringIO(text), 'csv'), **kwargs)
+
+    def test_upserts_by_sku_and_leaves_missing_columns_alone(self):
+        report = self.run_import(
+            "sku,name,subcategory,base_price,stock_quantity,images,zakeke_product_id\n"
+            "C-1,Card,cards,10.00,5,https://cdn.example/a.png|https://cdn.example/b.png,zk-1\n"
+            "C-2,Flyer,nope,4.00,1,,\n"
+            "C-3,Note,cards,abc,1,,\n"
+        )
+        self.assertEqual((report.rows, report.created, report.updated), (3, 1, 0))
+        self.assertEqual([line for line, _ in report.errors], [3, 4])
+        product = Product.objects.get(sku='C-1')
+        self.assertEqual(product.current_price, Decimal('10.00'))
+        self.assertEqual([image.image for image in product.images.order_by('display_order')],
+                         ['https://cdn.example/a.png', 'https://cdn.example/b.png'])
+        self.assertEqual(product.zakeke_mapping.zakeke_product_id, 'zk-1')
+
+        report = self.run_import("sku,name,subcategory,base_price\nC-1,Card v2,cards,12.50\n")
+        self.assertEqual((report.created, report.updated), (0, 1))
+        product.refresh_from_db()
+        self.assertEqual((product.name, product.stock_quantity, product.current_price), ('Card v2', 5, Decimal('12.50')))
+        self.assertEqual(product.images.count(), 2)
+
+    def test_partial_feed_keeps_a_running_discount(self):
+        ends = timezone.now() + timedelta(days=2)
+        product = Product.objects.create(
+            subcategory=Subcategory.objects.get(slug='cards'), name='Card', slug='card', sku='C-1', base_price=10,
+            is_on_sale=True, discount_type='percentage', discount_value=20, discount_end_date=ends,
+        )
+        self.assertEqual(product.current_price, Decimal('8.00'))
+
+        report = self.run_import("sku,name,subcategory,base_price,stock_quantity\nC-1,Card,cards,20.00,7\n")
+        self.assertEqual(report.updated, 1)
+        product.refresh_from_db()
+        self.assertEqual(
+            (product.current_price, product.discount_active, product.next_price_transition_at, product.stock_quantity),
+            (Decimal('16.00'), True, ends + DISCOUNT_END_GRACE, 7),
+        )
+
+    def test_export_round_trips(self):
+        self.run_import(
+            "sku,name,subcategory,category,base_price,images\n"
+            "C-1,Card,cards,print,10.00,https://cdn.example/a.png\n"
+            "P-1,Poster,posters,wall,20.00,\n",
+            create_categories=True,
+        )
+        output = StringIO()
+        self.assertEqual(export_catalog(output, 'jsonl'), 2)
+        Product.objects.all().delete()
+
+        report = import_catalog(read_rows(StringIO(output.getvalue()), 'jsonl'))
+        self.assertEqual((report.created, report.errors), (2, []))
+        self.assertEqual(Product.objects.get(sku='P-1').subcategory.category.slug, 'wall')
+        self.assertEqual(Product.objects.get(sku='C-1').images.get().image, 'https://cdn.example/a.png')
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_catalog_queries_use_indexes(self):
+        # Raises CommandError if any checked query scans its table or sorts
+        call_command('check_query_plans', products=3000, banners=300, stdout=StringIO())
@@ -1,24 +1,66 @@
-from rest_framework import viewsets, permissions, filters
+from decimal import Decimal, InvalidOperation
+
+from rest_framework import viewsets, permissions, filters, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from django.conf import settings
 from django.db import models
-from .models import Category, Subcategory, Product, Banner
-from .serializers import CategorySerializer, SubcategorySerializer, ProductSerializer, BannerSerializer
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from .cache import (
+    BANNER_VERSION_KEY, CATALOG_VERSION_KEY, get_active_banners, get_catalog_tree, get_catalog_version,
+    get_version_changed_at,
+)
+from .conditional import ConditionalGetMixin
+from .fieldsets import SparseFieldsetMixin
+from .facets import facet_subcategories, get_facet_counts, in_stock_q, parse_price_range, price_range_q
+from .filters import ProductOrderingFilter, ProductSearchFilter
+from .helpful_votes import cast_vote, helpful_count, retract_vote
+from .models import Category, Subcategory, Product, ProductReview, Banner, RelatedProduct
+from .pagination import ReviewCursorPagination
+from .search import search_products
+from .serializers import (
+    CategorySerializer, SubcategorySerializer, ProductSerializer, ProductListSerializer,
+    ProductReviewSerializer, BannerSerializer
+)
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     ViewSet for Categories (Top Level).
     """
     queryset = Category.objects.filter(is_active=True).order_by('display_order')
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    conditional_version_key = CATALOG_VERSION_KEY
+
+    def list(self, request, *args, **kwargs):
+        """Serve the full catalog tree from the versioned cache snapshot."""
+        if any(self.get_field_selection()):
+            # Sparse requests are cheap to build and not worth caching per selection.
+            return super().list(request, *args, **kwargs)
+        # The version counter alone validates the tree, so revalidation is free.
+        validators = (
+            f'"catalog-tree-{get_catalog_version()}"', get_version_changed_at(CATALOG_VERSION_KEY),
+        )
+        return self.conditional_response(request, self._tree_response, validators)
 
-class SubcategoryViewSet(viewsets.ModelViewSet):
+    def _tree_response(self):
+        version, data = get_catalog_tree(self.request)
+        response = Response(data)
+        response['ETag'] = f'"catalog-tree-{version}"'
+        return response
+
+class SubcategoryViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     ViewSet for Subcategories.
     """
     queryset = Subcategory.objects.filter(is_active=True).order_by('display_order')
     serializer_class = SubcategorySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    conditional_version_key = CATALOG_VERSION_KEY
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'category__name']
 
@@ -30,18 +72,51 @@ class SubcategoryViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(category_id=category_pk)
         return queryset
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     ViewSet for Products.
     """
-    queryset = Product.objects.filter(is_active=True)
+    queryset = Product.objects.filter(is_active=True).select_related('subcategory', 'zakeke_mapping')
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['name', 'sku', 'description']
+    conditional_version_key = CATALOG_VERSION_KEY
+    filter_backends = [ProductOrderingFilter, ProductSearchFilter]
+    ordering_fields = ['created_at', 'final_price', 'rating_average', 'rating_count']
+    ordering_aliases = {'final_price': 'effective_price'}
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'facets'):
+            return ProductListSerializer
+        return super().get_serializer_class()
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().with_effective_price()
+        if self.action not in ('list', 'facets'):
+            # Reads swap this for the prefetches they actually render (SparseFieldsetMixin)
+            queryset = queryset.prefetch_related('images')
+
+        # Price filters run on the SQL-computed effective (post-discount) price
+        min_price = self._decimal_param('min_price')
+        if min_price is not None:
+            queryset = queryset.filter(effective_price__gte=min_price)
+        max_price = self._decimal_param('max_price')
+        if max_price is not None:
+            queryset = queryset.filter(effective_price__lte=max_price)
+        price = self.request.query_params.get('price')
+        if price:
+            try:
+                queryset = queryset.filter(price_range_q(*parse_price_range(price)))
+            except (ValueError, InvalidOperation):
+                raise ValidationError({'price': 'Use a range such as "10-25" or "250-".'})
+        if self.request.query_params.get('on_sale') in ('true', '1'):
+            queryset = queryset.on_sale_now()
+        if self.request.query_params.get('featured') in ('true', '1'):
+            queryset = queryset.filter(is_featured=True)
+        if self.request.query_params.get('in_stock') in ('true', '1'):
+            queryset = queryset.filter(in_stock_q())
+        min_rating = self._decimal_param('min_rating')
+        if min_rating is not None:
+            queryset = queryset.filter(rating_average__gte=min_rating)
         
         # If accessed via nested route /subcategories/{id}/products/
         subcategory_pk = self.kwargs.get('subcategory_pk')
@@ -61,13 +136,122 @@ class ProductViewSet(viewsets.ModelViewSet):
             
         return queryset
 
-class BannerViewSet(viewsets.ReadOnlyModelViewSet):
+    def _decimal_param(self, name):
+        value = self.request.query_params.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            number = Decimal(value)
+        except InvalidOperation:
+            number = None
+        # Decimal() also accepts NaN and Infinity
+        if number is None or not number.is_finite():
+            raise ValidationError({name: 'A valid number is required.'})
+        return number
+
+    @action(detail=False, methods=['get'])
+    def search(self, request, **kwargs):
+        """Ranked full-text search with highlighted name/description fragments"""
+        term = request.query_params.get('q', '')
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+        except ValueError:
+            limit = 20
+        # Over-fetch so hits on inactive products don't shrink the page.
+        hits = search_products(term, limit=limit * 2)
+        products = self.get_queryset().in_bulk([hit.product_id for hit in hits])
+        results = []
+        for hit in hits:
+            product = products.get(hit.product_id)
+            if product is None:
+                continue
+            results.append({
+                'product': ProductListSerializer(product, context=self.get_serializer_context()).data,
+                'rank': hit.rank,
+                'highlight': hit.highlight,
+            })
+        return Response({'query': term, 'results': results[:limit]})
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request, **kwargs):
+        """
+        Filtered products plus facet counts (subcategory, price range, rating,
+        on sale, featured, in stock) for the same filters as the list.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        params = {**request.query_params.dict(), 'subcategory_pk': self.kwargs.get('subcategory_pk', '')}
+        subcategories = facet_subcategories(
+            category_slug=params.get('category'),
+            subcategory_slug=params.get('subcategory'),
+            subcategory_pk=params['subcategory_pk'],
+        )
+        data = dict(get_facet_counts(queryset, params, subcategories))
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 24)), 100))
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            limit, offset = 24, 0
+        data['results'] = self.get_serializer(queryset[offset:offset + limit], many=True).data
+        return Response(data)
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None, **kwargs):
+        """Frequently bought together, precomputed by build_related_products"""
+        product = get_object_or_404(Product, pk=pk, is_active=True)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 50))
+        except ValueError:
+            limit = 10
+        links = (
+            RelatedProduct.objects.filter(product=product, related__is_active=True)
+            .select_related('related__subcategory', 'related__zakeke_mapping')
+            .order_by('rank')[:limit]
+        )
+        context = self.get_serializer_context()
+        return Response({'results': [
+            {
+                'product': ProductListSerializer(link.related, context=context).data,
+                'co_orders': link.co_orders,
+                'score': link.score,
+            }
+            for link in links
+        ]})
+
+    @action(detail=True, methods=['get'], pagination_class=ReviewCursorPagination)
+    def reviews(self, request, pk=None, **kwargs):
+        """Cursor-paginated reviews for one product, newest first"""
+        product = self.get_object()
+        queryset = ProductReview.objects.filter(product=product).select_related('user')
+        page = self.paginate_queryset(queryset)
+        serializer = ProductReviewSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=True, methods=['post', 'delete'], url_path=r'reviews/(?P<review_pk>\d+)/helpful',
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def review_helpful(self, request, pk=None, review_pk=None, **kwargs):
+        """Mark a review helpful (POST) or take the vote back (DELETE); one vote per customer"""
+        review = get_object_or_404(ProductReview, pk=review_pk, product_id=pk, product__is_active=True)
+        if request.method == 'DELETE':
+            changed = retract_vote(review, request.user)
+        else:
+            if review.user_id == request.user.pk:
+                raise ValidationError({'detail': "You can't vote on your own review."})
+            changed = cast_vote(review, request.user)
+        return Response(
+            {'voted': request.method == 'POST', 'helpful_count': helpful_count(review)},
+            status=status.HTTP_201_CREATED if request.method == 'POST' and changed else status.HTTP_200_OK,
+        )
+
+class BannerViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for Banners (Hero sections, promotions)
     Read-only for frontend consumption
     """
     serializer_class = BannerSerializer
     permission_classes = [permissions.AllowAny]
+    conditional_version_key = BANNER_VERSION_KEY
     
     def get_queryset(self):
         from django.utils import timezone
@@ -88,3 +272,13 @@ class BannerViewSet(viewsets.ReadOnlyModelViewSet):
             queryset = queryset.filter(placement=placement)
         
         return queryset.order_by('display_order', '-created_at')
+
+    def list(self, request, *args, **kwargs):
+        """Active banners from a cache that expires at the next start/end boundary"""
+        entry = get_active_banners(request.query_params.get('placement'), request)
+        response = self.conditional_response(request, lambda: Response(entry['data']), (entry['etag'], None))
+        max_age = settings.BANNER_MAX_AGE
+        if entry['expires_at'] is not None:
+            max_age = max(0, min(max_age, int((entry['expires_at'] - timezone.now()).total_seconds())))
+        patch_cache_control(response, public=True, max_age=max_age)
+        return response
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, OrderItem, PrintJob, Shipment
+from .models import CanvasBlob, Order, OrderItem, PrintJob, Shipment, StockReservation, TaxRule, ShippingRate, QuantityTier
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -14,8 +14,23 @@ class OrderAdmin(admin.ModelAdmin):
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
-    list_display = ('order', 'product', 'quantity', 'unit_price', 'total_price')
-    list_filter = ('order__status',)
+    list_display = ('order', 'product', 'quantity', 'unit_price', 'total_price', 'render_status', 'render_attempts')
+    list_filter = ('order__status', 'render_status')
+    readonly_fields = ('render_attempts', 'render_error', 'render_started_at', 'render_completed_at', 'render_seconds')
+    actions = ['rerender_print_files']
+
+    @admin.action(description="Re-render print files")
+    def rerender_print_files(self, request, queryset):
+        updated = queryset.filter(canvas_blob__isnull=False).update(
+            render_status='pending', render_attempts=0, render_error='',
+        )
+        self.message_user(request, f"{updated} items queued for rendering.")
+
+@admin.register(CanvasBlob)
+class CanvasBlobAdmin(admin.ModelAdmin):
+    list_display = ('digest', 'compression', 'size_bytes', 'created_at')
+    readonly_fields = ('digest', 'compression', 'size_bytes', 'created_at')
+    exclude = ('data',)
 
 @admin.register(PrintJob)
 class PrintJobAdmin(admin.ModelAdmin):
@@ -26,3 +41,23 @@ class PrintJobAdmin(admin.ModelAdmin):
 class ShipmentAdmin(admin.ModelAdmin):
     list_display = ('order', 'carrier', 'tracking_number', 'status', 'shipped_at')
     list_filter = ('status', 'carrier')
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('order', 'product', 'quantity', 'status', 'expires_at')
+    list_filter = ('status',)
+
+@admin.register(TaxRule)
+class TaxRuleAdmin(admin.ModelAdmin):
+    list_display = ('country', 'state', 'rate', 'applies_to_shipping', 'is_active')
+    list_filter = ('country', 'is_active')
+
+@admin.register(ShippingRate)
+class ShippingRateAdmin(admin.ModelAdmin):
+    list_display = ('country', 'max_weight_kg', 'price', 'is_active')
+    list_filter = ('country', 'is_active')
+
+@admin.register(QuantityTier)
+class QuantityTierAdmin(admin.ModelAdmin):
+    list_display = ('product', 'min_quantity', 'discount_percent')
+    search_fields = ('product__name', 'product__sku')
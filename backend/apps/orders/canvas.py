@@ -0,0 +1,323 @@
+"""
+Rasterize a frozen design canvas (Fabric.js JSON) into a print file.
+
+Plain Pillow and stdlib, with no Django imports, so it can run in the render
+worker's child processes. The canvas is drawn at ``dpi`` (Fabric
+coordinates are 96 dpi screen pixels) and saved as a PDF or PNG.
+
+Supported objects: rect, circle, ellipse, text/i-text/textbox and image, with
+left/top, width/height, scaleX/scaleY, fill, stroke/strokeWidth, opacity,
+angle (about the object's centre) and visible. Image ``src`` and font sources
+may be data: URIs, URLs under ``media_url``, which are read from
+``media_root``, or http(s) URLs on one of ``allowed_hosts``; none may exceed
+``max_bytes``, and decoded images and text may not exceed ``max_pixels``.
+Any other object type fails the render, since leaving part of a design off a
+print is worse than not printing it.
+
+Objects are drawn on layers covering only the part of them that lands on the
+canvas, so an object far larger than the canvas costs no more than the canvas.
+
+Downloaded and media sources are cached per process, up to
+``SOURCE_CACHE_BYTES`` in total, since fonts and logos repeat across designs.
+"""
+import base64
+import io
+import math
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+from shop_project.downloads import download
+
+SCREEN_DPI = 96
+DEFAULT_SIZE = (800, 600)
+MAX_SIDE = 20000  # pixels, after scaling
+DOWNLOAD_TIMEOUT = 20
+MAX_SOURCE_BYTES = 25 * 1024 * 1024
+MAX_SOURCE_PIXELS = 50_000_000
+SOURCE_CACHE_BYTES = 64 * 1024 * 1024
+TEXT_TYPES = {'text', 'i-text', 'itext', 'textbox'}
+
+
+class CanvasError(ValueError):
+    pass
+
+
+def timed_render(state, options):
+    """``render_print_file`` for a process pool: returns ``(file bytes, seconds)``."""
+    started = time.perf_counter()
+    data = render_print_file(state, **options)
+    return data, time.perf_counter() - started
+
+
+def render_print_file(state, dpi=300, file_format='PDF', fonts=None, media_root='', media_url='/media/',
+                      allowed_hosts=(), max_bytes=MAX_SOURCE_BYTES, max_pixels=MAX_SOURCE_PIXELS):
+    """Render ``state`` and return the encoded file."""
+    image = render_canvas(state, dpi, fonts or {}, media_root, media_url, allowed_hosts, max_bytes, max_pixels)
+    buffer = io.BytesIO()
+    if file_format.upper() == 'PDF':
+        image.save(buffer, format='PDF', resolution=dpi)
+    else:
+        image.save(buffer, format=file_format, dpi=(dpi, dpi))
+    return buffer.getvalue()
+
+
+def render_canvas(state, dpi=300, fonts=None, media_root='', media_url='/media/',
+                  allowed_hosts=(), max_bytes=MAX_SOURCE_BYTES, max_pixels=MAX_SOURCE_PIXELS):
+    """Draw ``state`` onto an RGB image at ``dpi``."""
+    if not isinstance(state, dict):
+        raise CanvasError("Canvas state must be an object")
+    scale = dpi / SCREEN_DPI
+    width = _pixels(state.get('width', DEFAULT_SIZE[0]), scale)
+    height = _pixels(state.get('height', DEFAULT_SIZE[1]), scale)
+    if max(width, height) > MAX_SIDE:
+        raise CanvasError(f"Canvas of {width}x{height}px at {dpi} dpi is too large")
+
+    canvas = Image.new('RGBA', (width, height), _color(state.get('background')) or (255, 255, 255, 255))
+    context = {
+        'fonts': fonts or {}, 'media_root': media_root, 'media_url': media_url,
+        'allowed_hosts': tuple(allowed_hosts), 'max_bytes': max_bytes, 'max_pixels': max_pixels,
+    }
+    for obj in state.get('objects') or []:
+        if not obj.get('visible', True):
+            continue
+        placement = _Placement(
+            canvas.size, float(obj.get('left', 0)) * scale, float(obj.get('top', 0)) * scale,
+            float(obj.get('angle') or 0),
+        )
+        layer = _draw(obj, scale, placement, context)
+        if layer is None:
+            continue  # entirely off the canvas
+        opacity = float(obj.get('opacity', 1))
+        if opacity < 1:
+            layer.putalpha(layer.getchannel('A').point(lambda alpha: round(alpha * opacity)))
+        layer, position = placement.place(layer)
+        canvas.alpha_composite(layer, dest=(max(position[0], 0), max(position[1], 0)),
+                               source=(max(-position[0], 0), max(-position[1], 0)))
+    return canvas.convert('RGB')
+
+
+class _Placement:
+    """
+    Where an object of a given size lands on the canvas, rotated ``angle``
+    degrees clockwise about its centre, and which part of it shows.
+    """
+
+    def __init__(self, canvas_size, left, top, angle):
+        self.canvas_size = canvas_size
+        self.left, self.top = left, top
+        self.angle = angle
+        radians = math.radians(angle)
+        self.cos, self.sin = math.cos(radians), math.sin(radians)
+        self.size = self.box = None
+
+    def clip(self, width, height):
+        """
+        Size the object; returns the box ``(x0, y0, x1, y1)`` of it, in its own
+        unrotated pixels, that covers its part on the canvas, or None if none does.
+        """
+        self.size = width, height = max(1, round(width)), max(1, round(height))
+        centre = (self.left + width / 2, self.top + height / 2)
+        xs, ys = [], []
+        canvas_width, canvas_height = self.canvas_size
+        for x, y in ((0, 0), (canvas_width, 0), (0, canvas_height), (canvas_width, canvas_height)):
+            # A canvas corner in the object's frame: undo the rotation about its centre.
+            dx, dy = x - centre[0], y - centre[1]
+            xs.append(dx * self.cos + dy * self.sin + width / 2)
+            ys.append(-dx * self.sin + dy * self.cos + height / 2)
+        # One pixel of margin for resampling when rotated
+        x0, y0 = max(0, math.floor(min(xs)) - 1), max(0, math.floor(min(ys)) - 1)
+        x1, y1 = min(width, math.ceil(max(xs)) + 1), min(height, math.ceil(max(ys)) + 1)
+        self.box = (x0, y0, x1, y1) if x0 < x1 and y0 < y1 else None
+        return self.box
+
+    def layer(self, width, height):
+        """A transparent layer over the visible part of a ``width`` x ``height`` object and its Draw, or None."""
+        if self.clip(width, height) is None:
+            return None, None
+        x0, y0, x1, y1 = self.box
+        layer = Image.new('RGBA', (x1 - x0, y1 - y0), (0, 0, 0, 0))
+        return layer, ImageDraw.Draw(layer)
+
+    def offset(self, x, y):
+        """Object pixel coordinates as layer coordinates."""
+        return x - self.box[0], y - self.box[1]
+
+    def place(self, layer):
+        """``layer`` rotated into place, and the canvas position of its top-left corner."""
+        width, height = self.size
+        x0, y0, x1, y1 = self.box
+        # The layer's centre relative to the object's, rotated with it
+        dx, dy = (x0 + x1 - width) / 2, (y0 + y1 - height) / 2
+        centre = (
+            self.left + width / 2 + dx * self.cos - dy * self.sin,
+            self.top + height / 2 + dx * self.sin + dy * self.cos,
+        )
+        if self.angle:
+            # Fabric angles are clockwise; Pillow's are counter-clockwise.
+            layer = layer.rotate(-self.angle, resample=Image.BICUBIC, expand=True)
+        return layer, (round(centre[0] - layer.width / 2), round(centre[1] - layer.height / 2))
+
+
+def _draw(obj, scale, placement, context):
+    """The visible part of ``obj`` as a layer (see _Placement), or None if none of it is on the canvas."""
+    kind = obj.get('type', '').lower()
+    sx, sy = float(obj.get('scaleX', 1)) * scale, float(obj.get('scaleY', 1)) * scale
+    fill, stroke = _color(obj.get('fill')), _color(obj.get('stroke'))
+    stroke_width = round(float(obj.get('strokeWidth', 0) or 0) * scale) if stroke else 0
+
+    if kind == 'rect':
+        layer, draw = placement.layer(float(obj.get('width', 0)) * sx, float(obj.get('height', 0)) * sy)
+        if layer is not None:
+            width, height = placement.size
+            radius = round(float(obj.get('rx', 0) or 0) * sx)
+            draw.rounded_rectangle((*placement.offset(0, 0), *placement.offset(width - 1, height - 1)),
+                                   radius=radius, fill=fill, outline=stroke, width=stroke_width)
+        return layer
+    if kind in ('circle', 'ellipse'):
+        rx = float(obj.get('radius' if kind == 'circle' else 'rx', 0))
+        ry = float(obj.get('radius' if kind == 'circle' else 'ry', 0))
+        layer, draw = placement.layer(2 * rx * sx, 2 * ry * sy)
+        if layer is not None:
+            width, height = placement.size
+            draw.ellipse((*placement.offset(0, 0), *placement.offset(width - 1, height - 1)),
+                         fill=fill, outline=stroke, width=stroke_width)
+        return layer
+    if kind in TEXT_TYPES:
+        return _draw_text(obj, sy, fill, placement, context)
+    if kind == 'image':
+        return _draw_image(obj, sx, sy, placement, context)
+    raise CanvasError(f"Unsupported canvas object type {kind!r}")
+
+
+def _draw_text(obj, sy, fill, placement, context):
+    size = max(1, round(float(obj.get('fontSize', 40)) * sy))
+    if size > MAX_SIDE:
+        raise CanvasError(f"Font size of {size}px is too large")
+    font = _font(context['fonts'], obj.get('fontFamily', ''), str(obj.get('fontWeight', 'normal')), size, context)
+    text = str(obj.get('text', ''))
+    align = obj.get('textAlign', 'left') if obj.get('textAlign') in ('left', 'center', 'right') else 'left'
+    measure = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+    left, top, right, bottom = measure.multiline_textbbox((0, 0), text, font=font, align=align)
+    # Pillow renders the whole text into one mask, however much of it shows.
+    if (right - left) * (bottom - top) > context['max_pixels']:
+        raise CanvasError(f"Text of {right - left}x{bottom - top}px is too large")
+    layer, draw = placement.layer(right - min(left, 0), bottom - min(top, 0))
+    if layer is not None:
+        draw.multiline_text(placement.offset(-min(left, 0), -min(top, 0)), text, font=font,
+                            fill=fill or (0, 0, 0, 255), align=align)
+    return layer
+
+
+def _draw_image(obj, sx, sy, placement, context):
+    with Image.open(io.BytesIO(_read(obj.get('src') or '', context))) as source:
+        # The header gives the size; check it before decoding the pixels.
+        if source.width * source.height > context['max_pixels']:
+            raise CanvasError(f"Image of {source.width}x{source.height}px is too large")
+        image = source.convert('RGBA')
+    box = placement.clip(float(obj.get('width') or image.width) * sx, float(obj.get('height') or image.height) * sy)
+    if box is None:
+        return None
+    width, height = placement.size
+    x0, y0, x1, y1 = box
+    if (x1 - x0, y1 - y0) == image.size == (width, height):
+        return image
+    # Resample only the visible part of the source.
+    fx, fy = image.width / width, image.height / height
+    return image.resize((x1 - x0, y1 - y0), Image.LANCZOS, box=(x0 * fx, y0 * fy, x1 * fx, y1 * fy))
+
+
+def _font(fonts, family, weight, size, context):
+    """A TrueType font from ``fonts`` ({family: {weight: source}}), else Pillow's default at ``size``."""
+    weights = fonts.get(family.strip().casefold()) or {}
+    source = weights.get(weight) or weights.get('normal') or weights.get('400') or next(iter(weights.values()), None)
+    if source is None:
+        return ImageFont.load_default(size)
+    return ImageFont.truetype(io.BytesIO(_read(source, context)), size)
+
+
+def _pixels(value, scale):
+    return max(1, round(float(value) * scale))
+
+
+def _color(value):
+    """RGBA tuple for a Fabric colour string, or None for no paint."""
+    if not value or not isinstance(value, str) or value == 'transparent':
+        return None
+    value = value.strip()
+    if value.startswith('rgba(') and value.endswith(')'):
+        *rgb, alpha = (part.strip() for part in value[5:-1].split(','))
+        alpha = float(alpha)
+        return tuple(int(float(part)) for part in rgb) + (round(alpha * 255 if alpha <= 1 else alpha),)
+    try:
+        return ImageColor.getcolor(value, 'RGBA')
+    except ValueError as exc:
+        raise CanvasError(f"Unknown colour {value!r}") from exc
+
+
+class _SourceCache:
+    """Least recently used source bytes, bounded by their total size."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+_source_cache = _SourceCache(SOURCE_CACHE_BYTES)
+
+
+def _read(source, context):
+    max_bytes = context['max_bytes']
+    if source.startswith('data:'):
+        # Not cached: the source string is the whole payload.
+        header, _, payload = source.partition(',')
+        data = base64.b64decode(payload) if header.endswith(';base64') else urllib.parse.unquote_to_bytes(payload)
+    else:
+        key = (source, context['media_root'], context['media_url'], context['allowed_hosts'], max_bytes)
+        data = _source_cache.get(key)
+        if data is None:
+            data = _fetch(*key)
+            if len(data) <= max_bytes:
+                _source_cache.put(key, data)
+    if len(data) > max_bytes:
+        raise CanvasError(f"{source[:100]!r} is larger than {max_bytes} bytes")
+    return data
+
+
+def _fetch(source, media_root, media_url, allowed_hosts, max_bytes):
+    """Bytes for a URL or media source."""
+    if source.startswith(('http://', 'https://')):
+        return download(source, allowed_hosts, max_bytes, timeout=DOWNLOAD_TIMEOUT)
+    if media_root and media_url and source.startswith(media_url):
+        root = os.path.realpath(media_root)
+        path = os.path.realpath(os.path.join(root, urllib.request.url2pathname(source[len(media_url):])))
+        if path.startswith(root + os.sep):
+            with open(path, 'rb') as stored:
+                return stored.read(max_bytes + 1)
+    raise CanvasError(f"Cannot read {source[:100]!r}")
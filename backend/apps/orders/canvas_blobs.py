@@ -0,0 +1,83 @@
+"""
+Content-addressed storage for frozen canvas states.
+
+An order item's canvas is a copy of its design's JSON at checkout. Storing it
+per item meant a 500-card order of one design held the same large document
+500 times. Instead the JSON is canonicalized (sorted keys, no whitespace),
+hashed with SHA-256 and stored once in CanvasBlob, compressed with zstd, or
+gzip where the zstandard package isn't installed. Items reference the blob by
+digest. ``OrderItem.frozen_canvas_state`` loads it lazily, and order
+responses only include it when asked for (``?expand=items.frozen_canvas_state``).
+"""
+import gzip
+import hashlib
+import json
+
+try:
+    import zstandard
+except ImportError:  # blobs are gzip-compressed instead
+    zstandard = None
+
+from .models import CanvasBlob
+
+ZSTD_LEVEL = 10
+
+
+def canonical_json(state):
+    return json.dumps(state, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def canvas_digest(state):
+    return hashlib.sha256(canonical_json(state)).hexdigest()
+
+
+def encode_canvas(state):
+    """``(digest, compression, data, size_bytes)`` for a canvas state."""
+    raw = canonical_json(state)
+    if zstandard is not None:
+        compression, data = 'zstd', zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    else:
+        compression, data = 'gzip', gzip.compress(raw, mtime=0)
+    return hashlib.sha256(raw).hexdigest(), compression, data, len(raw)
+
+
+def decode_canvas(compression, data):
+    data = bytes(data)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Canvas blob is zstd-compressed but the zstandard package is not installed")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        raw = gzip.decompress(data)
+    return json.loads(raw)
+
+
+def prepare_blobs(states):
+    """
+    Unsaved CanvasBlobs for the distinct ``states`` (dicts, or None), plus each
+    state's digest in order. Each distinct state object is encoded once.
+    """
+    blobs, digests, seen = {}, [], {}
+    for state in states:
+        if state is None:
+            digests.append(None)
+            continue
+        digest = seen.get(id(state), (None, None))[1]
+        if digest is None:
+            digest, compression, data, size = encode_canvas(state)
+            seen[id(state)] = (state, digest)  # holding the state keeps its id from being reused
+            blobs.setdefault(digest, CanvasBlob(digest=digest, compression=compression, data=data, size_bytes=size))
+        digests.append(digest)
+    return list(blobs.values()), digests
+
+
+def save_blobs(blobs):
+    """Insert blobs that aren't stored yet; existing digests are left alone."""
+    CanvasBlob.objects.bulk_create(blobs, ignore_conflicts=True)
+
+
+def store_canvas(state):
+    """Store one canvas state and return its digest (None for None)."""
+    blobs, (digest,) = prepare_blobs([state])
+    save_blobs(blobs)
+    return digest
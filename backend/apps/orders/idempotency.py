@@ -0,0 +1,223 @@
+"""
+Idempotency-Key support for endpoints that must not run twice.
+
+A client sends ``Idempotency-Key: <unique value>`` and reuses it when it
+retries. The first request claims the key by inserting an IdempotencyKey row
+(unique per owner, scope and key), runs, and stores its response; retries
+with the same key and the same request replay that response with an
+``Idempotent-Replayed: true`` header instead of running again. Completed
+responses are also cached, so a retry storm is answered from the cache.
+
+Concurrent duplicates lose the insert and wait, polling with backoff for up
+to ``IDEMPOTENCY_WAIT_SECONDS``, then replay; if the original is still
+running they get 409 with Retry-After. Reusing a key for a different request
+is a 422. A successful response is stored in the request's own transaction,
+which also holds a lock on the key's row while the request runs. Only
+successful responses are stored: a failed request's changes are rolled
+back, so its key is released and the client may retry with it. A key whose
+request died without finishing is taken over after
+``IDEMPOTENCY_LOCK_SECONDS``, unless its row is still locked.
+
+Views that call out to another service use ``atomic=False``: the call runs
+outside any transaction, so a slow upstream holds no locks, and the response
+is stored afterwards. Such calls must time out well within
+``IDEMPOTENCY_LOCK_SECONDS``, as nothing else marks them as still running.
+Keys expire after ``IDEMPOTENCY_KEY_TTL_HOURS``; purge_idempotency_keys
+deletes them in bulk.
+
+Requests without the header behave exactly as before.
+"""
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def idempotent(scope, atomic=True):
+    """
+    Make a viewset method honour the Idempotency-Key header.
+
+    ``scope`` names the endpoint, so one key may be used on different endpoints.
+    With ``atomic`` the method runs in one transaction with storing its response.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if key is None:
+                return view_method(view, request, *args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                return Response(
+                    {'detail': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            return _run(
+                scope, request_owner(request), key, request_fingerprint(request),
+                lambda: view_method(view, request, *args, **kwargs), atomic,
+            )
+        return wrapper
+    return decorator
+
+
+def request_owner(request):
+    return f'user:{request.user.pk}' if request.user.is_authenticated else 'anonymous'
+
+
+def request_fingerprint(request):
+    """SHA-256 of the method, path and parsed body."""
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps([request.method, request.path, data], sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def purge_expired_keys(batch_size=5000, now=None):
+    """Delete expired keys, one batch per statement. Returns how many were deleted."""
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        batch = list(IdempotencyKey.objects.filter(expires_at__lte=now).values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=batch).delete()[0]
+
+
+def _run(scope, owner, key, fingerprint, execute, atomic=True):
+    cache_key = f'idempotency:{scope}:{owner}:{hashlib.sha256(key.encode()).hexdigest()}'
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.05
+    while True:
+        stored = cache.get(cache_key)
+        if stored is not None:
+            return _replay(stored, fingerprint)
+
+        record, claimed = _claim(scope, owner, key, fingerprint)
+        if claimed:
+            return _execute(record, cache_key, execute, atomic)
+        if record is None:
+            continue  # released or taken over since the insert failed; try again
+        if record.fingerprint != fingerprint:
+            return _mismatch()
+        if record.status == 'completed':
+            stored = _stored(record)
+            cache.set(cache_key, stored, timeout=_seconds_left(record))
+            return _replay(stored, fingerprint)
+        if time.monotonic() >= deadline:
+            return Response(
+                {'detail': 'A request with this Idempotency-Key is still being processed.'},
+                status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'},
+            )
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+
+def _claim(scope, owner, key, fingerprint):
+    """Insert the key. Returns ``(record, True)`` if this request owns it, else the existing row."""
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                owner=owner, scope=scope, key=key, fingerprint=fingerprint,
+                expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+            )
+        return record, True
+    except IntegrityError:
+        pass
+
+    record = IdempotencyKey.objects.filter(owner=owner, scope=scope, key=key).first()
+    if record is not None and _abandoned(record, now):
+        with transaction.atomic():
+            # Conditional on the status, so a request that just finished is not
+            # discarded, and skipping rows a request still running has locked.
+            stale = list(
+                IdempotencyKey.objects.select_for_update(skip_locked=True)
+                .filter(pk=record.pk, status=record.status).values_list('pk', flat=True)
+            )
+            if stale:
+                IdempotencyKey.objects.filter(pk__in=stale).delete()
+                return None, False
+    return record, False
+
+
+def _abandoned(record, now):
+    if record.expires_at <= now:
+        return True
+    lock_expiry = record.created_at + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+    return record.status == 'processing' and lock_expiry <= now
+
+
+def _execute(record, cache_key, execute, atomic):
+    try:
+        if atomic:
+            response = _execute_atomic(record, execute)
+        else:
+            response = execute()
+            if status.is_success(response.status_code):
+                _complete(record, response)
+    except BaseException:
+        record.delete()
+        raise
+    if not status.is_success(response.status_code):
+        record.delete()
+        return response
+
+    cache.set(cache_key, _stored(record), timeout=_seconds_left(record))
+    return response
+
+
+def _execute_atomic(record, execute):
+    # The response is stored in the same transaction as the request's writes,
+    # so a crash can't leave an order behind a key still marked processing.
+    with transaction.atomic():
+        # Held until the request finishes; _claim won't take over a locked key.
+        list(IdempotencyKey.objects.select_for_update().filter(pk=record.pk).values_list('pk', flat=True))
+        response = execute()
+        if status.is_success(response.status_code):
+            _complete(record, response)
+        else:
+            transaction.set_rollback(True)
+    return response
+
+
+def _complete(record, response):
+    record.status = 'completed'
+    record.response_status = response.status_code
+    record.response_body = response.data
+    record.save(update_fields=['status', 'response_status', 'response_body'])
+
+
+def _stored(record):
+    return {'fingerprint': record.fingerprint, 'status': record.response_status, 'body': record.response_body}
+
+
+def _seconds_left(record):
+    return max(int((record.expires_at - timezone.now()).total_seconds()), 1)
+
+
+def _replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return _mismatch()
+    return Response(stored['body'], status=stored['status'], headers={REPLAYED_HEADER: 'true'})
+
+
+def _mismatch():
+    return Response(
+        {'detail': 'This Idempotency-Key was already used for a different request.'},
+        status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+    )
@@ -0,0 +1,162 @@
+"""
+Stock reservations for finite-stock products.
+
+Checkout decrements ``Product.stock_quantity`` with a conditional UPDATE
+(``... WHERE stock_quantity >= n``) inside the order transaction, so two
+concurrent checkouts can never both take the last unit. Multi-product
+checkouts first lock their products in primary-key order, which keeps them
+from deadlocking each other, and then decrement them all in one UPDATE.
+Each decrement is recorded as a StockReservation; the sweeper returns
+expired, unpaid reservations to stock in bulk. It leaves the orders
+themselves alone: cancelling is up to whoever handles payment.
+
+Reservation writes deliberately do not bump the catalog cache version:
+checkouts are frequent, and it is the conditional decrement, not the cached
+stock figure, that prevents overselling.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from apps.catalog.models import Product
+from .models import StockReservation
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product, requested):
+        super().__init__(f'Only {product.stock_quantity} of "{product.name}" left, {requested} requested.')
+        self.product = product
+        self.requested = requested
+
+
+def reserve_stock(order, lines, now=None):
+    """
+    Take stock for ``lines`` (``(product, quantity)`` pairs) and record the
+    reservations against ``order``.
+
+    Must run inside the transaction that creates the order; raises
+    InsufficientStock, leaving the caller to roll back.
+    """
+    now = now or timezone.now()
+    wanted = defaultdict(int)
+    products = {}
+    for product, quantity in lines:
+        if product.is_infinite_stock:
+            continue
+        wanted[product.pk] += quantity
+        products[product.pk] = product
+
+    if len(wanted) == 1:
+        _take_one(products, wanted, now)
+    elif wanted:
+        _take_many(products, wanted, now)
+    reservations = [
+        StockReservation(
+            order=order, product_id=product_id, quantity=quantity,
+            expires_at=now + timedelta(minutes=settings.STOCK_RESERVATION_TTL_MINUTES),
+        )
+        for product_id, quantity in sorted(wanted.items())
+    ]
+    StockReservation.objects.bulk_create(reservations)
+    return reservations
+
+
+def _take_one(products, wanted, now):
+    # The hot single-SKU case: one conditional UPDATE, no separate lock.
+    [(product_id, quantity)] = wanted.items()
+    taken = Product.objects.filter(pk=product_id, stock_quantity__gte=quantity).update(
+        stock_quantity=F('stock_quantity') - quantity, updated_at=now,
+    )
+    if not taken:
+        product = products[product_id]
+        product.refresh_from_db(fields=['stock_quantity'])
+        raise InsufficientStock(product, quantity)
+
+
+def _take_many(products, wanted, now):
+    """Lock all products in pk order, then decrement them with one UPDATE."""
+    product_ids = sorted(wanted)
+    available = dict(
+        Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk')
+        .values_list('pk', 'stock_quantity')
+    )
+    for product_id in product_ids:
+        if available.get(product_id, 0) < wanted[product_id]:
+            product = products[product_id]
+            product.stock_quantity = available.get(product_id, 0)
+            raise InsufficientStock(product, wanted[product_id])
+    quantity = Case(
+        *[When(pk=pk, then=Value(wanted[pk])) for pk in product_ids],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    # The stock condition is redundant under the row locks but keeps the
+    # UPDATE safe on backends without SELECT ... FOR UPDATE.
+    taken = Product.objects.filter(pk__in=product_ids, stock_quantity__gte=quantity).update(
+        stock_quantity=F('stock_quantity') - quantity, updated_at=now,
+    )
+    if taken != len(product_ids):
+        # The rows the UPDATE skipped are the ones it didn't stamp with ``now``.
+        short = dict(
+            Product.objects.filter(pk__in=product_ids).exclude(updated_at=now).values_list('pk', 'stock_quantity')
+        )
+        product_id = min(short or product_ids)
+        product = products[product_id]
+        product.stock_quantity = short.get(product_id, 0)
+        raise InsufficientStock(product, wanted[product_id])
+
+
+def release_expired_reservations(now=None, batch_size=500):
+    """
+    Resolve reservations whose hold has expired.
+
+    Reservations of paid orders are committed; the rest go back to stock.
+    Returns ``(released, committed)``.
+    """
+    now = now or timezone.now()
+    released = committed = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                StockReservation.objects.select_for_update(skip_locked=True, of=('self',))
+                .filter(status='active', expires_at__lte=now)
+                .order_by('pk')
+                .values_list('pk', 'order_id', 'product_id', 'quantity', 'order__is_paid')[:batch_size]
+            )
+            if not batch:
+                break
+            paid = [pk for pk, _, _, _, is_paid in batch if is_paid]
+            unpaid = [row for row in batch if not row[4]]
+            if paid:
+                StockReservation.objects.filter(pk__in=paid).update(status='committed', resolved_at=now)
+            if unpaid:
+                _restock(unpaid, now)
+                StockReservation.objects.filter(pk__in=[row[0] for row in unpaid]).update(
+                    status='released', resolved_at=now,
+                )
+        released += len(unpaid)
+        committed += len(paid)
+        if len(batch) < batch_size:
+            break
+    return released, committed
+
+
+def _restock(rows, now):
+    """Add reserved quantities back with one UPDATE, locking products in pk order."""
+    returned = defaultdict(int)
+    for _, _, product_id, quantity, _ in rows:
+        returned[product_id] += quantity
+    product_ids = sorted(returned)
+    list(Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk').values_list('pk', flat=True))
+    Product.objects.filter(pk__in=product_ids).update(
+        stock_quantity=F('stock_quantity') + Case(
+            *[When(pk=pk, then=Value(quantity)) for pk, quantity in returned.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        updated_at=now,
+    )
@@ -0,0 +1,71 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+
+from apps.catalog.management.commands._synthetic import seed_catalog
+from apps.orders.inventory import InsufficientStock, reserve_stock
+from apps.orders.models import Order
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer checkout for a single SKU from many threads and verify that stock "
+        "is never oversold. Threads need their own connections, so the synthetic "
+        "rows are committed and deleted afterwards; run against Postgres, SQLite "
+        "serialises writers and will mostly measure lock waits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--checkouts', type=int, default=500)
+        parser.add_argument('--stock', type=int, default=200)
+        parser.add_argument('--quantity', type=int, default=1)
+
+    def handle(self, *args, **options):
+        product = seed_catalog(products=1, categories=1, subcategories_per_category=1).get()
+        product.stock_quantity = options['stock']
+        product.is_infinite_stock = False
+        product.save(update_fields=['stock_quantity', 'is_infinite_stock'])
+        user = User.objects.create(username=f'bench-{uuid.uuid4().hex[:8]}')
+        quantity = options['quantity']
+
+        def checkout(_):
+            try:
+                with transaction.atomic():
+                    order = Order.objects.create(user=user, total_amount=product.base_price * quantity)
+                    reserve_stock(order, [(product, quantity)])
+                return 'sold'
+            except InsufficientStock:
+                return 'sold_out'
+            except DatabaseError:
+                return 'error'
+            finally:
+                connection.close()
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                outcomes = list(pool.map(checkout, range(options['checkouts'])))
+            elapsed = time.perf_counter() - started
+
+            product.refresh_from_db(fields=['stock_quantity'])
+            sold = outcomes.count('sold')
+            reserved = sum(product.stock_reservations.values_list('quantity', flat=True))
+        finally:
+            Order.objects.filter(user=user).delete()
+            user.delete()
+            product.subcategory.category.delete()
+
+        self.stdout.write(f"checkouts:   {len(outcomes)} over {options['threads']} threads in {elapsed:.2f}s "
+                          f"({len(outcomes) / elapsed:.0f}/s)")
+        self.stdout.write(f"sold:        {sold}")
+        self.stdout.write(f"sold out:    {outcomes.count('sold_out')}")
+        self.stdout.write(f"db errors:   {outcomes.count('error')}")
+        self.stdout.write(f"stock left:  {product.stock_quantity}")
+        if product.stock_quantity < 0 or not (options['stock'] - product.stock_quantity == sold * quantity == reserved):
+            raise CommandError("Stock accounting mismatch: inventory was oversold or lost")
+        self.stdout.write(self.style.SUCCESS("no overselling"))
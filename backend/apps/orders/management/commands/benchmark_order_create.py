@@ -0,0 +1,65 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.catalog.management.commands._synthetic import seed_catalog
+from apps.designs.models import SavedDesign
+from apps.orders.serializers import OrderSerializer
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Time OrderSerializer checkout for B2B orders of different sizes (one "
+        "personalised design per line). Seeds synthetic data inside a transaction "
+        "that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, nargs='+', default=[1, 50, 500])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        results = []
+        with transaction.atomic():
+            catalog = seed_catalog(products=50, categories=1, subcategories_per_category=1)
+            # Finite but ample stock, so every checkout goes through the reservation path.
+            catalog.update(stock_quantity=10 ** 9, is_infinite_stock=False)
+            products = list(catalog)
+            user = User.objects.create(username=f'bench-{uuid.uuid4().hex[:8]}')
+            designs = SavedDesign.objects.bulk_create([
+                SavedDesign(user=user, product=product, design_json={'objects': [{'text': f'Employee {i}'}]})
+                for i, product in enumerate(products)
+            ])
+            http_request = APIRequestFactory().post('/api/v1/orders/')
+            force_authenticate(http_request, user)
+            request = Request(http_request)
+            request.user = user
+
+            for lines in options['lines']:
+                items = [
+                    {'product': products[i % len(products)].pk, 'design': designs[i % len(designs)].pk, 'quantity': 100}
+                    for i in range(lines)
+                ]
+                best, queries = None, 0
+                for _ in range(options['repeat']):
+                    serializer = OrderSerializer(data={'items': items}, context={'request': request})
+                    with CaptureQueriesContext(connection) as captured:
+                        started = time.perf_counter()
+                        if not serializer.is_valid():
+                            raise CommandError(serializer.errors)
+                        serializer.save()
+                        elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                    queries = len(captured)
+                results.append((lines, best, queries))
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'lines':>6} {'best ms':>10} {'queries':>8}")
+        for lines, best, queries in results:
+            self.stdout.write(f"{lines:>6} {best * 1000:>10.1f} {queries:>8}")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from apps.orders.recommendations import build_related_products
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompute \"frequently bought together\" products from order co-occurrence. "
+        "--incremental only refreshes products in orders placed since the last run; "
+        "schedule a full rebuild periodically (e.g. nightly)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true')
+        parser.add_argument('--top-k', type=int, default=10, help="Related products kept per product")
+        parser.add_argument('--min-co-orders', type=int, default=2, help="Ignore pairs bought together less often")
+
+    def handle(self, *args, **options):
+        build = build_related_products(
+            incremental=options['incremental'], top_k=options['top_k'], min_co_orders=options['min_co_orders'],
+        )
+        self.stdout.write(
+            f"{build.mode}: {build.order_items} order lines up to order {build.last_order_id}, "
+            f"{build.products} products updated in {build.seconds:.2f}s"
+        )
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.orders.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired Idempotency-Key records in batches. Runs once by default; "
+        "--loop keeps purging."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Run as a long-lived worker")
+        parser.add_argument('--interval', type=float, default=3600.0, help="Seconds between purges with --loop")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = purge_expired_keys(batch_size=options['batch_size'])
+            if deleted:
+                self.stdout.write(f"{timezone.now().isoformat()} purged {deleted} idempotency keys")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
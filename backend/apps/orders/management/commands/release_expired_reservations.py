@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.orders.inventory import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = (
+        "Return stock held by expired, unpaid order reservations and commit the "
+        "reservations of paid orders. Runs once by default; --loop keeps sweeping."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Run as a long-lived worker")
+        parser.add_argument('--interval', type=float, default=60.0, help="Seconds between sweeps with --loop")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        while True:
+            released, committed = release_expired_reservations(batch_size=options['batch_size'])
+            if released or committed:
+                self.stdout.write(
+                    f"{timezone.now().isoformat()} released {released}, committed {committed} reservations"
+                )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
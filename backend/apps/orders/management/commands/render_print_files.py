@@ -0,0 +1,55 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.orders.rendering import process_render_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Render print files for queued order items in a pool of worker processes. "
+        "Runs until the queue is empty by default; --loop keeps polling for new work. "
+        "Any number of these workers can run side by side."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Run as a long-lived worker")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep when the queue is empty")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Render processes; 0 renders in this process")
+        parser.add_argument('--batch-size', type=int, default=0, help="Items claimed at a time (default: 4 per worker)")
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        batch_size = options['batch_size'] or 4 * max(workers, 1)
+        executor = self._pool(workers)
+        try:
+            while True:
+                try:
+                    done, failed = process_render_batch(batch_size=batch_size, executor=executor)
+                except BrokenProcessPool:
+                    self.stderr.write("A render process died; restarting the pool")
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = self._pool(workers)
+                    continue
+                if done or failed:
+                    self.stdout.write(f"{timezone.now().isoformat()} rendered {done} print files, {failed} failed")
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def _pool(self, workers):
+        if not workers:
+            return None
+        # Spawned, not forked: children only import apps.orders.canvas and never share
+        # this process's database connections.
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0014_product_weight_kg'),
+        ('orders', '0004_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShippingRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('country', models.CharField(blank=True, help_text='Blank applies to countries without their own rates', max_length=100)),
+                ('max_weight_kg', models.DecimalField(blank=True, decimal_places=3, help_text='Blank means no upper limit', max_digits=8, null=True)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TaxRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('country', models.CharField(max_length=100)),
+                ('state', models.CharField(blank=True, help_text='Blank applies to the whole country', max_length=100)),
+                ('rate', models.DecimalField(decimal_places=4, help_text='0.0825 for 8.25%', max_digits=6)),
+                ('applies_to_shipping', models.BooleanField(default=False)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('country', 'state'), name='tax_rule_unique_destination')],
+            },
+        ),
+        migrations.CreateModel(
+            name='QuantityTier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('min_quantity', models.PositiveIntegerField()),
+                ('discount_percent', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quantity_tiers', to='catalog.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'min_quantity'), name='quantity_tier_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0014_product_weight_kg'),
+        ('designs', '0005_remove_template_print_spec'),
+        ('orders', '0005_pricing_rules'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='render_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='render_completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='render_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='render_seconds',
+            field=models.FloatField(blank=True, help_text='Time spent rendering the last attempt', null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='render_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='render_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(condition=models.Q(('frozen_canvas_state__isnull', False), ('render_status__in', ['pending', 'processing'])), fields=['id'], name='orderitem_render_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0014_product_weight_kg'),
+        ('designs', '0005_remove_template_print_spec'),
+        ('orders', '0006_orderitem_render_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CanvasBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('compression', models.CharField(choices=[('zstd', 'Zstandard'), ('gzip', 'gzip')], max_length=10)),
+                ('data', models.BinaryField()),
+                ('size_bytes', models.PositiveIntegerField(help_text='Canonical JSON size before compression')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='orderitem',
+            name='orderitem_render_queue_idx',
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='canvas_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='order_items', to='orders.canvasblob'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(condition=models.Q(('canvas_blob__isnull', False), ('render_status__in', ['pending', 'processing'])), fields=['id'], name='orderitem_render_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:02
+
+import gzip
+import hashlib
+import json
+from collections import defaultdict
+
+from django.db import migrations, transaction
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BATCH_SIZE = 1000
+ZSTD_LEVEL = 10
+
+
+# A frozen copy of apps.orders.canvas_blobs as of this migration, so later
+# changes to that module (or its models) can't change what this one does.
+def encode_canvas(state):
+    raw = json.dumps(state, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode()
+    if zstandard is not None:
+        compression, data = 'zstd', zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    else:
+        compression, data = 'gzip', gzip.compress(raw, mtime=0)
+    return hashlib.sha256(raw).hexdigest(), compression, data, len(raw)
+
+
+def decode_canvas(compression, data):
+    data = bytes(data)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Canvas blob is zstd-compressed but the zstandard package is not installed")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        raw = gzip.decompress(data)
+    return json.loads(raw)
+
+
+def backfill_canvas_blobs(apps, schema_editor):
+    # Batches commit on their own (the migration is non-atomic), so a large
+    # orders table is never locked for the whole backfill and an interrupted
+    # run resumes where it stopped.
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    CanvasBlob = apps.get_model('orders', 'CanvasBlob')
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                OrderItem.objects.filter(pk__gt=last_pk, canvas_blob__isnull=True, frozen_canvas_state__isnull=False)
+                .order_by('pk').values_list('pk', 'frozen_canvas_state')[:BATCH_SIZE]
+            )
+            if not batch:
+                return
+            blobs, items_by_digest = {}, defaultdict(list)
+            for pk, state in batch:
+                if state is None:
+                    continue
+                digest, compression, data, size = encode_canvas(state)
+                if digest not in blobs:
+                    blobs[digest] = CanvasBlob(digest=digest, compression=compression, data=data, size_bytes=size)
+                items_by_digest[digest].append(pk)
+            CanvasBlob.objects.bulk_create(blobs.values(), ignore_conflicts=True)
+            for digest, pks in items_by_digest.items():
+                OrderItem.objects.filter(pk__in=pks).update(canvas_blob_id=digest)
+        last_pk = batch[-1][0]
+
+
+def restore_frozen_canvas_states(apps, schema_editor):
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    CanvasBlob = apps.get_model('orders', 'CanvasBlob')
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                OrderItem.objects.filter(pk__gt=last_pk, canvas_blob__isnull=False)
+                .order_by('pk').only('pk', 'canvas_blob_id')[:BATCH_SIZE]
+            )
+            if not batch:
+                return
+            blobs = CanvasBlob.objects.in_bulk({item.canvas_blob_id for item in batch})
+            states = {digest: decode_canvas(blob.compression, blob.data) for digest, blob in blobs.items()}
+            for item in batch:
+                item.frozen_canvas_state = states[item.canvas_blob_id]
+            OrderItem.objects.bulk_update(batch, ['frozen_canvas_state'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('orders', '0007_canvasblob'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_canvas_blobs, restore_frozen_canvas_states),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:48
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_backfill_canvas_blobs'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='orderitem',
+            name='frozen_canvas_state',
+        ),
+    ]
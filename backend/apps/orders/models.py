@@ -1,5 +1,7 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 from django.conf import settings
+from django.utils.functional import cached_property
 from apps.catalog.models import Product
 from apps.designs.models import SavedDesign
 from apps.users.models import Address
@@ -48,7 +50,38 @@ class Order(models.Model):
     def __str__(self):
         return f"Order #{self.id} - {self.status}"
 
+class CanvasBlob(models.Model):
+    """
+    A frozen canvas state, stored once per distinct content: keyed by the
+    SHA-256 of its canonical JSON and compressed. See apps.orders.canvas_blobs.
+    """
+    COMPRESSION_CHOICES = (
+        ('zstd', 'Zstandard'),
+        ('gzip', 'gzip'),
+    )
+
+    digest = models.CharField(max_length=64, primary_key=True)
+    compression = models.CharField(max_length=10, choices=COMPRESSION_CHOICES)
+    data = models.BinaryField()
+    size_bytes = models.PositiveIntegerField(help_text="Canonical JSON size before compression")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @cached_property
+    def state(self):
+        from .canvas_blobs import decode_canvas
+        return decode_canvas(self.compression, self.data)
+
+    def __str__(self):
+        return f"Canvas {self.digest[:12]} ({self.size_bytes} bytes)"
+
 class OrderItem(models.Model):
+    RENDER_STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
     design = models.ForeignKey(SavedDesign, on_delete=models.SET_NULL, null=True, blank=True)
@@ -60,17 +93,39 @@ class OrderItem(models.Model):
     # Enterprise Snapshots (CRITICAL for POD)
     product_name_snapshot = models.CharField(max_length=255, blank=True)
     sku_snapshot = models.CharField(max_length=50, blank=True)
-    frozen_canvas_state = models.JSONField(null=True, blank=True) # The source of truth for printing
+    # The source of truth for printing, shared by every item with the same canvas (see frozen_canvas_state)
+    canvas_blob = models.ForeignKey(CanvasBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='order_items')
     
     # Production Output
     print_file_url = models.FileField(upload_to='print_files/', null=True, blank=True)
-    render_status = models.CharField(max_length=20, default='pending') # pending, processing, completed, failed
+    render_status = models.CharField(max_length=20, choices=RENDER_STATUS_CHOICES, default='pending')
+    # Render bookkeeping, maintained by the render_print_files worker (apps.orders.rendering)
+    render_attempts = models.PositiveSmallIntegerField(default=0)
+    render_error = models.TextField(blank=True)
+    render_started_at = models.DateTimeField(null=True, blank=True)
+    render_completed_at = models.DateTimeField(null=True, blank=True)
+    render_seconds = models.FloatField(null=True, blank=True, help_text="Time spent rendering the last attempt")
+
+    class Meta:
+        indexes = [
+            # The render queue: items with a design still to render, claimed in pk order.
+            models.Index(
+                fields=['id'],
+                condition=models.Q(render_status__in=['pending', 'processing'], canvas_blob__isnull=False),
+                name='orderitem_render_queue_idx',
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.total_price:
             self.total_price = self.quantity * self.unit_price
         super().save(*args, **kwargs)
 
+    @property
+    def frozen_canvas_state(self):
+        """The design's canvas as frozen at checkout, loaded from its CanvasBlob on first access."""
+        return self.canvas_blob.state if self.canvas_blob_id else None
+
     def __str__(self):
         return f"{self.quantity}x {self.product_name_snapshot} (Order #{self.order.id})"
 
@@ -114,3 +169,114 @@ class Shipment(models.Model):
 
     def __str__(self):
         return f"Shipment for Order #{self.order.id}"
+
+class StockReservation(models.Model):
+    """
+    Stock held for an order's finite-stock product. Created at checkout when
+    the stock is decremented; the sweeper commits it once the order is paid or
+    returns the quantity to the product when it expires unpaid.
+    """
+    STATUS_CHOICES = (
+        ('active', 'Active'),
+        ('committed', 'Committed'),
+        ('released', 'Released'),
+    )
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_reservations')
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='reservation_active_expiry_idx',
+                         condition=models.Q(status='active')),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity}x product #{self.product_id} for Order #{self.order_id} ({self.status})"
+
+class IdempotencyKey(models.Model):
+    """
+    A client-supplied ``Idempotency-Key`` for a non-idempotent endpoint, with
+    the response it produced so retries replay it instead of running again.
+    See apps.orders.idempotency.
+    """
+    STATUS_CHOICES = (
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+    )
+
+    owner = models.CharField(max_length=64)  # "user:<pk>", or "anonymous" for integrations
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='processing')
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'scope', 'key'], name='idempotency_key_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_key_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key} for {self.owner} ({self.status})"
+
+class TaxRule(models.Model):
+    """
+    Sales tax for a destination. A rule for the address's state wins over the
+    country-wide one (blank state); destinations without a rule are untaxed.
+    Countries and states are matched case-insensitively against the address.
+    """
+    country = models.CharField(max_length=100)
+    state = models.CharField(max_length=100, blank=True, help_text="Blank applies to the whole country")
+    rate = models.DecimalField(max_digits=6, decimal_places=4, help_text="0.0825 for 8.25%")
+    applies_to_shipping = models.BooleanField(default=False)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['country', 'state'], name='tax_rule_unique_destination'),
+        ]
+
+    def __str__(self):
+        destination = f"{self.country}, {self.state}" if self.state else self.country
+        return f"{destination}: {self.rate}"
+
+class ShippingRate(models.Model):
+    """
+    Price of shipping a cart up to ``max_weight_kg`` to a country. The
+    lightest tier that fits applies; heavier carts pay the heaviest tier. A
+    blank country is the fallback zone for countries without rates of their own.
+    """
+    country = models.CharField(max_length=100, blank=True, help_text="Blank applies to countries without their own rates")
+    max_weight_kg = models.DecimalField(max_digits=8, decimal_places=3, null=True, blank=True, help_text="Blank means no upper limit")
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    is_active = models.BooleanField(default=True)
+
+    def __str__(self):
+        limit = f"up to {self.max_weight_kg} kg" if self.max_weight_kg is not None else "any weight"
+        return f"{self.country or 'Default zone'} {limit}: {self.price}"
+
+class QuantityTier(models.Model):
+    """Volume discount: ordering at least ``min_quantity`` of a product takes ``discount_percent`` off its unit price."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='quantity_tiers')
+    min_quantity = models.PositiveIntegerField()
+    discount_percent = models.DecimalField(max_digits=5, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'min_quantity'], name='quantity_tier_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.discount_percent}% off from {self.min_quantity}"
@@ -0,0 +1,138 @@
+"""
+"Frequently bought together" from order co-occurrence.
+
+OrderItem rows are streamed as (order, product) pairs into a binary sparse
+order x product matrix M; ``M.T @ M`` then counts, for every product pair,
+the orders containing both (its diagonal is each product's order count).
+Each product keeps its top-K partners by cosine score
+``co_orders / sqrt(orders_a * orders_b)``, which stops best-sellers from
+showing up as related to everything, in catalog.RelatedProduct.
+
+Incremental runs only rebuild the rows of products in orders placed since
+the previous run. They re-read every order containing one of those products,
+so those rows' counts are exact. Other products' scores can drift slightly
+as order counts grow, and orders cancelled after being counted stay
+counted; a periodic full rebuild resets both.
+"""
+import time
+from itertools import chain
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Max
+from scipy import sparse
+
+from apps.catalog.models import RelatedProduct, RelatedProductsBuild
+from .models import Order, OrderItem
+
+EXCLUDED_STATUSES = ['Cancelled', 'Refunded']
+CHUNK_SIZE = 50000
+
+
+def build_related_products(incremental=False, top_k=10, min_co_orders=2):
+    """Rebuild related-product rows; returns the RelatedProductsBuild record."""
+    started = time.perf_counter()
+    previous = RelatedProductsBuild.objects.order_by('-pk').first() if incremental else None
+    # Orders are created with their items in one transaction, so everything up
+    # to this id is complete; later orders are left for the next run.
+    last_order_id = Order.objects.aggregate(last=Max('pk'))['last'] or 0
+    items = counted_items().filter(order_id__lte=last_order_id)
+
+    if previous is None:
+        mode, touched, order_counts = 'full', None, None
+    else:
+        mode = 'incremental'
+        new_products = items.filter(order_id__gt=previous.last_order_id).values('product_id')
+        touched = np.unique(np.fromiter(new_products.values_list('product_id', flat=True).distinct(), dtype=np.int64))
+        # Every order containing a touched product, so their rows are recounted in full.
+        items = items.filter(order_id__in=items.filter(product_id__in=new_products).values('order_id'))
+        order_counts = _order_counts(last_order_id)
+
+    pairs = _stream_pairs(items.values_list('order_id', 'product_id'))
+    rows = cooccurrence_top_k(pairs, touched, order_counts, top_k, min_co_orders)
+    with transaction.atomic():
+        stale = RelatedProduct.objects.all()
+        if touched is not None:
+            stale = stale.filter(product_id__in=new_products)
+        stale.delete()
+        RelatedProduct.objects.bulk_create(rows, batch_size=5000)
+        return RelatedProductsBuild.objects.create(
+            mode=mode,
+            last_order_id=last_order_id,
+            order_items=len(pairs),
+            products=len(touched) if touched is not None else len({row.product_id for row in rows}),
+            seconds=time.perf_counter() - started,
+        )
+
+
+def counted_items():
+    return OrderItem.objects.filter(product__isnull=False).exclude(order__status__in=EXCLUDED_STATUSES).order_by()
+
+
+def cooccurrence_top_k(pairs, products=None, order_counts=None, top_k=10, min_co_orders=2):
+    """
+    RelatedProduct rows (unsaved) for ``products`` (all products if None).
+
+    ``pairs`` is an ``(n, 2)`` array of (order_id, product_id). ``order_counts``
+    maps product id -> orders containing it; by default it is taken from
+    ``pairs``, which is only complete for a full scan.
+    """
+    if not len(pairs) or (products is not None and not len(products)):
+        return []
+    order_ids, order_index = np.unique(pairs[:, 0], return_inverse=True)
+    product_ids, product_index = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.int32), (order_index, product_index)),
+        shape=(len(order_ids), len(product_ids)),
+    )
+    matrix.data[:] = 1  # several lines of one product in an order count once
+
+    if products is None:
+        rows_index = np.arange(len(product_ids))
+        cooccurrence = (matrix.T @ matrix).tocsr()
+    else:
+        rows_index = np.searchsorted(product_ids, products)
+        cooccurrence = (matrix[:, rows_index].T @ matrix).tocsr()
+
+    if order_counts is None:
+        totals = np.asarray(matrix.sum(axis=0)).ravel().astype(np.float64)
+    else:
+        totals = np.array([order_counts.get(pid, 0) for pid in product_ids.tolist()], dtype=np.float64)
+
+    results = []
+    for row, column in enumerate(rows_index):
+        start, end = cooccurrence.indptr[row], cooccurrence.indptr[row + 1]
+        partners, counts = cooccurrence.indices[start:end], cooccurrence.data[start:end]
+        keep = (partners != column) & (counts >= min_co_orders)
+        partners, counts = partners[keep], counts[keep]
+        if not len(partners):
+            continue
+        scores = counts / np.sqrt(np.maximum(totals[column] * totals[partners], 1))
+        if len(partners) > top_k:
+            best = np.argpartition(-scores, top_k)[:top_k]
+            partners, counts, scores = partners[best], counts[best], scores[best]
+        order = np.lexsort((-counts, -scores))
+        product_id = int(product_ids[column])
+        results.extend(
+            RelatedProduct(
+                product_id=product_id, related_id=int(product_ids[partners[i]]), rank=rank,
+                co_orders=int(counts[i]), score=float(scores[i]),
+            )
+            for rank, i in enumerate(order, start=1)
+        )
+    return results
+
+
+def _order_counts(last_order_id):
+    """Orders per product across all counted orders, for incremental runs."""
+    return dict(
+        counted_items().filter(order_id__lte=last_order_id)
+        .values('product_id').annotate(orders=Count('order_id', distinct=True))
+        .values_list('product_id', 'orders')
+    )
+
+
+def _stream_pairs(values_list):
+    """Read a two-column values_list in chunks into an ``(n, 2)`` int64 array."""
+    rows = chain.from_iterable(values_list.iterator(chunk_size=CHUNK_SIZE))
+    return np.fromiter(rows, dtype=np.int64).reshape(-1, 2)
@@ -0,0 +1,156 @@
+"""
+Print files for order items.
+
+Checkout creates items with a frozen canvas as ``render_status='pending'``
+and returns without rendering. The render_print_files worker claims pending
+items with ``SELECT ... FOR UPDATE SKIP LOCKED``, so any number of workers
+can share the queue, and renders them in a process pool (apps.orders.canvas).
+It stores each file in ``print_file_url`` and records the status, attempt
+count, timings and last error on the item.
+
+A failed render goes back to pending until it has failed ``MAX_ATTEMPTS``
+times; then it stays 'failed' with the error shown in the admin. Items a dead
+worker left 'processing' are reclaimed after ``STALE_AFTER``. Items of
+cancelled or refunded orders are not rendered.
+"""
+import logging
+from collections import defaultdict
+from concurrent.futures import Future, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.designs.models import Font
+from .canvas import timed_render
+from .models import CanvasBlob, OrderItem
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+STALE_AFTER = timedelta(minutes=10)
+SKIPPED_ORDER_STATUSES = ['Cancelled', 'Refunded']
+
+
+def claim_items(batch_size, now=None):
+    """Mark up to ``batch_size`` items as processing, reclaiming ones a dead worker abandoned."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        items = list(
+            OrderItem.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(canvas_blob__isnull=False)
+            .filter(Q(render_status='pending') | Q(render_status='processing', render_started_at__lt=now - STALE_AFTER))
+            .exclude(order__status__in=SKIPPED_ORDER_STATUSES)
+            .only('pk', 'order_id', 'canvas_blob_id', 'render_attempts', 'print_file_url')
+            .order_by('pk')[:batch_size]
+        )
+        OrderItem.objects.filter(pk__in=[item.pk for item in items]).update(
+            render_status='processing', render_attempts=F('render_attempts') + 1,
+            render_started_at=now, render_completed_at=None,
+        )
+    for item in items:
+        item.render_attempts += 1
+    return items
+
+
+def process_render_batch(batch_size=20, executor=None):
+    """
+    Render one batch of queued items. Returns ``(done, failed)``.
+
+    ``executor`` is a process pool to render in; without one, items render in
+    this process. Re-raises BrokenProcessPool (after recording the batch) so
+    the caller can replace the pool.
+    """
+    items = claim_items(batch_size)
+    if not items:
+        return 0, 0
+    # Items share a CanvasBlob when their canvases are identical (say, 500 cards
+    # of one design); each distinct canvas is rendered once per batch.
+    by_canvas = defaultdict(list)
+    for item in items:
+        by_canvas[item.canvas_blob_id].append(item)
+    blobs = CanvasBlob.objects.in_bulk(list(by_canvas))
+    options = render_options()
+    futures = {_render(executor, blobs[digest], options): digest for digest in by_canvas}
+
+    done = failed = 0
+    broken = None
+    for future in as_completed(futures):
+        error = future.exception()
+        for item in by_canvas[futures[future]]:
+            if error is None:
+                _store(item, *future.result())
+                done += 1
+            else:
+                _record_failure(item, error)
+                failed += 1
+        if isinstance(error, BrokenProcessPool):
+            broken = error
+    if broken is not None:
+        raise broken
+    return done, failed
+
+
+def render_options():
+    """Settings and font sources passed to every render."""
+    storage = Font._meta.get_field('file').storage
+    fonts = defaultdict(dict)
+    for family, weight, name in Font.objects.filter(is_active=True).values_list('family', 'weight', 'file'):
+        fonts[family.strip().casefold()][weight] = storage.url(name)
+    return {
+        'dpi': settings.PRINT_FILE_DPI,
+        'file_format': settings.PRINT_FILE_FORMAT,
+        'fonts': dict(fonts),
+        'media_root': str(settings.MEDIA_ROOT),
+        'media_url': settings.MEDIA_URL,
+        'allowed_hosts': tuple(settings.MEDIA_DOWNLOAD_HOSTS),
+        'max_bytes': settings.MEDIA_SOURCE_MAX_BYTES,
+        'max_pixels': settings.MEDIA_SOURCE_MAX_PIXELS,
+    }
+
+
+def print_file_name(item):
+    return f'print_files/{item.order_id}/{item.pk}.{settings.PRINT_FILE_FORMAT.lower()}'
+
+
+def _render(executor, blob, options):
+    """A Future for rendering ``blob``: submitted to ``executor``, or already done if rendered here."""
+    try:
+        if executor is not None:
+            return executor.submit(timed_render, blob.state, options)
+        future = Future()
+        future.set_result(timed_render(blob.state, options))
+    except Exception as exc:
+        future = Future()
+        future.set_exception(exc)
+    return future
+
+
+def _store(item, data, seconds):
+    storage = OrderItem._meta.get_field('print_file_url').storage
+    name = storage.save(print_file_name(item), ContentFile(data))
+    # Conditional on the attempt, in case the item was reclaimed while this render ran.
+    updated = OrderItem.objects.filter(
+        pk=item.pk, render_status='processing', render_attempts=item.render_attempts,
+    ).update(
+        print_file_url=name, render_status='completed', render_completed_at=timezone.now(),
+        render_seconds=seconds, render_error='',
+    )
+    if not updated:
+        storage.delete(name)
+    elif item.print_file_url and item.print_file_url.name != name:
+        storage.delete(item.print_file_url.name)  # a re-render replaced it
+
+
+def _record_failure(item, error):
+    logger.warning("Print file render failed for order item %s (attempt %s): %s", item.pk, item.render_attempts, error)
+    OrderItem.objects.filter(
+        pk=item.pk, render_status='processing', render_attempts=item.render_attempts,
+    ).update(
+        render_status='failed' if item.render_attempts >= MAX_ATTEMPTS else 'pending',
+        render_error=f'{type(error).__name__}: {error}'[:2000],
+    )
@@ -1,20 +1,77 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
+from .canvas_blobs import prepare_blobs, save_blobs, store_canvas
+from .inventory import InsufficientStock, reserve_stock
+from .pricing import price_cart
 from .models import Order, OrderItem, PrintJob, Shipment
+from apps.catalog.fieldsets import DynamicFieldsMixin
+from apps.catalog.models import Product
+from apps.designs.models import SavedDesign
+from apps.users.models import Address
 from apps.users.serializers import AddressSerializer
 
-class OrderItemSerializer(serializers.ModelSerializer):
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField that resolves from objects its list serializer
+    loaded up front (one ``in_bulk`` per field) instead of one query per line.
+    """
+    def to_internal_value(self, data):
+        loaded = getattr(self.parent, 'bulk_objects', {}).get(self.field_name)
+        if loaded is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = self.get_queryset().model._meta.pk.to_python(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in loaded:
+            self.fail('does_not_exist', pk_value=data)
+        return loaded[pk]
+
+
+class OrderItemListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.child.bulk_objects = {
+                name: field.get_queryset().in_bulk(
+                    {line[name] for line in data if isinstance(line, dict) and _is_pk(line.get(name))}
+                )
+                for name, field in self.child.fields.items()
+                if isinstance(field, BulkPrimaryKeyRelatedField)
+            }
+        try:
+            return super().to_internal_value(data)
+        finally:
+            self.child.bulk_objects = {}
+
+
+def _is_pk(value):
+    return (isinstance(value, int) and not isinstance(value, bool)) or (isinstance(value, str) and value.isdigit())
+
+
+class OrderItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    product = BulkPrimaryKeyRelatedField(queryset=Product.objects.all())
+    design = BulkPrimaryKeyRelatedField(queryset=SavedDesign.objects.all(), required=False, allow_null=True)
     product_name = serializers.ReadOnlyField(source='product.name')
+    canvas_hash = serializers.ReadOnlyField(source='canvas_blob_id')
 
     class Meta:
         model = OrderItem
-        fields = ['id', 'product', 'design', 'quantity', 'unit_price', 'total_price', 'product_name', 'frozen_canvas_state', 'print_file_url', 'render_status']
-        read_only_fields = ['id', 'unit_price', 'total_price', 'frozen_canvas_state', 'print_file_url', 'render_status']
+        fields = ['id', 'product', 'design', 'quantity', 'unit_price', 'total_price', 'product_name', 'canvas_hash', 'print_file_url', 'render_status']
+        read_only_fields = ['id', 'unit_price', 'total_price', 'print_file_url', 'render_status']
+        # The full canvas can be large; ?expand=items.frozen_canvas_state includes it.
+        expandable_fields = ['frozen_canvas_state']
+        list_serializer_class = OrderItemListSerializer
 
     def create(self, validated_data):
         # Auto-freeze canvas state from the Design
         design = validated_data.get('design')
         if design:
-            validated_data['frozen_canvas_state'] = design.design_json
+            validated_data['canvas_blob_id'] = store_canvas(design.design_json)
         
         # Auto-snapshot product details
         product = validated_data.get('product')
@@ -32,7 +89,7 @@ class ShipmentSerializer(serializers.ModelSerializer):
         fields = ['carrier', 'tracking_number', 'status', 'shipped_at', 'delivered_at']
         read_only_fields = ['shipped_at', 'delivered_at']
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True) # Writable nested serializer is complex, keeping simple for MVP
     shipping_address_details = AddressSerializer(source='shipping_address', read_only=True)
     shipment = ShipmentSerializer(read_only=True)
@@ -45,36 +102,124 @@ class OrderSerializer(serializers.ModelSerializer):
             'shipping_address', 'shipping_address_details', 
             'items', 'shipment', 'created_at'
         ]
-        read_only_fields = ['id', 'status', 'created_at', 'total_amount', 'subtotal', 'tax_total']
+        read_only_fields = [
+            'id', 'status', 'created_at', 'total_amount', 'subtotal', 'tax_total', 'shipping_total', 'discount_total',
+        ]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is not None and 'shipping_address' in fields:
+            fields['shipping_address'].queryset = request.user.addresses.all()
+        return fields
 
     def create(self, validated_data):
+        """Write the order, its stock reservations and all lines in one transaction."""
         items_data = validated_data.pop('items')
-        
-        # Calculate totals (Simplified)
-        subtotal = sum(item['product'].base_price * item['quantity'] for item in items_data)
-        validated_data['subtotal'] = subtotal
-        validated_data['total_amount'] = subtotal # + tax + shipping later
+        quote = price_for_address(
+            [(item_data['product'], item_data['quantity']) for item_data in items_data],
+            validated_data.get('shipping_address'),
+        )
+        # One blob per distinct design, however many lines use it.
+        blobs, digests = prepare_blobs([
+            item_data['design'].design_json if item_data.get('design') else None for item_data in items_data
+        ])
+        items = [
+            self._build_item(item_data, line, digest)
+            for item_data, line, digest in zip(items_data, quote.lines, digests)
+        ]
+        validated_data.update(
+            subtotal=quote.subtotal,
+            discount_total=quote.discount_total,
+            shipping_total=quote.shipping_total,
+            tax_total=quote.tax_total,
+            total_amount=quote.total_amount,
+        )
         
         # Assign User
         validated_data['user'] = self.context['request'].user
         
-        order = Order.objects.create(**validated_data)
-        
-        for item_data in items_data:
-            # Re-use logic from OrderItemSerializer could be cleaner, but manual here for nested write
-            product = item_data['product']
-            design = item_data.get('design')
-            quantity = item_data['quantity']
-            
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                design=design,
-                quantity=quantity,
-                unit_price=product.base_price,
-                total_price=product.base_price * quantity,
-                product_name_snapshot=product.name,
-                sku_snapshot=product.sku,
-                frozen_canvas_state=design.design_json if design else None
-            )
+        with transaction.atomic():
+            order = Order.objects.create(**validated_data)
+            save_blobs(blobs)
+            try:
+                reserve_stock(order, [(item.product, item.quantity) for item in items])
+            except InsufficientStock as exc:
+                raise serializers.ValidationError({'items': [str(exc)]})
+            for item in items:
+                item.order = order
+            OrderItem.objects.bulk_create(items)
+        # The response renders every line's product; load them in one query.
+        prefetch_related_objects([order], Prefetch('items', queryset=OrderItem.objects.select_related('product')))
         return order
+
+    def _build_item(self, item_data, line, canvas_digest):
+        """An unsaved OrderItem with its priced ``line``, product snapshot and frozen canvas."""
+        product = item_data['product']
+        design = item_data.get('design')
+        return OrderItem(
+            product=product,
+            design=design,
+            quantity=item_data['quantity'],
+            unit_price=line.unit_price,
+            total_price=line.total_price,
+            product_name_snapshot=product.name,
+            sku_snapshot=product.sku,
+            canvas_blob_id=canvas_digest,
+        )
+
+
+def price_for_address(lines, address=None):
+    if address is None:
+        return price_cart(lines)
+    return price_cart(lines, country=address.country, state=address.state)
+
+
+class QuoteItemSerializer(serializers.Serializer):
+    product = BulkPrimaryKeyRelatedField(queryset=Product.objects.all())
+    quantity = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        list_serializer_class = OrderItemListSerializer
+
+
+class QuoteSerializer(serializers.Serializer):
+    """A cart to price, shipped to a saved address or to a country/state."""
+    items = QuoteItemSerializer(many=True, allow_empty=False)
+    shipping_address = serializers.PrimaryKeyRelatedField(queryset=Address.objects.all(), required=False, allow_null=True)
+    country = serializers.CharField(required=False, allow_blank=True)
+    state = serializers.CharField(required=False, allow_blank=True)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is not None:
+            fields['shipping_address'].queryset = request.user.addresses.all()
+        return fields
+
+    def quote(self):
+        data = self.validated_data
+        lines = [(item['product'], item['quantity']) for item in data['items']]
+        if data.get('shipping_address') is not None:
+            return price_for_address(lines, data['shipping_address'])
+        return price_cart(lines, country=data.get('country', ''), state=data.get('state', ''))
+
+
+class PricedLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField(source='product.pk')
+    product_name = serializers.CharField(source='product.name')
+    quantity = serializers.IntegerField()
+    list_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    unit_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2)
+    discount = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class QuoteResultSerializer(serializers.Serializer):
+    items = PricedLineSerializer(source='lines', many=True)
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2)
+    discount_total = serializers.DecimalField(max_digits=12, decimal_places=2)
+    shipping_total = serializers.DecimalField(max_digits=12, decimal_places=2)
+    tax_total = serializers.DecimalField(max_digits=12, decimal_places=2)
+    total_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    weight_kg = serializers.DecimalField(max_digits=12, decimal_places=3)
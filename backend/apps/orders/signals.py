@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import QuantityTier, ShippingRate, TaxRule
+from .pricing import bump_pricing_version
+
+
+@receiver([post_save, post_delete], sender=TaxRule)
+@receiver([post_save, post_delete], sender=ShippingRate)
+@receiver([post_save, post_delete], sender=QuantityTier)
+def invalidate_pricing_rules(sender, **kwargs):
+    bump_pricing_version()
@@ -1,3 +1,499 @@
-from django.test import TestCase
+import tempfile
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
+
+from apps.catalog.models import Category, Subcategory, Product, RelatedProduct
+from apps.designs.models import SavedDesign
+from apps.users.models import Address, User
+from shop_project.downloads import DownloadError
+from . import canvas, idempotency, rendering
+from .canvas import CanvasError, _SourceCache, render_canvas
+from .canvas_blobs import canvas_digest, store_canvas
+from .idempotency import request_fingerprint
+from .inventory import release_expired_reservations
+from .models import CanvasBlob, IdempotencyKey, Order, OrderItem, QuantityTier, ShippingRate, StockReservation, TaxRule
+from .recommendations import build_related_products
+from .rendering import process_render_batch
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='buyer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Mugs', slug='mugs')
+        subcategory = Subcategory.objects.create(category=category, name='Ceramic', slug='ceramic')
+        self.mug = Product.objects.create(
+            subcategory=subcategory, name='Mug', slug='mug', sku='MG-1', base_price=8,
+            stock_quantity=3, is_infinite_stock=False,
+        )
+        self.poster = Product.objects.create(
+            subcategory=subcategory, name='Poster', slug='poster', sku='PS-1', base_price=4,
+            stock_quantity=0, is_infinite_stock=True,
+        )
+
+    def checkout(self, *lines):
+        items = [{'product': product.id, 'quantity': quantity} for product, quantity in lines]
+        return self.client.post('/api/v1/orders/', {'items': items}, format='json')
+
+    def test_checkout_reserves_and_refuses_to_oversell(self):
+        response = self.checkout((self.mug, 2), (self.poster, 5))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.mug.refresh_from_db()
+        self.assertEqual(self.mug.stock_quantity, 1)
+        self.assertEqual(StockReservation.objects.get().quantity, 2)
+
+        response = self.checkout((self.mug, 1), (self.mug, 1))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.count(), 1)
+        self.mug.refresh_from_db()
+        self.assertEqual(self.mug.stock_quantity, 1)
+
+    def test_multi_product_checkout_is_all_or_nothing(self):
+        self.poster.is_infinite_stock = False
+        self.poster.stock_quantity = 1
+        self.poster.save()
+        response = self.checkout((self.mug, 2), (self.poster, 2))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Only 1 of "Poster" left', response.data['items'][0])
+        self.mug.refresh_from_db()
+        self.assertEqual(self.mug.stock_quantity, 3)
+
+        self.assertEqual(self.checkout((self.mug, 2), (self.poster, 1)).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            sorted(Product.objects.filter(pk__in=[self.mug.pk, self.poster.pk]).values_list('stock_quantity', flat=True)),
+            [0, 1],
+        )
+
+    def test_sweeper_releases_unpaid_and_commits_paid(self):
+        self.checkout((self.mug, 1))
+        self.checkout((self.mug, 2))
+        paid, unpaid = Order.objects.order_by('pk')
+        Order.objects.filter(pk=paid.pk).update(is_paid=True)
+
+        self.assertEqual(release_expired_reservations(), (0, 0))
+        later = timezone.now() + timedelta(hours=1)
+        self.assertEqual(release_expired_reservations(now=later), (1, 1))
+
+        self.mug.refresh_from_db()
+        self.assertEqual(self.mug.stock_quantity, 2)
+        unpaid.refresh_from_db()
+        # Payment handling decides whether the order is cancelled, not the sweeper.
+        self.assertEqual(unpaid.status, 'Pending')
+        self.assertEqual(
+            dict(StockReservation.objects.values_list('order_id', 'status')),
+            {paid.pk: 'committed', unpaid.pk: 'released'},
+        )
+        call_command('release_expired_reservations', stdout=StringIO())
+
+
+class OrderCreateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='buyer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        subcategory = Subcategory.objects.create(
+            category=Category.objects.create(name='Cards', slug='cards'), name='Business', slug='business',
+        )
+        self.products = [
+            Product.objects.create(subcategory=subcategory, name=f'Card {i}', slug=f'card-{i}', sku=f'BC-{i}', base_price=2)
+            for i in range(5)
+        ]
+        self.design = SavedDesign.objects.create(
+            user=self.user, product=self.products[0], design_json={'objects': [{'text': 'Jane Doe'}]},
+        )
+
+    def checkout(self, lines):
+        items = [
+            {'product': self.products[i % 5].id, 'design': self.design.id, 'quantity': 10} for i in range(lines)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/v1/orders/', {'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_lines(self):
+        _, single = self.checkout(1)
+        response, bulk = self.checkout(50)
+        self.assertEqual(single, bulk)
+        self.assertEqual(response.data['subtotal'], '1000.00')
+        self.assertEqual(len(response.data['items']), 50)
+        item = OrderItem.objects.filter(order_id=response.data['id']).first()
+        self.assertEqual((item.sku_snapshot, item.frozen_canvas_state), ('BC-0', self.design.design_json))
+
+    def test_canvas_is_stored_once_and_only_sent_when_expanded(self):
+        response, _ = self.checkout(20)
+        self.assertEqual(CanvasBlob.objects.count(), 1)
+        self.assertEqual({item['canvas_hash'] for item in response.data['items']}, {canvas_digest(self.design.design_json)})
+        self.assertNotIn('frozen_canvas_state', response.data['items'][0])
+
+        url = f"/api/v1/orders/{response.data['id']}/"
+        self.assertNotIn('frozen_canvas_state', self.client.get(url).data['items'][0])
+        with CaptureQueriesContext(connection) as queries:
+            expanded = self.client.get(url, {'expand': 'items.frozen_canvas_state'})
+        self.assertEqual({str(item['frozen_canvas_state']) for item in expanded.data['items']}, {str(self.design.design_json)})
+        self.assertEqual(sum('orders_canvasblob' in query['sql'] for query in queries), 1)
+
+        # Key order and whitespace don't change the address.
+        self.assertEqual(canvas_digest({'b': 1, 'a': [1, 2]}), canvas_digest({'a': [1, 2], 'b': 1}))
+
+    def test_unknown_product_rejects_the_whole_order(self):
+        items = [{'product': self.products[0].id, 'quantity': 1}, {'product': 999999, 'quantity': 1}]
+        response = self.client.post('/api/v1/orders/', {'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('product', response.data['items'][1])
+        self.assertFalse(Order.objects.exists())
+
+    def test_boolean_product_is_not_a_primary_key(self):
+        response = self.client.post('/api/v1/orders/', {'items': [{'product': True, 'quantity': 1}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Incorrect type', str(response.data['items'][0]['product']))
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='buyer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        subcategory = Subcategory.objects.create(
+            category=Category.objects.create(name='Cards', slug='cards'), name='Business', slug='business',
+        )
+        self.card = Product.objects.create(subcategory=subcategory, name='Card', slug='card', sku='BC-1', base_price=2)
+
+    def checkout(self, key, quantity=1):
+        return self.client.post(
+            '/api/v1/orders/', {'items': [{'product': self.card.id, 'quantity': quantity}]},
+            format='json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_the_first_response(self):
+        first = self.checkout('retry-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        cache.clear()  # the stored row answers too, not only the cache
+        for _ in range(2):
+            retry = self.checkout('retry-1')
+            self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(retry['Idempotent-Replayed'], 'true')
+            self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.checkout('retry-2').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_key_reused_for_a_different_request_is_rejected(self):
+        self.checkout('reuse')
+        self.assertEqual(self.checkout('reuse', quantity=2).status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_request_releases_the_key(self):
+        bad = self.client.post('/api/v1/orders/', {'items': [{'product': 999999, 'quantity': 1}]},
+                               format='json', HTTP_IDEMPOTENCY_KEY='fix-and-retry')
+        self.assertEqual(bad.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0, IDEMPOTENCY_LOCK_SECONDS=60)
+    def test_duplicate_of_an_in_flight_request(self):
+        fingerprint = request_fingerprint(Request(
+            APIRequestFactory().post('/api/v1/orders/', {'items': [{'product': self.card.id, 'quantity': 1}]}, format='json'),
+            parsers=[JSONParser()],
+        ))
+        in_flight = IdempotencyKey.objects.create(
+            owner=f'user:{self.user.pk}', scope='orders:create', key='busy', fingerprint=fingerprint,
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        response = self.checkout('busy')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(Order.objects.exists())
+
+        # A request that never finished gives its key up after the lock timeout.
+        IdempotencyKey.objects.filter(pk=in_flight.pk).update(created_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self.checkout('busy').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(IdempotencyKey.objects.get().status, 'completed')
+
+    def test_order_and_stored_response_commit_together(self):
+        def taken_over_meanwhile():
+            Order.objects.create(user=self.user, total_amount=2)
+            IdempotencyKey.objects.all().delete()
+            return Response({'id': 1}, status=status.HTTP_201_CREATED)
+
+        with self.assertRaises(DatabaseError):
+            idempotency._run('orders:create', f'user:{self.user.pk}', 'lost', 'fingerprint', taken_over_meanwhile)
+        self.assertFalse(Order.objects.exists())
+
+    def test_external_calls_run_outside_a_transaction(self):
+        depth = len(connection.atomic_blocks)
+        seen = []
+
+        def register():
+            seen.append(len(connection.atomic_blocks))
+            return Response({'order': 'Z-1'})
+
+        response = idempotency._run('zakeke:order', 'anonymous', 'external', 'fingerprint', register, atomic=False)
+        self.assertEqual((response.status_code, seen), (status.HTTP_200_OK, [depth]))
+        self.assertEqual(IdempotencyKey.objects.get().response_body, {'order': 'Z-1'})
+
+    def test_purge_deletes_expired_keys_in_batches(self):
+        now = timezone.now()
+        IdempotencyKey.objects.bulk_create(
+            IdempotencyKey(owner='anonymous', scope='zakeke:order', key=str(i), fingerprint='x',
+                           status='completed', expires_at=now + timedelta(hours=-1 if i < 5 else 1))
+            for i in range(7)
+        )
+        call_command('purge_idempotency_keys', batch_size=2, stdout=StringIO())
+        self.assertEqual(sorted(IdempotencyKey.objects.values_list('key', flat=True)), ['5', '6'])
+
+
+class PricingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='buyer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        subcategory = Subcategory.objects.create(
+            category=Category.objects.create(name='Cards', slug='cards'), name='Business', slug='business',
+        )
+        self.card = Product.objects.create(
+            subcategory=subcategory, name='Card', slug='card', sku='BC-1', base_price=10, weight_kg='0.1',
+        )
+        self.mug = Product.objects.create(
+            subcategory=subcategory, name='Mug', slug='mug', sku='MG-1', base_price=20,
+            is_on_sale=True, discount_type='percentage', discount_value=25,
+        )
+        QuantityTier.objects.create(product=self.card, min_quantity=100, discount_percent=10)
+        QuantityTier.objects.create(product=self.card, min_quantity=500, discount_percent=20)
+        TaxRule.objects.create(country='US', rate='0.05')
+        TaxRule.objects.create(country='US', state='CA', rate='0.0825')
+        ShippingRate.objects.create(country='US', max_weight_kg=1, price=5)
+        ShippingRate.objects.create(country='US', max_weight_kg=10, price=12)
+        ShippingRate.objects.create(country='', price=30)
+
+    def quote(self, cart, **destination):
+        items = [{'product': product.id, 'quantity': quantity} for product, quantity in cart]
+        response = self.client.post('/api/v1/orders/quote/', {'items': items, **destination}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_quote_applies_tiers_shipping_and_tax(self):
+        quote = self.quote([(self.card, 100), (self.mug, 2)], country='us', state='ca')
+        self.assertEqual(
+            [(line['unit_price'], line['total_price'], line['discount']) for line in quote['items']],
+            [('9.00', '900.00', '100.00'), ('15.00', '30.00', '0.00')],
+        )
+        self.assertEqual(
+            [quote[field] for field in ('subtotal', 'discount_total', 'shipping_total', 'tax_total', 'total_amount')],
+            ['1030.00', '100.00', '12.00', '76.73', '1018.73'],
+        )
+        # Country-wide rule without a state rule; lightest shipping tier.
+        quote = self.quote([(self.card, 5)], country='US', state='NY')
+        self.assertEqual((quote['shipping_total'], quote['tax_total']), ('5.00', '2.50'))
+        # Default shipping zone, no tax rule.
+        quote = self.quote([(self.card, 5)], country='France')
+        self.assertEqual((quote['shipping_total'], quote['tax_total'], quote['total_amount']), ('30.00', '0.00', '80.00'))
+        self.assertFalse(Order.objects.exists())
+
+    def test_quote_queries_do_not_grow_with_lines(self):
+        self.quote([(self.card, 1)], country='US')
+        with self.assertNumQueries(1):
+            self.quote([(self.card, i + 1) for i in range(50)] + [(self.mug, 1)], country='US')
+
+    def test_checkout_stores_quoted_totals_and_rule_changes_apply(self):
+        address = Address.objects.create(
+            user=self.user, recipient_name='Buyer', phone_number='1', street='1 Main St', city='LA',
+            state='CA', zip_code='90001', country='US', type='shipping',
+        )
+        response = self.client.post('/api/v1/orders/', {
+            'shipping_address': address.id,
+            'items': [{'product': self.card.id, 'quantity': 500}],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        order = Order.objects.get()
+        self.assertEqual(
+            [str(v) for v in (order.subtotal, order.discount_total, order.shipping_total, order.tax_total, order.total_amount)],
+            ['5000.00', '1000.00', '12.00', '330.00', '4342.00'],  # 50 kg: heaviest US tier
+        )
+        self.assertEqual(str(order.items.get().unit_price), '8.00')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TaxRule.objects.filter(state='CA').update(rate='0.1')
+            TaxRule.objects.get(state='CA').save()
+        quote = self.quote([(self.card, 500)], shipping_address=address.id)
+        self.assertEqual(quote['tax_total'], '400.00')
+
+        other = User.objects.create(username='other').addresses.create(
+            recipient_name='Other', phone_number='2', street='2 Main St', city='LA',
+            state='CA', zip_code='90001', country='US', type='shipping',
+        )
+        response = self.client.post('/api/v1/orders/', {
+            'shipping_address': other.id,
+            'items': [{'product': self.card.id, 'quantity': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('shipping_address', response.data)
+
+
+@override_settings(PRINT_FILE_FORMAT='PDF', PRINT_FILE_DPI=72)
+class PrintRenderTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.user = User.objects.create(username='buyer')
+        subcategory = Subcategory.objects.create(
+            category=Category.objects.create(name='Cards', slug='cards'), name='Business', slug='business',
+        )
+        self.card = Product.objects.create(subcategory=subcategory, name='Card', slug='card', sku='BC-1', base_price=2)
+        self.order = Order.objects.create(user=self.user, total_amount=2)
+
+    def item(self, canvas):
+        return OrderItem.objects.create(
+            order=self.order, product=self.card, quantity=1, unit_price=2, total_price=2, canvas_blob_id=store_canvas(canvas),
+        )
+
+    def test_renders_queued_items(self):
+        item = self.item({'width': 336, 'height': 192, 'objects': [
+            {'type': 'rect', 'left': 0, 'top': 0, 'width': 336, 'height': 40, 'fill': '#1e40af'},
+            {'type': 'textbox', 'left': 20, 'top': 80, 'text': 'Jane Doe', 'fontSize': 24, 'fill': '#111'},
+        ]})
+        blank = self.item(None)
+        cancelled = Order.objects.create(user=self.user, total_amount=2, status='Cancelled')
+        skipped = OrderItem.objects.create(
+            order=cancelled, product=self.card, quantity=1, unit_price=2, total_price=2,
+            canvas_blob_id=store_canvas({'objects': []}),
+        )
+
+        self.assertEqual(process_render_batch(), (1, 0))
+        item.refresh_from_db()
+        self.assertEqual((item.render_status, item.render_attempts, item.render_error), ('completed', 1, ''))
+        self.assertIsNotNone(item.render_seconds)
+        with item.print_file_url.open('rb') as print_file:
+            self.assertEqual(print_file.read(5), b'%PDF-')
+        self.assertEqual(process_render_batch(), (0, 0))
+        self.assertEqual(OrderItem.objects.get(pk=blank.pk).render_status, 'pending')
+        self.assertEqual(OrderItem.objects.get(pk=skipped.pk).render_status, 'pending')
+
+    def test_failures_are_retried_then_marked_failed(self):
+        item = self.item({'objects': [{'type': 'hologram'}]})
+        for attempt in range(1, rendering.MAX_ATTEMPTS + 1):
+            with self.assertLogs('apps.orders.rendering', 'WARNING'):
+                self.assertEqual(process_render_batch(), (0, 1))
+            item.refresh_from_db()
+            self.assertEqual(item.render_attempts, attempt)
+        self.assertEqual(item.render_status, 'failed')
+        self.assertIn("Unsupported canvas object type 'hologram'", item.render_error)
+        self.assertEqual(process_render_batch(), (0, 0))
+
+    def test_sources_are_restricted(self):
+        image = {'type': 'image', 'src': 'http://169.254.169.254/latest/meta-data/iam'}
+        with self.assertRaisesMessage(DownloadError, 'not allowed'):
+            render_canvas({'objects': [image]}, dpi=96, allowed_hosts=['cdn.example.com'])
+        pixel = 'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII='
+        self.assertEqual(render_canvas({'width': 10, 'height': 10, 'objects': [dict(image, src=pixel)]}, dpi=96).size, (10, 10))
+        with self.assertRaisesMessage(CanvasError, 'larger than 10 bytes'):
+            render_canvas({'objects': [dict(image, src=pixel)]}, dpi=96, max_bytes=10)
+
+    def test_source_cache_is_bounded_by_size(self):
+        cache = _SourceCache(10)
+        for key in 'abc':
+            cache.put(key, b'1234')
+        self.assertEqual((cache.get('a'), cache.get('c'), cache.size), (None, b'1234', 8))
+        cache.put('huge', b'x' * 11)
+        self.assertIsNone(cache.get('huge'))
+
+        pixel = 'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII='
+        before = canvas._source_cache.size
+        render_canvas({'objects': [{'type': 'image', 'src': pixel}]}, dpi=96)
+        self.assertEqual(canvas._source_cache.size, before)
+
+    def test_objects_are_clipped_to_the_canvas(self):
+        huge = {'type': 'rect', 'left': -50000, 'top': -50000, 'width': 100000, 'height': 100000, 'fill': 'red', 'angle': 45}
+        offside = {'type': 'rect', 'left': 500, 'top': 0, 'width': 100000, 'height': 10, 'fill': 'blue'}
+        image = render_canvas({'width': 100, 'height': 100, 'objects': [huge, offside]}, dpi=96)
+        self.assertEqual(image.getpixel((50, 50)), (255, 0, 0))
+        # Text and images are decoded whole, so their size is limited instead.
+        text = {'type': 'text', 'text': 'x', 'fontSize': 100000}
+        with self.assertRaisesMessage(CanvasError, 'is too large'):
+            render_canvas({'objects': [text]}, dpi=96)
+        with self.assertRaisesMessage(CanvasError, 'is too large'):
+            render_canvas({'objects': [dict(text, text='x' * 1000, fontSize=1000)]}, dpi=96)
+        pixel = 'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII='
+        with self.assertRaisesMessage(CanvasError, 'Image of 1x1px is too large'):
+            render_canvas({'objects': [{'type': 'image', 'src': pixel}]}, dpi=96, max_pixels=0)
+
+    def test_reclaims_items_abandoned_by_a_dead_worker(self):
+        item = self.item({'objects': []})
+        rendering.claim_items(10)
+        self.assertEqual(process_render_batch(), (0, 0))
+        OrderItem.objects.filter(pk=item.pk).update(render_started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(process_render_batch(), (1, 0))
+        self.assertEqual(OrderItem.objects.get(pk=item.pk).render_attempts, 2)
+
+    def test_worker_renders_in_a_process_pool(self):
+        items = [self.item({'objects': [{'type': 'circle', 'radius': 10 + i, 'fill': 'red'}]}) for i in range(3)]
+        out = StringIO()
+        call_command('render_print_files', workers=2, stdout=out)
+        self.assertIn('rendered 3 print files, 0 failed', out.getvalue())
+        self.assertEqual(
+            set(OrderItem.objects.filter(pk__in=[i.pk for i in items]).values_list('render_status', flat=True)),
+            {'completed'},
+        )
+
+
+class RelatedProductsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='buyer')
+        subcategory = Subcategory.objects.create(
+            category=Category.objects.create(name='Office', slug='office'), name='Paper', slug='paper',
+        )
+        self.card, self.envelope, self.stamp, self.pen = [
+            Product.objects.create(subcategory=subcategory, name=name, slug=name, sku=name, base_price=1)
+            for name in ['card', 'envelope', 'stamp', 'pen']
+        ]
+
+    def order(self, *products, status='Processing'):
+        order = Order.objects.create(user=self.user, total_amount=1, status=status)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, unit_price=1, total_price=1) for product in products
+        ])
+
+    def related(self, product):
+        return list(RelatedProduct.objects.filter(product=product).order_by('rank').values_list('related__sku', 'co_orders'))
+
+    def test_full_and_incremental_builds(self):
+        self.order(self.card, self.envelope, self.envelope)
+        self.order(self.card, self.envelope, self.stamp)
+        self.order(self.card, self.stamp)
+        self.order(self.card, self.pen, status='Cancelled')
+
+        build_related_products(min_co_orders=1)
+        self.assertEqual(self.related(self.card), [('envelope', 2), ('stamp', 2)])
+        self.assertEqual(self.related(self.pen), [])
+
+        self.order(self.pen, self.stamp)
+        build = build_related_products(incremental=True, min_co_orders=1)
+        self.assertEqual((build.mode, build.products), ('incremental', 2))
+        self.assertEqual(self.related(self.pen), [('stamp', 1)])
+        # pen is rarer than envelope, so one shared order scores higher
+        self.assertEqual(self.related(self.stamp), [('card', 2), ('pen', 1), ('envelope', 1)])
+        self.assertEqual(self.related(self.card), [('envelope', 2), ('stamp', 2)])
+
+        response = APIClient().get(f'/api/v1/products/{self.pen.id}/related/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['product']['sku'] for r in response.data['results']], ['stamp'])
+        response = APIClient().get(f'/api/v1/products/{self.stamp.id}/related/', {'limit': -1})
+        self.assertEqual([r['product']['sku'] for r in response.data['results']], ['card'])
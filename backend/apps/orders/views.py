@@ -1,6 +1,10 @@
 from rest_framework import viewsets, permissions, filters
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from apps.catalog.fieldsets import parse_field_list
+from .idempotency import idempotent
 from .models import Order, OrderItem
-from .serializers import OrderSerializer, OrderItemSerializer
+from .serializers import OrderSerializer, OrderItemSerializer, QuoteResultSerializer, QuoteSerializer
 
 class IsOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
@@ -18,7 +22,30 @@ class OrderViewSet(viewsets.ModelViewSet):
     ordering_fields = ['created_at', 'total_amount']
 
     def get_queryset(self):
-        return self.request.user.orders.prefetch_related('items__product', 'shipment').all()
+        queryset = self.request.user.orders.prefetch_related('items__product', 'shipment')
+        if 'items.frozen_canvas_state' in (self.get_expand() or ()):
+            # Lines with the same canvas share one blob, fetched and decoded once.
+            queryset = queryset.prefetch_related('items__canvas_blob')
+        return queryset.all()
+
+    def get_expand(self):
+        return parse_field_list(self.request.query_params.get('expand'))
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method in permissions.SAFE_METHODS:
+            kwargs.setdefault('expand', self.get_expand())
+        return super().get_serializer(*args, **kwargs)
+
+    @idempotent('orders:create')
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    @action(detail=False, methods=['post'])
+    def quote(self, request):
+        """Price a cart (discounts, shipping, tax) exactly as checkout would, without saving anything."""
+        serializer = QuoteSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        return Response(QuoteResultSerializer(serializer.quote()).data)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -2,13 +2,15 @@ from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
+from shop_project.exports import ExportMixin
 from .models import Address
 from .serializers import UserSerializer, AddressSerializer
 from .permissions import IsAdminOrStaff
+from .stats import user_stats
 
 User = get_user_model()
 
-class AdminUserViewSet(viewsets.ModelViewSet):
+class AdminUserViewSet(ExportMixin, viewsets.ModelViewSet):
     """
     Admin-only ViewSet for managing all users.
     """
@@ -19,6 +21,15 @@ class AdminUserViewSet(viewsets.ModelViewSet):
     search_fields = ['username', 'email', 'company_name', 'first_name', 'last_name']
     ordering_fields = ['date_joined', 'username', 'email']
     ordering = ['-date_joined']
+    export_filename = 'users'
+    export_related = ['role']
+    export_fields = [
+        ('ID', 'id'), ('Username', 'username'), ('Email', 'email'),
+        ('First name', 'first_name'), ('Last name', 'last_name'), ('Phone', 'phone'),
+        ('Company', 'company_name'), ('Tax ID', 'tax_id'), ('Role', 'role.name'),
+        ('Active', 'is_active'), ('Staff', 'is_staff'), ('Verified', 'is_verified'),
+        ('Marketing opt-in', 'marketing_opt_in'), ('Date joined', 'date_joined'), ('Last login', 'last_login'),
+    ]
 
     @action(detail=True, methods=['post'])
     def deactivate(self, request, pk=None):
@@ -39,20 +50,4 @@ class AdminUserViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Get user statistics"""
-        from django.utils import timezone
-        from datetime import timedelta
-
-        total_users = User.objects.count()
-        active_users = User.objects.filter(is_active=True).count()
-        today = timezone.now().date()
-        users_today = User.objects.filter(date_joined__date=today).count()
-        users_this_week = User.objects.filter(
-            date_joined__gte=timezone.now() - timedelta(days=7)
-        ).count()
-
-        return Response({
-            'total': total_users,
-            'active': active_users,
-            'today': users_today,
-            'this_week': users_this_week,
-        })
+        return Response(user_stats())
@@ -0,0 +1,25 @@
+"""Admin dashboard counters for users; see shop_project.stats."""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from shop_project.stats import cached_stats
+
+
+def compute_user_stats(now=None):
+    now = now or timezone.now()
+    # Compare against timestamps rather than date_joined__date so the
+    # date_joined index stays usable.
+    start_of_today = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    return get_user_model().objects.aggregate(
+        total=Count('pk'),
+        active=Count('pk', filter=Q(is_active=True)),
+        today=Count('pk', filter=Q(date_joined__gte=start_of_today)),
+        this_week=Count('pk', filter=Q(date_joined__gte=now - timedelta(days=7))),
+    )
+
+
+def user_stats():
+    return cached_stats('users', compute_user_stats)
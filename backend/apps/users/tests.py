@@ -1,7 +1,11 @@
+import csv
+from io import BytesIO, StringIO
+
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
+from openpyxl import load_workbook
 from .models import User, Address
 
 class UserApiTests(TestCase):
@@ -41,3 +45,36 @@ class UserApiTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Address.objects.count(), 1)
         self.assertEqual(Address.objects.get().user, user)
+
+
+class AdminExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='admin', password='pw', is_staff=True))
+        User.objects.create_user(username='alice', email='alice@example.com', company_name='=HYPERLINK("x")')
+        User.objects.create_user(username='bob', email='bob@example.com')
+
+    def test_csv_export_streams_filtered_rows(self):
+        response = self.client.get('/api/v1/admin/users/export/', {'search': 'alice'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="users-', response['Content-Disposition'])
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][:3], ['ID', 'Username', 'Email'])
+        self.assertEqual([row[1] for row in rows[1:]], ['alice'])
+        # Cells that would run as spreadsheet formulas are neutralised
+        self.assertEqual(rows[1][6], '\'=HYPERLINK("x")')
+
+    def test_xlsx_export(self):
+        response = self.client.get('/api/v1/admin/users/export/', {'file_format': 'xlsx', 'ordering': 'username'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sheet = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        self.assertEqual([row[1] for row in sheet.iter_rows(min_row=2, values_only=True)], ['admin', 'alice', 'bob'])
+
+    def test_export_requires_staff_and_known_format(self):
+        self.assertEqual(
+            self.client.get('/api/v1/admin/users/export/', {'file_format': 'pdf'}).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        self.client.force_authenticate(User.objects.get(username='bob'))
+        self.assertEqual(self.client.get('/api/v1/admin/users/export/').status_code, status.HTTP_403_FORBIDDEN)
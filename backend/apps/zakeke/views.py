@@ -1,3 +1,4 @@
+import requests
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -7,6 +8,11 @@ from .client import zakeke_client
 from .serializers import ZakekeCatalogProductSerializer
 from .models import ZakekeProduct
 from apps.catalog.models import Product
+from apps.orders.idempotency import idempotent
+
+# Seconds to wait on the Zakeke API; well below IDEMPOTENCY_LOCK_SECONDS, after
+# which a retry may take over an order registration still in progress.
+REQUEST_TIMEOUT = 30
 
 class ZakekeBasicAuthentication(BasicAuthentication):
     """
@@ -91,7 +97,7 @@ class ZakekeViewSet(viewsets.ViewSet):
         url = f"https://api.zakeke.com/v3/designs/{design_id}"
         
         try:
-            response = requests.get(url, headers=headers)
+            response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
             return Response(response.json())
         except Exception as e:
@@ -101,13 +107,14 @@ class ZakekeViewSet(viewsets.ViewSet):
             )
 
     @action(detail=False, methods=['post'], url_path='order')
+    @idempotent('zakeke:order', atomic=False)
     def register_order(self, request):
         """Register a local order in Zakeke to generate print files."""
         headers = zakeke_client.get_headers(s2s=True)
         url = "https://api.zakeke.com/v2/order"
         
         try:
-            response = requests.post(url, headers=headers, json=request.data)
+            response = requests.post(url, headers=headers, json=request.data, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
             return Response(response.json())
         except Exception as e:
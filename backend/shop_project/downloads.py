@@ -0,0 +1,49 @@
+"""
+Downloads of http(s) URLs that customers or admins supplied (product images,
+design images and fonts).
+
+Such a URL could point the server at internal services, so it is only fetched
+from an allowed host, redirects are held to the same hosts, and the body is
+capped at ``max_bytes``. Plain stdlib, so the print renderer's worker
+processes can use it too.
+"""
+import urllib.parse
+import urllib.request
+
+
+class DownloadError(ValueError):
+    pass
+
+
+def download(url, allowed_hosts, max_bytes, timeout=20):
+    """The body of ``url``, if its host is in ``allowed_hosts`` and it is at most ``max_bytes`` long."""
+    _check_host(url, allowed_hosts)
+    opener = urllib.request.build_opener(_RedirectHandler(allowed_hosts))
+    with opener.open(url, timeout=timeout) as response:
+        length = response.headers.get('Content-Length', '')
+        if length.isdigit() and int(length) > max_bytes:
+            raise DownloadError(f"{url[:100]!r} is larger than {max_bytes} bytes")
+        data = response.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise DownloadError(f"{url[:100]!r} is larger than {max_bytes} bytes")
+    return data
+
+
+def is_allowed(url, allowed_hosts):
+    parts = urllib.parse.urlsplit(url)
+    hosts = {host.strip().lower() for host in allowed_hosts}
+    return parts.scheme in ('http', 'https') and bool(parts.hostname) and parts.hostname.lower() in hosts
+
+
+def _check_host(url, allowed_hosts):
+    if not is_allowed(url, allowed_hosts):
+        raise DownloadError(f"Downloads from {url[:100]!r} are not allowed")
+
+
+class _RedirectHandler(urllib.request.HTTPRedirectHandler):
+    def __init__(self, allowed_hosts):
+        self.allowed_hosts = allowed_hosts
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        _check_host(newurl, self.allowed_hosts)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
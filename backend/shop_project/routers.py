@@ -0,0 +1,129 @@
+"""
+Primary/replica database routing.
+
+Replicas are listed in ``DATABASE_REPLICAS`` (built from
+``DATABASE_REPLICA_URLS``). During a web request, reads of models in
+``REPLICA_READ_APPS`` go to a healthy replica. Everything else uses the
+primary: writes, reads inside a transaction on the primary, reads of other
+apps (users, sessions, auth), and all work outside a request (workers and
+management commands).
+
+Read-your-writes: once a request writes (or is a non-safe method) the rest of
+it reads from the primary. The response then sets a short-lived cookie that
+keeps the client's next ``REPLICA_PIN_SECONDS`` of requests on the primary
+too, to cover replication lag.
+
+Code that caches what it reads under a version that was just bumped (cached
+catalog payloads) reads inside ``force_primary()``: a lagging replica would
+otherwise have its stale rows stored under the new version.
+"""
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'db_pin_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# alias -> (healthy, time.monotonic() of the check), per process
+_health = {}
+
+
+@dataclass
+class RoutingState:
+    pinned: bool = False
+    wrote: bool = False
+
+
+_request_state = ContextVar('db_routing_state', default=None)
+_forced_primary = ContextVar('db_forced_primary', default=False)
+
+
+@contextmanager
+def force_primary():
+    """Read everything from the primary inside the block (or decorated function)."""
+    token = _forced_primary.set(True)
+    try:
+        yield
+    finally:
+        _forced_primary.reset(token)
+
+
+def healthy_replicas():
+    """Replica aliases that answered their last health check (re-run every few seconds)."""
+    now = time.monotonic()
+    healthy = []
+    for alias in settings.DATABASE_REPLICAS:
+        ok, checked_at = _health.get(alias, (False, None))
+        if checked_at is None or now - checked_at >= settings.REPLICA_HEALTH_CHECK_SECONDS:
+            ok = _check(alias)
+            _health[alias] = (ok, now)
+        if ok:
+            healthy.append(alias)
+    return healthy
+
+
+def _check(alias):
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        return True
+    except DatabaseError as exc:
+        logger.warning("Read replica %s is unavailable, reading from the primary: %s", alias, exc)
+        connection.close()
+        return False
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is None or state.pinned or model._meta.app_label not in settings.REPLICA_READ_APPS:
+            return None
+        if _forced_primary.get():
+            return None
+        # Reads inside a transaction on the primary must see its uncommitted writes.
+        if connections['default'].in_atomic_block:
+            return None
+        replicas = healthy_replicas()
+        return random.choice(replicas) if replicas else None
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas are copies of the primary, so any two rows may be related.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaPinningMiddleware:
+    """Enables replica reads for the request and applies read-your-writes pinning."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState(pinned=request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
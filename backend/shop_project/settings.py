@@ -57,6 +57,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'shop_project.routers.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -96,6 +97,67 @@ DATABASES = {
     )
 }
 
+# Read replicas: comma-separated URLs, exposed as replica1, replica2, ...
+# Storefront reads of these apps go to a healthy replica (see shop_project.routers).
+DATABASE_REPLICAS = []
+for _index, _url in enumerate(filter(None, os.getenv('DATABASE_REPLICA_URLS', '').split(',')), start=1):
+    DATABASES[f'replica{_index}'] = dj_database_url.parse(_url.strip(), conn_max_age=600)
+    DATABASES[f'replica{_index}']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(f'replica{_index}')
+
+DATABASE_ROUTERS = ['shop_project.routers.PrimaryReplicaRouter']
+REPLICA_READ_APPS = ['catalog', 'designs', 'orders', 'zakeke']
+# How long a client keeps reading from the primary after it wrote something;
+# should exceed the usual replication lag.
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 10))
+REPLICA_HEALTH_CHECK_SECONDS = int(os.getenv('REPLICA_HEALTH_CHECK_SECONDS', 10))
+
+
+# Cache
+# Shared Redis cache in production so catalog version bumps are seen by every
+# worker; falls back to per-process memory for local development.
+
+if os.getenv('CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('CACHE_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds a catalog tree snapshot is kept; the version key makes stale reads impossible.
+CATALOG_TREE_CACHE_TIMEOUT = int(os.getenv('CATALOG_TREE_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Facet counts per filter combination; the catalog version invalidates them on writes.
+CATALOG_FACET_CACHE_TIMEOUT = int(os.getenv('CATALOG_FACET_CACHE_TIMEOUT', 60 * 15))
+
+# Seconds compiled tax/shipping/quantity-tier tables are kept; rule changes bump their version.
+PRICING_RULES_CACHE_TIMEOUT = int(os.getenv('PRICING_RULES_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Upper bound for the active-banner cache when no start/end boundary is nearer,
+# and the max-age advertised to browsers/CDNs (which cannot see invalidations).
+BANNER_CACHE_TIMEOUT = int(os.getenv('BANNER_CACHE_TIMEOUT', 60 * 60))
+BANNER_MAX_AGE = int(os.getenv('BANNER_MAX_AGE', 60))
+
+# Minutes stock stays held for an unpaid order before the sweeper releases it.
+STOCK_RESERVATION_TTL_MINUTES = int(os.getenv('STOCK_RESERVATION_TTL_MINUTES', 30))
+
+# Idempotency-Key handling for checkout and Zakeke order registration (apps.orders.idempotency):
+# hours a key replays its response, how long a duplicate waits for the original
+# before a 409, and after how many seconds an unfinished request's key is reclaimed.
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', 5))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', 120))
+
+# Seconds admin dashboard counters are cached; they are polled, not invalidated.
+ADMIN_STATS_CACHE_TIMEOUT = int(os.getenv('ADMIN_STATS_CACHE_TIMEOUT', 30))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -138,6 +200,47 @@ STATIC_ROOT = str(BASE_DIR / 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = str(BASE_DIR / 'media')
 
+# Resized image variants go to their own storage. Locally this is a folder
+# under MEDIA_ROOT; set IMAGE_VARIANT_STORAGE_BACKEND=storages.backends.s3.S3Storage
+# (django-storages) and IMAGE_VARIANT_BUCKET to keep them in S3 instead. AWS
+# credentials come from the usual AWS_* environment variables.
+IMAGE_VARIANT_STORAGE_BACKEND = os.getenv('IMAGE_VARIANT_STORAGE_BACKEND', 'django.core.files.storage.FileSystemStorage')
+IMAGE_VARIANT_STORAGE_OPTIONS = {
+    'django.core.files.storage.FileSystemStorage': {
+        'location': os.getenv('IMAGE_VARIANT_ROOT', str(BASE_DIR / 'media' / 'variants')),
+        'base_url': os.getenv('IMAGE_VARIANT_URL', MEDIA_URL + 'variants/'),
+    },
+    'storages.backends.s3.S3Storage': {
+        'bucket_name': os.getenv('IMAGE_VARIANT_BUCKET'),
+        'location': os.getenv('IMAGE_VARIANT_PREFIX', 'variants'),
+        'custom_domain': os.getenv('IMAGE_VARIANT_CUSTOM_DOMAIN') or None,
+        'querystring_auth': False,  # variant URLs are public and cached in payloads
+        'file_overwrite': False,
+    },
+}
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'image_variants': {
+        'BACKEND': IMAGE_VARIANT_STORAGE_BACKEND,
+        'OPTIONS': IMAGE_VARIANT_STORAGE_OPTIONS.get(IMAGE_VARIANT_STORAGE_BACKEND, {}),
+    },
+}
+
+IMAGE_VARIANT_WIDTHS = [320, 640, 1024, 1600]
+IMAGE_VARIANT_FORMATS = ['avif', 'webp']
+
+# Image and font URLs (image variant sources, and design images and fonts in
+# print files) are only downloaded from these hosts; comma-separated.
+MEDIA_DOWNLOAD_HOSTS = [host for host in os.getenv('MEDIA_DOWNLOAD_HOSTS', '').split(',') if host]
+# Largest image or font file read, in bytes, and largest image decoded, in pixels.
+MEDIA_SOURCE_MAX_BYTES = int(os.getenv('MEDIA_SOURCE_MAX_BYTES', 25 * 1024 * 1024))
+MEDIA_SOURCE_MAX_PIXELS = int(os.getenv('MEDIA_SOURCE_MAX_PIXELS', 50_000_000))
+
+# Print files rendered from order items' frozen canvases (apps.orders.rendering): resolution and format.
+PRINT_FILE_DPI = int(os.getenv('PRINT_FILE_DPI', 300))
+PRINT_FILE_FORMAT = os.getenv('PRINT_FILE_FORMAT', 'PDF')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/6.0/ref/settings/#default-auto-field
 
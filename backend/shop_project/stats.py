@@ -0,0 +1,19 @@
+"""
+Caching for the admin dashboard counters.
+
+Each app computes its models' figures with a single conditional-aggregation
+query; the result is cached for ADMIN_STATS_CACHE_TIMEOUT seconds, so polling
+dashboards cost at most one query per model per interval.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+
+def cached_stats(name, compute):
+    """Return ``compute()`` cached under ``admin:stats:<name>``."""
+    key = f'admin:stats:{name}'
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute()
+        cache.set(key, stats, timeout=settings.ADMIN_STATS_CACHE_TIMEOUT)
+    return stats
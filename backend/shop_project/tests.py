@@ -0,0 +1,142 @@
+import time
+
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.catalog.cache import CATALOG_VERSION_KEY
+from apps.catalog.models import Category, Product, Subcategory
+from apps.users.models import User
+from . import routers
+from .routers import PIN_COOKIE, PrimaryReplicaRouter, ReplicaPinningMiddleware, force_primary
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTests(SimpleTestCase):
+    # Not TestCase: its wrapping transaction would keep every read on the primary.
+    databases = {'default'}
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        routers._health.clear()
+        routers._health['replica1'] = (True, time.monotonic())
+        self.addCleanup(routers._health.clear)
+
+    def request(self, view, method='get', **cookies):
+        factory = RequestFactory()
+        for name, value in cookies.items():
+            factory.cookies[name] = value
+        return ReplicaPinningMiddleware(view)(getattr(factory, method)('/'))
+
+    def read_alias(self, model=Product):
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(model))
+            return HttpResponse()
+
+        return seen, view
+
+    def test_safe_request_reads_catalog_from_replica(self):
+        seen, view = self.read_alias()
+        response = self.request(view)
+        self.assertEqual(seen, ['replica1'])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        seen, view = self.read_alias(User)
+        self.request(view)
+        self.assertEqual(seen, [None])
+        # Outside a request (workers, commands) everything stays on the primary
+        self.assertIsNone(self.router.db_for_read(Product))
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        def view(request):
+            before = self.router.db_for_read(Product)
+            self.router.db_for_write(Product)
+            return HttpResponse(f'{before},{self.router.db_for_read(Product)}')
+
+        response = self.request(view)
+        self.assertEqual(response.content, b'replica1,None')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 10)
+
+        seen, view = self.read_alias()
+        self.request(view, **{PIN_COOKIE: '1'})
+        self.assertEqual(seen, [None])
+
+    def test_transactions_and_unhealthy_replicas_use_the_primary(self):
+        def view(request):
+            with transaction.atomic():
+                return HttpResponse(str(self.router.db_for_read(Product)))
+
+        self.assertEqual(self.request(view).content, b'None')
+
+        routers._health['replica1'] = (False, time.monotonic())
+        seen, view = self.read_alias()
+        self.request(view)
+        self.assertEqual(seen, [None])
+
+    def test_force_primary(self):
+        def view(request):
+            with force_primary():
+                forced = self.router.db_for_read(Product)
+            return HttpResponse(f'{forced},{self.router.db_for_read(Product)}')
+
+        self.assertEqual(self.request(view).content, b'None,replica1')
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class MirroredReplicaTests(TransactionTestCase):
+    """Routing against a real replica alias, a second connection mirroring the test database."""
+
+    @classmethod
+    def setUpClass(cls):
+        # Registered for this class only, after the runner has set up its databases.
+        default = connections['default'].settings_dict
+        connections.settings['replica1'] = {**default, 'TEST': {**default['TEST'], 'MIRROR': 'default'}}
+        cls.databases = {'default', 'replica1'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica1'].close()
+        del connections['replica1']
+        del connections.settings['replica1']
+
+    def setUp(self):
+        cache.clear()
+        routers._health.clear()
+        routers._health['replica1'] = (True, time.monotonic())
+        self.addCleanup(routers._health.clear)
+        category = Category.objects.create(name='Cards', slug='cards')
+        subcategory = Subcategory.objects.create(category=category, name='Flat', slug='flat')
+        Product.objects.create(subcategory=subcategory, name='Flat Card', slug='flat-card', sku='FC-1', base_price=3)
+
+    def get(self, url):
+        with CaptureQueriesContext(connections['default']) as primary:
+            with CaptureQueriesContext(connections['replica1']) as replica:
+                response = APIClient().get(url)
+        self.assertEqual(response.status_code, 200)
+        self.response = response
+        return len(primary), len(replica)
+
+    def test_version_keyed_reads_use_the_primary(self):
+        # The catalog tree rebuild
+        self.assertEqual(self.get('/api/v1/categories/'), (3, 0))
+        # Facet counts on the primary (subcategories, aggregate), results on the replica
+        primary, replica = self.get('/api/v1/products/facets/')
+        self.assertEqual(primary, 2)
+        self.assertGreater(replica, 0)
+        # Cached facet counts need no query at all
+        self.assertEqual(self.get('/api/v1/products/facets/')[0], 0)
+
+    def test_etags_are_built_from_replica_rows(self):
+        # Just after a catalog write the replica may lag, so no ETag is given out.
+        self.assertEqual(self.get('/api/v1/products/'), (0, 1))
+        self.assertFalse(self.response.has_header('ETag'))
+        # Once the window has passed, the probe and the page both read the replica.
+        cache.set(f'{CATALOG_VERSION_KEY}:changed_at', time.time() - 60, timeout=None)
+        self.assertEqual(self.get('/api/v1/products/'), (0, 2))
+        self.assertTrue(self.response.has_header('ETag'))